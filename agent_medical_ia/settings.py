@@ -143,6 +143,138 @@ if RUNNING_TESTS:
     CELERY_TASK_ALWAYS_EAGER = True
     CELERY_TASK_EAGER_PROPAGATES = True
 
+# Analyse IA (moteur asynchrone multi-LLM, voir chat/ia_engine.py)
+IA_EXPERT_TIMEOUT = float(os.getenv("IA_EXPERT_TIMEOUT", "120"))
+# Délai de la synthèse streamée, attente des plafonds (IA_LLM_RATE_LIMITS) comprise
+IA_SYNTHESE_TIMEOUT = float(os.getenv("IA_SYNTHESE_TIMEOUT", "180"))
+# Réponses d'experts réussies réutilisées lors d'une ré-analyse du même prompt
+IA_EXPERT_CACHE_TIMEOUT = int(os.getenv("IA_EXPERT_CACHE_TIMEOUT", "86400"))
+IA_TASK_MAX_RETRIES = int(os.getenv("IA_TASK_MAX_RETRIES", "1"))
+# Durée max du verrou single-flight d'une analyse (couvre les tentatives de la tâche)
+IA_INFLIGHT_TIMEOUT = int(os.getenv("IA_INFLIGHT_TIMEOUT", "900"))
+# "inline" : une tâche pour toute l'analyse; "chord" : une tâche par expert (file ia_<expert>) + synthèse
+IA_PIPELINE = os.getenv("IA_PIPELINE", "inline")
+# Mode inline : synthèse dès que IA_QUORUM experts ont répondu ou après IA_GLOBAL_DEADLINE secondes (0 = tous / sans échéance)
+IA_QUORUM = int(os.getenv("IA_QUORUM", "0"))
+IA_GLOBAL_DEADLINE = float(os.getenv("IA_GLOBAL_DEADLINE", "0"))
+# Files Celery par priorité de triage (chat/triage.py); les workers doivent consommer ces files
+IA_PRIORITY_ROUTING = os.getenv("IA_PRIORITY_ROUTING", "True").lower() in ["true", "1", "yes", "on"]
+IA_PRIORITY_QUEUES = {"high": "ia_high", "normal": "ia_normal", "low": "ia_low"}
+IA_PRIORITY_HIGH_SCORE = int(os.getenv("IA_PRIORITY_HIGH_SCORE", "5"))
+# Fenêtre (secondes) des temps d'attente exposés par api/ia/queues/
+IA_QUEUE_STATS_WINDOW = int(os.getenv("IA_QUEUE_STATS_WINDOW", "3600"))
+# Durée de cache de ces statistiques, recalculées par un seul processus (0 = recalcul à chaque appel)
+IA_QUEUE_STATS_CACHE_TIMEOUT = int(os.getenv("IA_QUEUE_STATS_CACHE_TIMEOUT", "10"))
+# Lots d'analyses (fiches/batch-analyse/) : taille maximale et analyses simultanées par lot
+IA_BATCH_MAX_SIZE = int(os.getenv("IA_BATCH_MAX_SIZE", "100"))
+IA_BATCH_CONCURRENCY = int(os.getenv("IA_BATCH_CONCURRENCY", "4"))
+# Cache des synthèses par contenu clinique des fiches (chat/clinical_cache.py); changer la version l'invalide
+IA_CLINICAL_CACHE = os.getenv("IA_CLINICAL_CACHE", "True").lower() in ["true", "1", "yes", "on"]
+IA_CLINICAL_CACHE_TIMEOUT = int(os.getenv("IA_CLINICAL_CACHE_TIMEOUT", "604800"))
+IA_CLINICAL_CACHE_VERSION = os.getenv("IA_CLINICAL_CACHE_VERSION", "1")
+# Synthèses finales (chat/result_store.py) : cache partagé, puis LRU par processus borné en entrées et en octets
+IA_RESULT_CACHE_TIMEOUT = int(os.getenv("IA_RESULT_CACHE_TIMEOUT", "3600"))
+IA_RESULT_LRU_SIZE = int(os.getenv("IA_RESULT_LRU_SIZE", "256"))
+IA_RESULT_LRU_MAX_BYTES = int(os.getenv("IA_RESULT_LRU_MAX_BYTES", str(8 * 1024 * 1024)))
+IA_RESULT_LRU_TTL = int(os.getenv("IA_RESULT_LRU_TTL", "300"))
+# Synthèses et réponses d'experts compressées en cache au-delà de ce seuil (chat/cache_compression.py)
+IA_CACHE_COMPRESSION = os.getenv("IA_CACHE_COMPRESSION", "zstd")  # zstd | zlib | none
+IA_CACHE_COMPRESS_MIN_SIZE = int(os.getenv("IA_CACHE_COMPRESS_MIN_SIZE", "1024"))
+# Ruée sur le cache (chat/cache_stampede.py) : durée du verrou de recalcul et attente maximale des autres lecteurs
+IA_STAMPEDE_LOCK_TIMEOUT = int(os.getenv("IA_STAMPEDE_LOCK_TIMEOUT", "30"))
+IA_STAMPEDE_WAIT = float(os.getenv("IA_STAMPEDE_WAIT", "2"))
+# Import en masse de fiches (chat/fiche_import.py) : lignes validées et insérées par blocs de cette taille
+FICHE_IMPORT_CHUNK_SIZE = int(os.getenv("FICHE_IMPORT_CHUNK_SIZE", "500"))
+# Conversations par page de l'historique du chat (chat/history_service.py)
+CHAT_HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", "30"))
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
+# Fournisseurs LLM construits à la première utilisation (voir chat/llm_config.py);
+# une clé "timeout" optionnelle remplace IA_EXPERT_TIMEOUT pour un fournisseur, "queue" sa file Celery (mode chord),
+# "rate_group" son groupe de quota dans IA_LLM_RATE_LIMITS, "alternate" son fournisseur de secours
+IA_LLM_PROVIDERS = {
+    "gpt4": {
+        "backend": "openai",
+        "model": os.getenv("IA_GPT4_MODEL", "gpt-4.1"),
+        "temperature": 0.3,
+        "rate_group": "openai",
+        "alternate": "secours_google",
+    },
+    "claude": {
+        "backend": "google",
+        "model": os.getenv("IA_CLAUDE_MODEL", "gemini-2.0-flash"),
+        "temperature": 0.3,
+        "rate_group": "google",
+        "alternate": "secours_openai",
+    },
+    "gemini": {
+        "backend": "google",
+        "model": os.getenv("IA_GEMINI_MODEL", "gemini-2.0-flash"),
+        "temperature": 0.3,
+        "rate_group": "google",
+        "alternate": "secours_openai",
+    },
+    "synthese": {
+        "backend": "openai",
+        "model": os.getenv("IA_SYNTHESE_MODEL", "gpt-4.1"),
+        "temperature": 0.2,
+        "streaming": True,
+        "rate_group": "openai",
+    },
+    # Fournisseurs de secours (bascule sur disjoncteur ouvert, requêtes couvertes)
+    "secours_openai": {
+        "backend": "openai",
+        "model": os.getenv("IA_SECOURS_OPENAI_MODEL", "gpt-4.1-mini"),
+        "temperature": 0.3,
+        "rate_group": "openai",
+    },
+    "secours_google": {
+        "backend": "google",
+        "model": os.getenv("IA_SECOURS_GOOGLE_MODEL", "gemini-2.0-flash-lite"),
+        "temperature": 0.3,
+        "rate_group": "google",
+    },
+}
+# Modèle local simulé pour tous les fournisseurs (chat/llm_fake.py) : tests de charge, développement hors ligne
+IA_LLM_FAKE = os.getenv("IA_LLM_FAKE", "False").lower() in ["true", "1", "yes", "on"]
+IA_LLM_FAKE_OPTIONS = {
+    "latency": float(os.getenv("IA_FAKE_LATENCY", "1.5")),
+    "distribution": os.getenv("IA_FAKE_DISTRIBUTION", "lognormal"),
+    "spread": float(os.getenv("IA_FAKE_SPREAD", "0.4")),
+    "tokens_per_second": float(os.getenv("IA_FAKE_TOKENS_PER_SECOND", "50")),
+    "error_rate": float(os.getenv("IA_FAKE_ERROR_RATE", "0")),
+    "seed": int(os.getenv("IA_FAKE_SEED", "42")),
+}
+# Plafonds par groupe de quota, partagés par tous les workers via le cache (0 = illimité)
+IA_LLM_RATE_LIMITS = {
+    "openai": {
+        "rpm": int(os.getenv("IA_OPENAI_RPM", "500")),
+        "max_concurrency": int(os.getenv("IA_OPENAI_MAX_CONCURRENCY", "20")),
+    },
+    "google": {
+        "rpm": int(os.getenv("IA_GOOGLE_RPM", "1000")),
+        "max_concurrency": int(os.getenv("IA_GOOGLE_MAX_CONCURRENCY", "20")),
+    },
+}
+# Attente maximale d'un appel LLM quand un plafond est atteint, avant échec
+IA_LLM_MAX_WAIT = float(os.getenv("IA_LLM_MAX_WAIT", "30"))
+# Disjoncteurs : N échecs en IA_CIRCUIT_WINDOW s écartent le fournisseur IA_CIRCUIT_COOLDOWN s (0 = désactivé)
+IA_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("IA_CIRCUIT_FAILURE_THRESHOLD", "5"))
+IA_CIRCUIT_WINDOW = int(os.getenv("IA_CIRCUIT_WINDOW", "60"))
+IA_CIRCUIT_COOLDOWN = int(os.getenv("IA_CIRCUIT_COOLDOWN", "60"))
+# Requêtes couvertes vers "alternate" au-delà du p90 des latences (après IA_HEDGE_MIN_SAMPLES appels)
+IA_HEDGING = os.getenv("IA_HEDGING", "False").lower() in ["true", "1", "yes", "on"]
+IA_HEDGE_MIN_SAMPLES = int(os.getenv("IA_HEDGE_MIN_SAMPLES", "20"))
+# Budget de tokens par réponse d'expert dans le prompt de synthèse (0 = pas de compaction)
+IA_SYNTHESE_EXPERT_BUDGET = int(os.getenv("IA_SYNTHESE_EXPERT_BUDGET", "1200"))
+# Encodage tiktoken pour le comptage ("approx" = 4 caractères par token, sans tiktoken)
+IA_TOKENIZER = os.getenv("IA_TOKENIZER", "o200k_base")
+IA_PARTIAL_PUBLISH_INTERVAL = float(os.getenv("IA_PARTIAL_PUBLISH_INTERVAL", "0.5"))
+IA_PARTIAL_TIMEOUT = int(os.getenv("IA_PARTIAL_TIMEOUT", "600"))
+# Flux SSE de progression (api/ia/events/)
+IA_SSE_MAX_DURATION = float(os.getenv("IA_SSE_MAX_DURATION", "300"))
+IA_SSE_POLL_INTERVAL = float(os.getenv("IA_SSE_POLL_INTERVAL", "0.5"))
+
 # CSRF pour tests / Docker / Frontend
 CSRF_TRUSTED_ORIGINS = [
     "http://localhost:8000",
@@ -170,7 +302,11 @@ BASE_THROTTLE_RATES = {
     "ia-analyse": "30/hour",
     "ia-status": "300/hour",
     "ia-result": "300/hour",
+    "ia-events": "120/hour",
 }
+# Mode par défaut des listes paginées par chat/pagination.py (page | cursor), modifiable par ?pagination=
+API_PAGINATION_DEFAULT_MODE = os.getenv("API_PAGINATION_DEFAULT_MODE", "page")
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": ("rest_framework_simplejwt.authentication.JWTAuthentication",),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
@@ -61,3 +61,10 @@ if "GITHUB_ACTIONS" in os.environ:
 SECRET_KEY = os.environ.get("DJANGO_SECRET_KEY", "test-secret-key-for-ci-cd-only")
 DEBUG = True
 ALLOWED_HOSTS = ["*"]
+
+# Comptage de tokens sans téléchargement des encodages tiktoken
+IA_TOKENIZER = "approx"
+
+# Pas de LRU des synthèses ni de statistiques de files en cache : les tests vident le cache entre eux
+IA_RESULT_LRU_SIZE = 0
+IA_QUEUE_STATS_CACHE_TIMEOUT = 0
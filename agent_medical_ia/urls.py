@@ -26,7 +26,16 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from chat.ia_api_views import AnalyseResultAPIView, StartAnalyseAPIView, TaskStatusAPIView
+from chat.ia_api_views import (
+    AnalyseEventsAPIView,
+    AnalyseResultAPIView,
+    AnalysisBatchAPIView,
+    AnalysisRunListAPIView,
+    IAMetricsAPIView,
+    IAQueuesAPIView,
+    StartAnalyseAPIView,
+    TaskStatusAPIView,
+)
 from chat.models import FicheConsultation
 from chat.serializers import FicheConsultationDistanceSerializer
 
@@ -76,6 +85,11 @@ urlpatterns = [
     path("api/ia/analyse/", StartAnalyseAPIView.as_view(), name="ia_start"),
     path("api/ia/status/<str:task_id>/", TaskStatusAPIView.as_view(), name="ia_status"),
     path("api/ia/result/", AnalyseResultAPIView.as_view(), name="ia_result"),
+    path("api/ia/events/", AnalyseEventsAPIView.as_view(), name="ia_events"),
+    path("api/ia/runs/", AnalysisRunListAPIView.as_view(), name="ia_runs"),
+    path("api/ia/metrics/", IAMetricsAPIView.as_view(), name="ia_metrics"),
+    path("api/ia/queues/", IAQueuesAPIView.as_view(), name="ia_queues"),
+    path("api/ia/batches/<int:pk>/", AnalysisBatchAPIView.as_view(), name="ia_batch"),
     # OpenAPI / Swagger / Redoc
     path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
     path("api/docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
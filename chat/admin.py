@@ -7,9 +7,12 @@ from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils import get_column_letter
 
 from .models import (
+    AnalysisBatch,
+    AnalysisRun,
     Appointment,
     Conversation,
     DataExportJob,
+    DossierSequence,
     FicheAttachment,
     FicheConsultation,
     FicheMessage,
@@ -288,3 +291,41 @@ class DataExportJobAdmin(admin.ModelAdmin):
         ("Résultats", {"fields": ("status", "file_path", "file_size", "records_count", "error_message")}),
         ("Timing", {"fields": ("created_at", "started_at", "completed_at")}),
     )
+
+
+@admin.register(AnalysisRun)
+class AnalysisRunAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "task_id",
+        "status",
+        "priority",
+        "fiche",
+        "synthese_duration",
+        "total_duration",
+        "created_at",
+    )
+    list_filter = ("status", "priority", "created_at")
+    search_fields = ("task_id", "cache_key", "prompt_hash")
+    date_hierarchy = "created_at"
+    ordering = ("-created_at",)
+    raw_id_fields = ("conversation", "fiche", "user", "batch", "synthese_message")
+    readonly_fields = ("created_at", "started_at", "completed_at", "synthese_started_at", "synthese_ended_at")
+
+
+@admin.register(AnalysisBatch)
+class AnalysisBatchAdmin(admin.ModelAdmin):
+    list_display = ("id", "created_by", "concurrency", "created_at", "completed_at")
+    list_filter = ("created_at",)
+    search_fields = ("created_by__username",)
+    date_hierarchy = "created_at"
+    ordering = ("-created_at",)
+    readonly_fields = ("created_at", "completed_at")
+
+
+@admin.register(DossierSequence)
+class DossierSequenceAdmin(admin.ModelAdmin):
+    list_display = ("jour", "dernier")
+    date_hierarchy = "jour"
+    ordering = ("-jour",)
+    readonly_fields = ("jour", "dernier")
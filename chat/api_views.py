@@ -1,5 +1,3 @@
-import hashlib
-
 from django.conf import settings
 from django.core.cache import cache
 from django.db import transaction
@@ -15,7 +13,11 @@ from rest_framework.response import Response
 from authentication.models import CustomUser
 from authentication.permissions import IsMedecin, IsMedecinOrAdmin, IsOwnerOrAdmin, IsPatient
 
+from . import fiche_import
 from .constants import STATUS_ANALYSE_TERMINEE, STATUS_EN_ANALYSE, STATUS_REJETE_MEDECIN, STATUS_VALIDE_MEDECIN
+from .fiche_formatter import formater_fiche
+from .ia_serializers import AnalysisBatchRequestSerializer, AnalysisBatchSerializer
+from .ia_service import lancer_analyse, lancer_lot
 from .models import (
     Appointment,
     Conversation,
@@ -30,6 +32,7 @@ from .models import (
     MessageIA,
     WebhookEvent,
 )
+from .pagination import MessagePagination, ModePagination, WebhookEventPagination
 from .serializers import (
     AppointmentSerializer,
     CalendarSlotSerializer,
@@ -48,13 +51,22 @@ from .serializers import (
     UserSerializer,
     WebhookEventSerializer,
 )
-from .tasks import analyse_symptomes_task
 
 
 class RejectRequestSerializer(serializers.Serializer):
     commentaire = serializers.CharField()
 
 
+class FicheImportRequestSerializer(serializers.Serializer):
+    fichier = serializers.FileField(help_text="CSV (en-têtes = champs de la fiche) ou JSON lines")
+    format = serializers.ChoiceField(
+        choices=fiche_import.FORMATS, required=False, help_text="Défaut : déduit de l'extension du fichier"
+    )
+    analyser = serializers.BooleanField(
+        default=False, help_text="Mettre en file l'analyse IA des fiches importées (un lot par bloc)"
+    )
+
+
 # ---- Appointments action serializers ----
 class AssignRequestSerializer(serializers.Serializer):
     medecin_id = serializers.IntegerField()
@@ -117,6 +129,7 @@ class FicheConsultationViewSet(viewsets.ModelViewSet):
 
     permission_classes = [permissions.IsAuthenticated]
     queryset = FicheConsultation.objects.all().order_by("-created_at")
+    pagination_class = ModePagination
 
     def get_queryset(self):  # pragma: no cover simple filtering
         qs = super().get_queryset()
@@ -145,103 +158,10 @@ class FicheConsultationViewSet(viewsets.ModelViewSet):
         return FicheConsultationSerializer
 
     # ------- IA utils -------
-    def _formater_fiche_en_texte(self, fiche: FicheConsultation) -> str:
-        """Format amélioré de la fiche pour l'analyse IA avec tous les champs pertinents."""
-
-        # Informations patient de base
-        patient_info = (
-            f"Patient: {fiche.nom} {fiche.postnom} {fiche.prenom}, {fiche.age} ans, "
-            f"sexe {fiche.get_sexe_display() if fiche.sexe else 'NR'}, "
-            f"état civil {fiche.get_etat_civil_display()}, occupation: {fiche.occupation or 'NR'}."
-        )
-
-        # Motif et histoire
-        motif_histoire = (
-            f"Motif de consultation: {fiche.motif_consultation or 'Non renseigné'}. "
-            f"Histoire de la maladie: {fiche.histoire_maladie or 'Non renseigné'}."
-        )
-
-        # Nouveaux champs ajoutés
-        hypotheses = ""
-        if fiche.hypothese_patient_medecin:
-            hypotheses += f"Hypothèse patient/médecin: {fiche.hypothese_patient_medecin}. "
-        if fiche.analyses_proposees:
-            hypotheses += f"Analyses proposées: {fiche.analyses_proposees}. "
-
-        # Signes vitaux détaillés
-        signes_vitaux = (
-            f"Signes vitaux: Température={fiche.temperature or 'NR'}°C, "
-            f"SpO2={fiche.spo2 or 'NR'}%, Poids={fiche.poids or 'NR'}kg, "
-            f"TA={fiche.tension_arterielle or 'NR'}, Pouls={fiche.pouls or 'NR'}bpm, "
-            f"FR={fiche.frequence_respiratoire or 'NR'}/min."
-        )
-
-        # Symptômes principaux
-        symptomes = (
-            f"Symptômes: Céphalées={self._bool_to_text(fiche.cephalees)}, "
-            f"Vertiges={self._bool_to_text(fiche.vertiges)}, "
-            f"Palpitations={self._bool_to_text(fiche.palpitations)}, "
-            f"Troubles visuels={self._bool_to_text(fiche.troubles_visuels)}, "
-            f"Nycturie={self._bool_to_text(fiche.nycturie)}."
-        )
-
-        # Antécédents médicaux
-        antecedents = (
-            f"Antécédents: HTA={self._bool_to_text(fiche.hypertendu)}, "
-            f"Diabète={self._bool_to_text(fiche.diabetique)}, "
-            f"Épilepsie={self._bool_to_text(fiche.epileptique)}, "
-            f"Troubles comportement={self._bool_to_text(fiche.trouble_comportement)}, "
-            f"Gastrite={self._bool_to_text(fiche.gastritique)}."
-        )
-
-        # Mode de vie
-        mode_vie = (
-            f"Mode de vie: Tabac={fiche.get_tabac_display()}, "
-            f"Alcool={fiche.get_alcool_display()}, "
-            f"Activité physique={fiche.get_activite_physique_display()}."
-        )
-
-        # Examen clinique
-        examen = (
-            f"Examen clinique: État général={fiche.get_etat_display()}, "
-            f"Fébrile={fiche.get_febrile_display()}, "
-            f"Coloration bulbaire={fiche.get_coloration_bulbaire_display()}, "
-            f"Coloration palpébrale={fiche.get_coloration_palpebrale_display()}, "
-            f"Téguments={fiche.get_tegument_display() if hasattr(fiche, 'tegument') else 'NR'}."
-        )
-
-        # Perceptions patient
-        perceptions = ""
-        if fiche.preoccupations or fiche.attentes or fiche.comprehension:
-            perceptions = (
-                f"Perceptions patient: Préoccupations={fiche.preoccupations or 'NR'}, "
-                f"Attentes={fiche.attentes or 'NR'}, "
-                f"Compréhension={fiche.comprehension or 'NR'}."
-            )
-
-        # Assemblage final
-        texte_complet = f"{patient_info} {motif_histoire} {hypotheses} {signes_vitaux} {symptomes} {antecedents} {mode_vie} {examen} {perceptions}".strip()
-
-        return texte_complet
-
-    def _bool_to_text(self, value):
-        """Convertit un booléen en texte lisible pour l'IA."""
-        if value is True:
-            return "Oui"
-        elif value is False:
-            return "Non"
-        else:
-            return "NR"  # Non renseigné
-
     def _lancer_analyse_async(self, fiche: FicheConsultation, conversation: Conversation):
-        texte = self._formater_fiche_en_texte(fiche)
+        texte = formater_fiche(fiche)
         MessageIA.objects.create(conversation=conversation, role="user", content=texte)
-        cache_key = f"diagnostic_{hashlib.md5(texte.encode('utf-8')).hexdigest()}"  # nosec B324
-
-        def run_task():
-            analyse_symptomes_task.delay(texte, conversation.user.id, conversation.id, cache_key)
-
-        transaction.on_commit(run_task)
+        return lancer_analyse(texte, conversation.user.id, conversation.id)
 
     def perform_create(self, serializer):
         # Attach owner if patient creates the fiche
@@ -287,6 +207,87 @@ class FicheConsultationViewSet(viewsets.ModelViewSet):
         self._lancer_analyse_async(fiche, conversation)
         return Response({"detail": "Analyse relancée", "status": fiche.status}, status=status.HTTP_202_ACCEPTED)
 
+    @extend_schema(
+        tags=["Consultations"],
+        summary="Analyser un lot de fiches",
+        description=(
+            "Soumet en une requête des fiches existantes (`fiches`) et/ou à créer (`payloads`). "
+            "Les analyses sont exécutées `concurrency` à la fois; suivi via `api/ia/batches/<id>/`."
+        ),
+        request=AnalysisBatchRequestSerializer,
+        responses={202: AnalysisBatchSerializer},
+    )
+    @action(detail=False, methods=["post"], url_path="batch-analyse")
+    def batch_analyse(self, request):
+        params = AnalysisBatchRequestSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+
+        existantes = self.get_queryset().in_bulk(data["fiches"])
+        manquantes = [fiche_id for fiche_id in data["fiches"] if fiche_id not in existantes]
+        if manquantes:
+            return Response(
+                {"fiches": [f"Fiche introuvable : {fiche_id}" for fiche_id in manquantes]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        creation = FicheConsultationSerializer(data=data["payloads"], many=True, context=self.get_serializer_context())
+        creation.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            extra = {"user": request.user} if getattr(request.user, "role", None) == "patient" else {}
+            entrees = []
+            for fiche in [existantes[fiche_id] for fiche_id in dict.fromkeys(data["fiches"])]:
+                fiche.status = STATUS_EN_ANALYSE
+                fiche.save(update_fields=["status"])
+                conversation = fiche.conversations.first() or Conversation.objects.create(
+                    user=request.user, fiche=fiche
+                )
+                entrees.append((fiche, conversation))
+            for fiche in creation.save(**extra):
+                entrees.append((fiche, Conversation.objects.create(user=request.user, fiche=fiche)))
+
+            textes = []
+            for fiche, conversation in entrees:
+                texte = formater_fiche(fiche)
+                MessageIA.objects.create(conversation=conversation, role="user", content=texte)
+                textes.append((texte, conversation))
+            batch = lancer_lot(request.user, textes, data.get("concurrency"))
+        return Response(AnalysisBatchSerializer(batch).data, status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(
+        tags=["Consultations"],
+        summary="Importer des fiches en masse",
+        description=(
+            "Import en flux d'un fichier CSV ou JSON lines, validé et inséré par blocs. "
+            "Retourne le nombre de fiches importées, les lignes rejetées avec leurs erreurs et les lots d'analyse créés."
+        ),
+        request={"multipart/form-data": FicheImportRequestSerializer},
+        responses={200: OpenApiResponse(description="Rapport d'import")},
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        permission_classes=[permissions.IsAuthenticated, IsMedecinOrAdmin],
+        url_path="import",
+    )
+    def importer(self, request):
+        params = FicheImportRequestSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        fichier = params.validated_data["fichier"]
+        format_fichier = params.validated_data.get("format") or fiche_import.detecter_format(fichier.name)
+        if format_fichier is None:
+            return Response(
+                {"format": ["Format non reconnu : préciser csv ou jsonl."]}, status=status.HTTP_400_BAD_REQUEST
+            )
+        rapport = fiche_import.importer(
+            fichier,
+            format_fichier,
+            request.user,
+            analyser=params.validated_data["analyser"],
+            context=self.get_serializer_context(),
+        )
+        return Response(rapport.as_dict())
+
     @extend_schema(
         tags=["Consultations"],
         summary="Rejeter la consultation",
@@ -894,7 +895,7 @@ Merci de votre confiance 🙏"""
     destroy=extend_schema(tags=["Conversations"]),
 )
 class ConversationViewSet(viewsets.ModelViewSet):
-    queryset = Conversation.objects.select_related("fiche", "user").all()
+    queryset = Conversation.objects.select_related("fiche", "user").avec_apercu().order_by("-created_at")
     serializer_class = ConversationSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -938,6 +939,7 @@ class MessageIAViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, viewset
     queryset = MessageIA.objects.all()
     serializer_class = MessageIASerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MessagePagination
 
     def get_queryset(self):  # pragma: no cover simple filtering
         user = self.request.user
@@ -978,6 +980,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     queryset = Appointment.objects.select_related("patient", "medecin", "fiche").all()
     serializer_class = AppointmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ModePagination
 
     def get_queryset(self):  # pragma: no cover - simple filtering
         qs = super().get_queryset()
@@ -1477,6 +1480,7 @@ class WebhookEventViewSet(
     queryset = WebhookEvent.objects.all()
     serializer_class = WebhookEventSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = WebhookEventPagination
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -0,0 +1,93 @@
+"""Compression transparente des textes volumineux mis en cache (synthèses, réponses d'experts).
+
+Une synthèse ou une réponse d'expert fait plusieurs Ko de markdown, relus à
+chaque sondage du résultat. Au-delà de `IA_CACHE_COMPRESS_MIN_SIZE` octets,
+le texte est stocké compressé, précédé d'un en-tête :
+
+    MAGIC (4 octets) + codec (1 octet : b"z" zlib, b"s" zstd) + données
+
+`IA_CACHE_COMPRESSION` choisit le codec ("zstd" si `zstandard` est installé,
+sinon zlib; "none" désactive). Les valeurs sans en-tête (textes courts,
+entrées écrites avant la compression) sont relues telles quelles, de même
+que tout ce qui n'est pas une chaîne.
+
+`compressed_cache` s'utilise comme le cache Django pour les clés concernées.
+"""
+
+from __future__ import annotations
+
+import zlib
+from typing import Any, Dict, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+
+try:  # dépendance optionnelle
+    import zstandard
+except ImportError:  # pragma: no cover - zlib suffit
+    zstandard = None
+
+MAGIC = b"\x1fIAC"
+ZLIB, ZSTD = b"z", b"s"
+
+
+def _codec() -> bytes:
+    choix = settings.IA_CACHE_COMPRESSION
+    if choix == "zstd" and zstandard is not None:
+        return ZSTD
+    return ZLIB
+
+
+def compresser(value: Any) -> Any:
+    """Texte compressé avec en-tête s'il dépasse le seuil et que le gain est réel; sinon la valeur inchangée."""
+    if not isinstance(value, str) or settings.IA_CACHE_COMPRESSION == "none":
+        return value
+    data = value.encode("utf-8")
+    if len(data) < settings.IA_CACHE_COMPRESS_MIN_SIZE:
+        return value
+    codec = _codec()
+    payload = zstandard.compress(data, 3) if codec == ZSTD else zlib.compress(data, 6)
+    if len(payload) + len(MAGIC) + 1 >= len(data):
+        return value
+    return MAGIC + codec + payload
+
+
+def decompresser(value: Any) -> Any:
+    """Inverse de `compresser`; les valeurs sans en-tête sont retournées telles quelles."""
+    if not isinstance(value, bytes) or not value.startswith(MAGIC):
+        return value
+    codec, payload = value[len(MAGIC) : len(MAGIC) + 1], value[len(MAGIC) + 1 :]
+    if codec == ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Valeur compressée en zstd mais `zstandard` n'est pas installé")
+        return zstandard.decompress(payload).decode("utf-8")
+    return zlib.decompress(payload).decode("utf-8")
+
+
+class CompressedCache:
+    """Sous-ensemble de l'API du cache Django, avec compression des textes volumineux."""
+
+    def __init__(self, backend=None):
+        self._backend = backend
+
+    @property
+    def backend(self):
+        return self._backend if self._backend is not None else cache
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return decompresser(self.backend.get(key, default))
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        return {key: decompresser(value) for key, value in self.backend.get_many(list(keys)).items()}
+
+    def set(self, key: str, value: Any, timeout: Any = None) -> None:
+        self.backend.set(key, compresser(value), timeout=timeout)
+
+    def delete(self, key: str) -> None:
+        self.backend.delete(key)
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        self.backend.delete_many(list(keys))
+
+
+compressed_cache = CompressedCache()
@@ -0,0 +1,121 @@
+"""Protection contre la ruée sur une entrée de cache (cache stampede).
+
+Quand une entrée très lue expire, tous les lecteurs la ratent en même temps et
+la recalculent (ou relancent le même travail) ensemble. Deux mécanismes :
+
+- un verrou de recalcul `<clé>:recalcul` (`cache.add`, atomique sur Redis) :
+  un seul appelant recalcule, les autres servent l'ancienne valeur si elle
+  existe ou attendent la nouvelle au plus `IA_STAMPEDE_WAIT` secondes;
+- le rafraîchissement anticipé probabiliste (XFetch) de `obtenir` : chaque
+  lecture peut déclencher le recalcul avant l'expiration, avec une probabilité
+  qui croît à l'approche de l'échéance et avec la durée du calcul (`beta` > 1
+  anticipe davantage). L'entrée est donc le plus souvent renouvelée avant
+  d'expirer.
+
+Les entrées de `obtenir` sont stockées avec leur durée de calcul et leur
+échéance : elles ne se lisent que par `obtenir`.
+"""
+
+from __future__ import annotations
+
+import math
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def cle_verrou(key: str) -> str:
+    return f"{key}:recalcul"
+
+
+def prendre_verrou(key: str, timeout: Optional[int] = None) -> Optional[str]:
+    """Jeton du verrou de recalcul de `key`, ou None s'il est déjà pris."""
+    jeton = uuid.uuid4().hex
+    timeout = settings.IA_STAMPEDE_LOCK_TIMEOUT if timeout is None else timeout
+    return jeton if cache.add(cle_verrou(key), jeton, timeout=timeout) else None
+
+
+# Comparaison et suppression en une opération Redis : le verrou ne peut pas expirer et être
+# repris par un autre appelant entre la lecture et la suppression
+_LIBERER_SI_JETON = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _client_redis():
+    """Client du cache par défaut s'il s'agit de django-redis, sinon None (LocMem en développement et tests)."""
+    client = getattr(cache, "client", None)
+    return client if hasattr(client, "get_client") and hasattr(client, "encode") else None
+
+
+def liberer_verrou(key: str, jeton: Optional[str]) -> None:
+    """Libère le verrou s'il appartient encore à `jeton` (il a pu expirer et être repris)."""
+    if not jeton:
+        return
+    client = _client_redis()
+    if client is not None:
+        client.get_client(write=True).eval(_LIBERER_SI_JETON, 1, client.make_key(cle_verrou(key)), client.encode(jeton))
+        return
+    if cache.get(cle_verrou(key)) == jeton:
+        cache.delete(cle_verrou(key))
+
+
+@contextmanager
+def verrou_recalcul(key: str, timeout: Optional[int] = None) -> Iterator[bool]:
+    """`with verrou_recalcul(key) as acquis:` — True pour un seul appelant à la fois."""
+    jeton = prendre_verrou(key, timeout)
+    try:
+        yield jeton is not None
+    finally:
+        liberer_verrou(key, jeton)
+
+
+def attendre(lire: Callable[[], Any], attente: Optional[float] = None, intervalle: float = 0.05) -> Any:
+    """Relit avec `lire()` jusqu'à obtenir une valeur non nulle ou l'expiration du délai."""
+    deadline = time.monotonic() + (settings.IA_STAMPEDE_WAIT if attente is None else attente)
+    while True:
+        value = lire()
+        if value is not None or time.monotonic() >= deadline:
+            return value
+        time.sleep(intervalle)
+
+
+def a_rafraichir(duree_calcul: float, echeance: float, beta: float = 1.0, now: Optional[float] = None) -> bool:
+    """Tirage XFetch : vrai si `now - duree_calcul * beta * ln(U)` dépasse l'échéance, U uniforme sur ]0, 1]."""
+    now = time.time() if now is None else now
+    return now - duree_calcul * beta * math.log(1.0 - random.random()) >= echeance
+
+
+def obtenir(
+    key: str, calcul: Callable[[], Any], timeout: int, beta: float = 1.0, attente: Optional[float] = None
+) -> Any:
+    """Valeur en cache de `key`, recalculée par un seul appelant à l'expiration ou, par anticipation, avant."""
+    if timeout <= 0:
+        return calcul()
+    entree = cache.get(key)
+    if entree is not None and not a_rafraichir(entree["duree"], entree["echeance"], beta):
+        return entree["valeur"]
+
+    with verrou_recalcul(key) as acquis:
+        if acquis:
+            debut = time.monotonic()
+            valeur = calcul()
+            entree = {"valeur": valeur, "duree": time.monotonic() - debut, "echeance": time.time() + timeout}
+            cache.set(key, entree, timeout=timeout)
+            return valeur
+    if entree is not None:
+        # Rafraîchissement anticipé déjà en cours ailleurs : la valeur actuelle est encore valide
+        return entree["valeur"]
+    entree = attendre(lambda: cache.get(key), attente)
+    if entree is not None:
+        return entree["valeur"]
+    # Recalcul concurrent trop long : l'appelant n'est pas bloqué davantage
+    return calcul()
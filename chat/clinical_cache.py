@@ -0,0 +1,85 @@
+"""Cache des synthèses IA par contenu clinique de la fiche.
+
+La clé de cache d'une analyse (`cle_analyse`) est le md5 du texte envoyé : un
+changement de libellé, de mise en forme ou une fiche recréée pour le même
+patient la rend différente. Ce cache est indexé sur une projection des seuls
+champs cliniques transmis à l'IA (`fiche_formatter.valeurs_cliniques`) :
+valeurs normalisées, casse ignorée pour les textes, sans aucune donnée
+d'identification. Une re-soumission ou une relance d'analyse du même tableau
+clinique reprend la synthèse existante sans appel LLM.
+
+Seules les synthèses complètes (tous les experts ont répondu) sont conservées,
+`IA_CLINICAL_CACHE_TIMEOUT` secondes. `IA_CLINICAL_CACHE_VERSION` fait partie
+de la clé : la changer (nouveaux prompts, nouveaux modèles) invalide le cache.
+Succès et échecs de lecture sont comptés dans `ia_metrics` (`statistiques()`).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any, Dict, Iterable, Optional
+
+from django.conf import settings
+
+from . import ia_metrics
+from .cache_compression import compressed_cache
+from .fiche_formatter import valeurs_cliniques
+
+METRIQUES = "cache_clinique"
+
+
+def projection(fiche) -> Dict[str, Optional[str]]:
+    """Champs cliniques normalisés de la fiche, comparés sans tenir compte de la casse."""
+    return {name: value.casefold() if value else value for name, value in valeurs_cliniques(fiche).items()}
+
+
+def cle_clinique(fiche) -> Optional[str]:
+    """Clé de cache du contenu clinique de la fiche (None si le cache est désactivé)."""
+    if not settings.IA_CLINICAL_CACHE or fiche is None:
+        return None
+    contenu = json.dumps(projection(fiche), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    digest = hashlib.sha256(contenu.encode("utf-8")).hexdigest()
+    return f"clinique:v{settings.IA_CLINICAL_CACHE_VERSION}:{digest}"
+
+
+def _compter(trouves: int, total: int) -> None:
+    if trouves:
+        ia_metrics.incr("hits", METRIQUES, trouves)
+    if total - trouves:
+        ia_metrics.incr("misses", METRIQUES, total - trouves)
+
+
+def lire(cle: Optional[str]) -> Optional[str]:
+    """Synthèse en cache pour cette clé clinique, ou None."""
+    if not cle:
+        return None
+    resultat = compressed_cache.get(cle)
+    _compter(int(resultat is not None), 1)
+    return resultat
+
+
+def lire_plusieurs(cles: Iterable[Optional[str]]) -> Dict[str, Any]:
+    """Synthèses en cache pour plusieurs clés (une seule lecture), comptées une fois par clé distincte."""
+    cles = {cle for cle in cles if cle}
+    if not cles:
+        return {}
+    trouves = compressed_cache.get_many(cles)
+    _compter(len(trouves), len(cles))
+    return trouves
+
+
+def enregistrer(cle: Optional[str], synthese: str) -> None:
+    if cle and synthese:
+        compressed_cache.set(cle, synthese, timeout=settings.IA_CLINICAL_CACHE_TIMEOUT)
+
+
+def statistiques() -> Dict[str, Any]:
+    """Succès, échecs et taux de succès/échec des lectures depuis la remise à zéro des compteurs."""
+    valeurs = ia_metrics.compteurs(METRIQUES, ("hits", "misses"))
+    total = valeurs["hits"] + valeurs["misses"]
+    return {
+        **valeurs,
+        "hit_ratio": round(valeurs["hits"] / total, 4) if total else None,
+        "miss_ratio": round(valeurs["misses"] / total, 4) if total else None,
+    }
@@ -0,0 +1,75 @@
+"""Attribution des numéros de dossier `CONS-AAAAMMJJ-NNN` par compteur journalier.
+
+Un numéro se tirait en lisant le dernier dossier du jour puis en testant
+jusqu'à dix candidats avec `.exists()` : plusieurs requêtes par fiche, des
+collisions entre workers concurrents et des trous sous charge. Chaque jour a
+désormais une ligne `DossierSequence` dont le compteur est incrémenté
+atomiquement :
+
+- PostgreSQL et SQLite ≥ 3.35 : un seul `INSERT … ON CONFLICT DO UPDATE …
+  RETURNING`, sans lecture préalable ni verrou applicatif;
+- autres bases : ligne verrouillée (`select_for_update`) dans une transaction.
+
+`reserver(n)` réserve un bloc de `n` numéros consécutifs en une seule
+opération, pour les imports en masse.
+"""
+
+from __future__ import annotations
+
+import datetime
+from typing import List, Optional
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import DossierSequence
+
+PREFIXE = "CONS"
+
+
+def format_numero(jour: datetime.date, numero: int) -> str:
+    return f"{PREFIXE}-{jour:%Y%m%d}-{numero:03d}"
+
+
+def _upsert_supporte() -> bool:
+    return connection.vendor in ("postgresql", "sqlite") and connection.features.can_return_columns_from_insert
+
+
+def _incrementer_upsert(jour: datetime.date, nombre: int) -> int:
+    table = connection.ops.quote_name(DossierSequence._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (jour, dernier) VALUES (%s, %s) "
+            f"ON CONFLICT (jour) DO UPDATE SET dernier = {table}.dernier + EXCLUDED.dernier "
+            "RETURNING dernier",
+            [jour, nombre],
+        )
+        return cursor.fetchone()[0]
+
+
+def _incrementer_verrou(jour: datetime.date, nombre: int) -> int:
+    with transaction.atomic():
+        sequence, _ = DossierSequence.objects.select_for_update().get_or_create(jour=jour)
+        sequence.dernier += nombre
+        sequence.save(update_fields=["dernier"])
+        return sequence.dernier
+
+
+def reserver(nombre: int = 1, jour: Optional[datetime.date] = None) -> range:
+    """Réserve `nombre` numéros consécutifs du jour et retourne leur plage."""
+    if nombre < 1:
+        raise ValueError("Le nombre de numéros à réserver doit être positif")
+    jour = jour or timezone.now().date()
+    dernier = _incrementer_upsert(jour, nombre) if _upsert_supporte() else _incrementer_verrou(jour, nombre)
+    return range(dernier - nombre + 1, dernier + 1)
+
+
+def reserver_numeros(nombre: int, jour: Optional[datetime.date] = None) -> List[str]:
+    """Bloc de `nombre` numéros de dossier formatés, prêts pour un `bulk_create`."""
+    jour = jour or timezone.now().date()
+    return [format_numero(jour, numero) for numero in reserver(nombre, jour)]
+
+
+def prochain_numero(jour: Optional[datetime.date] = None) -> str:
+    """Numéro de dossier suivant du jour."""
+    return reserver_numeros(1, jour)[0]
@@ -0,0 +1,257 @@
+"""Texte canonique d'une fiche de consultation, tel qu'envoyé aux experts IA.
+
+Un seul formateur pour toutes les entrées (API, formulaire, relance, lots) : la
+clé de cache d'une analyse est le md5 de ce texte, deux fiches au contenu
+clinique identique doivent donc produire exactement le même texte.
+
+Le texte est décrit par `SECTIONS` (ordre fixe) et compilé une fois par
+processus à partir des métadonnées des champs du modèle : libellés des
+`choices`, booléens en Oui/Non/NR, nombres sans zéros superflus (37.0 -> 37),
+textes normalisés (NFC, espaces et retours à la ligne réduits à un espace).
+Les textes libres vides sont omis, les autres champs vides valent "NR".
+
+Les données d'identification (nom, téléphone, adresse, personne à contacter,
+dates, médecin) ne sont pas transmises : elles n'apportent rien à l'analyse
+et empêcheraient deux patients au même tableau de partager le cache.
+"""
+
+from __future__ import annotations
+
+import unicodedata
+from functools import lru_cache
+from operator import attrgetter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.db import models
+
+from .models import FicheConsultation
+
+NON_RENSEIGNE = "NR"
+
+# (titre, ((champ, libellé[, unité]), ...))
+SECTIONS = (
+    (
+        "Patient",
+        (
+            ("age", "Âge", "ans"),
+            ("sexe", "Sexe"),
+            ("etat_civil", "État civil"),
+            ("occupation", "Occupation"),
+        ),
+    ),
+    (
+        "Anamnèse",
+        (
+            ("motif_consultation", "Motif de consultation"),
+            ("histoire_maladie", "Histoire de la maladie"),
+            ("hypothese_patient_medecin", "Hypothèse patient/médecin"),
+            ("analyses_proposees", "Analyses proposées"),
+        ),
+    ),
+    (
+        "Signes vitaux",
+        (
+            ("temperature", "Température", "°C"),
+            ("spo2", "SpO2", "%"),
+            ("tension_arterielle", "Tension artérielle"),
+            ("pouls", "Pouls", "bpm"),
+            ("frequence_respiratoire", "Fréquence respiratoire", "/min"),
+            ("poids", "Poids", "kg"),
+        ),
+    ),
+    (
+        "Plaintes",
+        (
+            ("cephalees", "Céphalées"),
+            ("vertiges", "Vertiges"),
+            ("palpitations", "Palpitations"),
+            ("troubles_visuels", "Troubles visuels"),
+            ("nycturie", "Nycturie"),
+        ),
+    ),
+    (
+        "Médicaments déjà pris",
+        (
+            ("maison_medicaments", "À la maison"),
+            ("pharmacie_medicaments", "En pharmacie"),
+            ("centre_sante_medicaments", "Au centre de santé"),
+            ("hopital_medicaments", "À l'hôpital"),
+            ("medicaments_non_pris", "Médicaments non pris"),
+            ("details_medicaments", "Détails"),
+        ),
+    ),
+    (
+        "Antécédents personnels",
+        (
+            ("hypertendu", "Hypertension"),
+            ("diabetique", "Diabète"),
+            ("epileptique", "Épilepsie"),
+            ("trouble_comportement", "Troubles du comportement"),
+            ("gastritique", "Gastrite"),
+            ("autres_antecedents", "Autres antécédents"),
+        ),
+    ),
+    (
+        "Antécédents familiaux",
+        (
+            ("familial_drepanocytaire", "Drépanocytose"),
+            ("familial_diabetique", "Diabète"),
+            ("familial_obese", "Obésité"),
+            ("familial_hypertendu", "Hypertension"),
+            ("familial_trouble_comportement", "Troubles du comportement"),
+            ("lien_pere", "Lien avec le père"),
+            ("lien_mere", "Lien avec la mère"),
+            ("lien_frere", "Lien avec le frère"),
+            ("lien_soeur", "Lien avec la sœur"),
+        ),
+    ),
+    (
+        "Mode de vie",
+        (
+            ("tabac", "Tabac"),
+            ("alcool", "Alcool"),
+            ("activite_physique", "Activité physique"),
+            ("activite_physique_detail", "Détail de l'activité physique"),
+            ("alimentation_habituelle", "Alimentation habituelle"),
+        ),
+    ),
+    (
+        "Allergies",
+        (
+            ("allergie_medicamenteuse", "Allergie médicamenteuse"),
+            ("medicament_allergique", "Médicament allergène"),
+        ),
+    ),
+    (
+        "Traumatismes",
+        (
+            ("evenement_traumatique", "Événement traumatique"),
+            ("trauma_divorce", "Divorce"),
+            ("trauma_perte_parent", "Perte de parent"),
+            ("trauma_deces_epoux", "Décès d'époux(se)"),
+            ("trauma_deces_enfant", "Décès d'enfant"),
+            ("etat_general", "État général"),
+        ),
+    ),
+    (
+        "Capacités",
+        (
+            ("capacite_physique", "Capacité physique"),
+            ("capacite_physique_score", "Score physique"),
+            ("capacite_psychologique", "Capacité psychologique"),
+            ("capacite_psychologique_score", "Score psychologique"),
+        ),
+    ),
+    (
+        "Examen clinique",
+        (
+            ("etat", "État"),
+            ("par_quoi", "Altéré par"),
+            ("febrile", "Fébrile"),
+            ("coloration_bulbaire", "Coloration bulbaire"),
+            ("coloration_palpebrale", "Coloration palpébrale"),
+            ("tegument", "Téguments"),
+            ("tete", "Tête"),
+            ("cou", "Cou"),
+            ("paroi_thoracique", "Paroi thoracique"),
+            ("poumons", "Poumons"),
+            ("coeur", "Cœur"),
+            ("epigastre_hypochondres", "Épigastre et hypochondres"),
+            ("peri_ombilical_flancs", "Péri-ombilical et flancs"),
+            ("hypogastre_fosses_iliaques", "Hypogastre et fosses iliaques"),
+            ("membres", "Membres"),
+            ("colonne_bassin", "Colonne et bassin"),
+            ("examen_gynecologique", "Examen gynécologique"),
+        ),
+    ),
+    (
+        "Perceptions du patient",
+        (
+            ("preoccupations", "Préoccupations"),
+            ("comprehension", "Compréhension"),
+            ("attentes", "Attentes"),
+            ("engagement", "Engagement"),
+        ),
+    ),
+)
+
+
+def normaliser_texte(value: Any) -> str:
+    """Forme NFC, espaces (retours à la ligne compris) réduits à un seul."""
+    return " ".join(unicodedata.normalize("NFC", str(value)).split())
+
+
+def _booleen(value: Optional[bool]) -> Optional[str]:
+    return NON_RENSEIGNE if value is None else ("Oui" if value else "Non")
+
+
+def _nombre(value: Any) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    # 37.0 -> "37", 37.50 -> "37.5" ; arrondi pour absorber les erreurs de flottants
+    return format(round(float(value), 2), "g")
+
+
+def _choix(mapping: dict) -> Callable[[Any], Optional[str]]:
+    def normaliser(value: Any) -> Optional[str]:
+        if value in (None, ""):
+            return None
+        return normaliser_texte(mapping.get(value, value))
+
+    return normaliser
+
+
+def _texte(value: Any) -> Optional[str]:
+    return (normaliser_texte(value) or None) if value is not None else None
+
+
+def _normaliseur(field: models.Field) -> Tuple[Callable[[Any], Optional[str]], bool]:
+    """Normaliseur d'un champ selon son type, et si sa ligne est omise quand il est vide."""
+    if field.choices:
+        return _choix({key: str(label) for key, label in field.flatchoices}), False
+    if isinstance(field, models.BooleanField):
+        return _booleen, False
+    if isinstance(field, (models.IntegerField, models.FloatField, models.DecimalField)):
+        return _nombre, False
+    # Textes libres : une ligne vide n'apporte rien au prompt
+    return _texte, True
+
+
+@lru_cache(maxsize=None)
+def _compiler() -> Tuple[Tuple[str, Tuple[Tuple[str, Callable, Callable, str, str, bool], ...]], ...]:
+    """Sections compilées : (titre, ((champ, getter, normaliseur, libellé, unité, omettre_si_vide), ...))."""
+    meta = FicheConsultation._meta
+    compiled = []
+    for titre, champs in SECTIONS:
+        lignes = []
+        for spec in champs:
+            name, libelle, unite = spec if len(spec) == 3 else (*spec, "")
+            normaliseur, omettre = _normaliseur(meta.get_field(name))
+            lignes.append((name, attrgetter(name), normaliseur, libelle, f" {unite}" if unite else "", omettre))
+        compiled.append((titre, tuple(lignes)))
+    return tuple(compiled)
+
+
+def valeurs_cliniques(fiche: FicheConsultation) -> Dict[str, Optional[str]]:
+    """Valeurs normalisées des champs transmis à l'IA (None si vide), sans libellés ni mise en forme."""
+    return {
+        name: normaliseur(getter(fiche)) for _, lignes in _compiler() for name, getter, normaliseur, _, _, _ in lignes
+    }
+
+
+def formater_fiche(fiche: FicheConsultation) -> str:
+    """Texte canonique de la fiche pour l'analyse IA (identique pour un même contenu clinique)."""
+    blocs: List[str] = []
+    for titre, lignes in _compiler():
+        rendu = []
+        for _, getter, normaliseur, libelle, unite, omettre in lignes:
+            value = normaliseur(getter(fiche))
+            if value is None:
+                if omettre:
+                    continue
+                rendu.append(f"- {libelle} : {NON_RENSEIGNE}")
+            else:
+                rendu.append(f"- {libelle} : {value}{unite}")
+        if rendu:
+            blocs.append(f"{titre} :\n" + "\n".join(rendu))
+    return "\n\n".join(blocs)
@@ -0,0 +1,187 @@
+"""Import en masse de fiches de consultation (registres papier, cliniques partenaires).
+
+Le fichier est lu en flux, CSV (en-têtes = noms des champs du modèle) ou JSON
+lines (un objet par ligne), et traité par blocs de `FICHE_IMPORT_CHUNK_SIZE`
+lignes :
+
+- chaque ligne est validée par `FicheConsultationSerializer` (mêmes règles que
+  l'API); les cellules CSV vides valent « champ absent »;
+- les numéros de dossier du bloc sont réservés en une opération
+  (`dossier_sequence.reserver_numeros`), puis fiches et conversations sont
+  insérées par `bulk_create`, dans une transaction par bloc;
+- les lignes invalides sont rapportées (`erreurs` : numéro de ligne et
+  erreurs par champ) sans interrompre l'import.
+
+Avec `analyser=True`, chaque bloc est soumis en lots d'analyses
+(`ia_service.lancer_lot`) d'au plus `IA_BATCH_MAX_SIZE` fiches, la limite de
+l'API de lots. Les lots de l'import sont chaînés, chacun démarrant à la fin du
+précédent : au plus `IA_BATCH_CONCURRENCY` analyses en cours pour tout l'import.
+"""
+
+from __future__ import annotations
+
+import codecs
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .dossier_sequence import reserver_numeros
+from .fiche_formatter import formater_fiche
+from .models import Conversation, FicheConsultation, MessageIA
+from .serializers import FicheConsultationSerializer
+
+FORMATS = ("csv", "jsonl")
+
+
+@dataclass
+class RapportImport:
+    total: int = 0
+    importees: int = 0
+    erreurs: List[Dict[str, Any]] = field(default_factory=list)
+    lots: List[int] = field(default_factory=list)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total": self.total,
+            "importees": self.importees,
+            "rejetees": len(self.erreurs),
+            "erreurs": self.erreurs,
+            "lots": self.lots,
+        }
+
+
+def detecter_format(nom: str) -> Optional[str]:
+    """Format d'après l'extension du fichier (`.csv`, `.jsonl`/`.ndjson`), sinon None."""
+    nom = (nom or "").lower()
+    if nom.endswith(".csv"):
+        return "csv"
+    if nom.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return None
+
+
+def _texte(flux: IO) -> Iterable[str]:
+    """Lignes de texte du flux; les fichiers binaires (uploads) sont décodés au fil de la lecture."""
+    if isinstance(flux, io.TextIOBase):
+        return flux
+    return codecs.iterdecode(flux, "utf-8-sig")
+
+
+def lire_lignes(flux: IO, format: str) -> Iterator[Tuple[int, Any]]:
+    """`(numéro de ligne, données)` pour chaque enregistrement du fichier, lu en flux."""
+    if format not in FORMATS:
+        raise ValueError(f"Format d'import inconnu : {format}")
+    texte = _texte(flux)
+    if format == "csv":
+        reader = csv.DictReader(texte)
+        for row in reader:
+            yield reader.line_num, {key: value for key, value in row.items() if key and value not in ("", None)}
+        return
+    for numero, ligne in enumerate(texte, start=1):
+        if not ligne.strip():
+            continue
+        try:
+            yield numero, json.loads(ligne)
+        except ValueError as exc:
+            yield numero, exc
+
+
+def _valider(data: Any, context: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Any]:
+    if isinstance(data, ValueError):
+        return None, {"non_field_errors": [f"JSON invalide : {data}"]}
+    if not isinstance(data, dict):
+        return None, {"non_field_errors": ["Un objet JSON est attendu"]}
+    serializer = FicheConsultationSerializer(data=data, context=context)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    return serializer.validated_data, None
+
+
+def _importer_bloc(
+    lignes: List[Tuple[int, Dict[str, Any]]],
+    user,
+    extra: Dict[str, Any],
+    analyser: bool,
+    precedent: Optional[int] = None,
+) -> Tuple[List[FicheConsultation], List[int]]:
+    from .ia_service import lancer_lot
+
+    heure = timezone.localtime().time()
+    numeros = reserver_numeros(len(lignes))
+    with transaction.atomic():
+        fiches = FicheConsultation.objects.bulk_create(
+            [
+                FicheConsultation(**{**data, **extra}, numero_dossier=numero, heure_debut=heure)
+                for (_, data), numero in zip(lignes, numeros)
+            ]
+        )
+        conversations = Conversation.objects.bulk_create([Conversation(user=user, fiche=fiche) for fiche in fiches])
+        if not analyser:
+            return fiches, []
+        textes = [(formater_fiche(fiche), conversation) for fiche, conversation in zip(fiches, conversations)]
+        MessageIA.objects.bulk_create(
+            [MessageIA(conversation=conversation, role="user", content=texte) for texte, conversation in textes]
+        )
+        lots = []
+        for debut in range(0, len(textes), settings.IA_BATCH_MAX_SIZE):
+            precedent = lancer_lot(user, textes[debut : debut + settings.IA_BATCH_MAX_SIZE], apres=precedent).id
+            lots.append(precedent)
+        return fiches, lots
+
+
+def importer(
+    flux: IO,
+    format: str,
+    user,
+    analyser: bool = False,
+    chunk_size: Optional[int] = None,
+    context: Optional[Dict[str, Any]] = None,
+) -> RapportImport:
+    """Importe les fiches du fichier au nom de `user`; retourne le rapport d'import."""
+    chunk_size = chunk_size or settings.FICHE_IMPORT_CHUNK_SIZE
+    extra = {"user": user} if getattr(user, "role", None) == "patient" else {}
+    rapport = RapportImport()
+    lignes = lire_lignes(flux, format)
+    while True:
+        bloc = list(islice(lignes, chunk_size))
+        if not bloc:
+            return rapport
+        rapport.total += len(bloc)
+        valides = []
+        for numero, data in bloc:
+            validated, erreurs = _valider(data, context or {})
+            if erreurs is not None:
+                rapport.erreurs.append({"ligne": numero, "erreurs": erreurs})
+            else:
+                valides.append((numero, validated))
+        if not valides:
+            continue
+        fiches, lots = _importer_bloc(valides, user, extra, analyser, rapport.lots[-1] if rapport.lots else None)
+        rapport.importees += len(fiches)
+        rapport.lots.extend(lots)
+
+
+def importer_fichier(chemin: str, user, format: Optional[str] = None, **kwargs) -> RapportImport:
+    """`importer` sur un fichier local, format déduit de l'extension à défaut."""
+    format = format or detecter_format(chemin)
+    if format is None:
+        raise ValueError(f"Format d'import non reconnu pour {chemin} (csv ou jsonl)")
+    with open(chemin, encoding="utf-8-sig", newline="") as flux:
+        return importer(flux, format, user, **kwargs)
+
+
+def iter_erreurs(rapport: RapportImport) -> Iterable[str]:
+    """Erreurs du rapport, une ligne lisible par enregistrement rejeté."""
+    for erreur in rapport.erreurs:
+        details = "; ".join(
+            f"{champ}: {' '.join(str(message) for message in messages)}"
+            for champ, messages in erreur["erreurs"].items()
+        )
+        yield f"ligne {erreur['ligne']} : {details}"
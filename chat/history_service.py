@@ -0,0 +1,59 @@
+"""Historique des conversations affiché dans l'interface de chat (page d'accueil, rafraîchissement, « charger plus »).
+
+Seules les conversations de l'utilisateur qui contiennent au moins un message
+`user` ou `synthese` sont listées, des plus récentes aux plus anciennes, par
+pages de `CHAT_HISTORY_PAGE_SIZE`. Une page coûte deux requêtes quel que soit
+le volume : les conversations (une de plus que la page, pour savoir s'il en
+reste, sans `COUNT`) puis leurs messages, chargés par `Prefetch`.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Prefetch
+
+from .models import Conversation, MessageIA
+
+ROLES_HISTORIQUE = ("user", "synthese")
+
+
+@dataclass
+class PageHistorique:
+    items: List[Dict[str, Any]]
+    page: int
+    next_page: Optional[int]
+
+    @property
+    def has_more(self) -> bool:
+        return self.next_page is not None
+
+
+def parse_page(value: Optional[str]) -> int:
+    """Numéro de page client (entier >= 1); 1 si la valeur est absente ou invalide."""
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def conversations_historique(user):
+    """Conversations de `user` ayant des messages d'historique, messages préchargés dans `messages_historique`."""
+    messages = MessageIA.objects.filter(role__in=ROLES_HISTORIQUE)
+    return (
+        Conversation.objects.filter(user=user)
+        .filter(Exists(messages.filter(conversation=OuterRef("pk"))))
+        .order_by("-created_at", "-id")
+        .prefetch_related(Prefetch("messageia_set", queryset=messages.order_by("id"), to_attr="messages_historique"))
+    )
+
+
+def page_historique(user, page: int = 1, taille: Optional[int] = None) -> PageHistorique:
+    """Page `page` de l'historique de `user` : `items` de la forme `{"conversation", "messages"}`."""
+    taille = taille or settings.CHAT_HISTORY_PAGE_SIZE
+    debut = (page - 1) * taille
+    conversations = list(conversations_historique(user)[debut : debut + taille + 1])
+    items = [{"conversation": conv, "messages": conv.messages_historique} for conv in conversations[:taille]]
+    return PageHistorique(items=items, page=page, next_page=page + 1 if len(conversations) > taille else None)
@@ -1,21 +1,38 @@
-import hashlib
-
 from celery.result import AsyncResult
+from django.conf import settings
 from django.core.cache import cache
-from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import OpenApiParameter, extend_schema
-from rest_framework import status
+from rest_framework import generics, status
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework.response import Response
 from rest_framework.throttling import ScopedRateThrottle
 from rest_framework.views import APIView
 
-from authentication.permissions import IsMedecin
+from authentication.permissions import IsMedecin, IsMedecinOrAdmin
+
+from . import cache_stampede, clinical_cache, ia_metrics, result_store, triage
+from .ia_serializers import (
+    AnalyseResultSerializer,
+    AnalyseSymptomesRequestSerializer,
+    AnalysisBatchSerializer,
+    AnalysisRunSerializer,
+    TaskStatusSerializer,
+)
+from .ia_service import cle_analyse, lancer_analyse
+from .ia_stream import conversation_key, flux_evenements, lire_resultat, parse_offset
+from .models import AnalysisBatch, AnalysisRun, Conversation, MessageIA
 
-from .ia_serializers import AnalyseResultSerializer, AnalyseSymptomesRequestSerializer, TaskStatusSerializer
-from .models import Conversation, MessageIA
-from .tasks import analyse_symptomes_task
+# Statut AnalysisRun -> état Celery exposé par TaskStatusAPIView
+RUN_STATES = {
+    AnalysisRun.RunStatus.QUEUED: "PENDING",
+    AnalysisRun.RunStatus.PENDING: "PENDING",
+    AnalysisRun.RunStatus.RUNNING: "STARTED",
+    AnalysisRun.RunStatus.DONE: "SUCCESS",
+    AnalysisRun.RunStatus.FAILED: "FAILURE",
+}
 
 
 class StartAnalyseAPIView(APIView):
@@ -45,9 +62,8 @@ class StartAnalyseAPIView(APIView):
         # Message utilisateur sauvegardé avant la tâche
         MessageIA.objects.create(conversation=conversation, role="user", content=symptomes)
 
-        hash_key = hashlib.md5(symptomes.encode("utf-8")).hexdigest()  # nosec B324
-        cache_key = f"diagnostic_{hash_key}"
-        cached = cache.get(cache_key)
+        cache_key = cle_analyse(symptomes)
+        cached = result_store.lire_cache(cache_key)
         if cached:
             return Response(
                 {
@@ -58,17 +74,15 @@ class StartAnalyseAPIView(APIView):
                 }
             )
 
-        # Lancement tâche après commit pour éviter race conditions si future transaction
-        def launch_task():
-            analyse_symptomes_task.delay(symptomes, request.user.id, conversation.id, cache_key)
-
-        transaction.on_commit(launch_task)
+        # Tâche lancée après commit; une analyse identique en cours est réutilisée (même task_id)
+        task_id, cache_key, already_running = lancer_analyse(symptomes, request.user.id, conversation.id, cache_key)
 
         return Response(
             {
-                "task_id": None,  # On ne récupère pas l'id quand lancé via callback différé
+                "task_id": task_id,
                 "cache_key": cache_key,
                 "status": "pending",
+                "already_running": already_running,
             },
             status=status.HTTP_202_ACCEPTED,
         )
@@ -89,6 +103,13 @@ class TaskStatusAPIView(APIView):
         responses={200: TaskStatusSerializer},
     )
     def get(self, request, task_id):
+        run = AnalysisRun.objects.filter(task_id=task_id).first()
+        if run is not None:
+            payload = {"task_id": task_id, "state": RUN_STATES[run.status], "run": AnalysisRunSerializer(run).data}
+            if run.error_message:
+                payload["info"] = run.error_message
+            return Response(payload)
+
         result = AsyncResult(task_id)
         payload = {
             "task_id": task_id,
@@ -110,8 +131,13 @@ class AnalyseResultAPIView(APIView):
     @extend_schema(
         tags=["IA"],
         summary="Récupérer le résultat (cache)",
+        description=(
+            "Pendant la génération, renvoie `status: partial` et uniquement le texte ajouté depuis `offset`. "
+            "Le client renvoie l'`offset` reçu au prochain appel."
+        ),
         parameters=[
             OpenApiParameter(name="cache_key", location=OpenApiParameter.QUERY, required=True, type=str),
+            OpenApiParameter(name="offset", location=OpenApiParameter.QUERY, required=False, type=int),
         ],
         responses={200: AnalyseResultSerializer},
     )
@@ -119,9 +145,139 @@ class AnalyseResultAPIView(APIView):
         cache_key = request.query_params.get("cache_key")
         if not cache_key:
             return Response({"detail": "cache_key requis"}, status=400)
-        cached = cache.get(cache_key)
-        if cached:
-            data = {"status": "done", "response": cached, "cache_key": cache_key}
-        else:
-            data = {"status": "pending", "response": "", "cache_key": cache_key}
-        return Response(AnalyseResultSerializer(data).data)
+        offset = parse_offset(request.query_params.get("offset"))
+        if offset is None:
+            return Response({"detail": "offset invalide"}, status=400)
+        return Response(AnalyseResultSerializer(lire_resultat(cache_key, offset)).data)
+
+
+class AnalysisRunListAPIView(generics.ListAPIView):
+    """Historique des exécutions d'analyse (où passe le temps : file, experts, synthèse)."""
+
+    permission_classes = [IsAuthenticated, IsMedecin]
+    serializer_class = AnalysisRunSerializer
+    throttle_scope = "ia-status"
+    throttle_classes = [ScopedRateThrottle]
+
+    @extend_schema(
+        tags=["IA"],
+        summary="Lister les exécutions d'analyse",
+        parameters=[
+            OpenApiParameter(name="status", location=OpenApiParameter.QUERY, required=False, type=str),
+            OpenApiParameter(name="cache_key", location=OpenApiParameter.QUERY, required=False, type=str),
+            OpenApiParameter(name="fiche", location=OpenApiParameter.QUERY, required=False, type=int),
+            OpenApiParameter(name="conversation", location=OpenApiParameter.QUERY, required=False, type=int),
+        ],
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        qs = AnalysisRun.objects.all()
+        params = self.request.query_params
+        for field in ("status", "cache_key", "fiche", "conversation"):
+            if params.get(field):
+                qs = qs.filter(**{field: params[field]})
+        return qs
+
+
+class AnalysisBatchAPIView(generics.RetrieveAPIView):
+    """Progression d'un lot soumis via `fiche-consultation/batch-analyse/`."""
+
+    permission_classes = [IsAuthenticated]
+    serializer_class = AnalysisBatchSerializer
+    throttle_scope = "ia-status"
+    throttle_classes = [ScopedRateThrottle]
+
+    @extend_schema(tags=["IA"], summary="Progression d'un lot d'analyses")
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_queryset(self):
+        qs = AnalysisBatch.objects.all()
+        if getattr(self.request.user, "role", None) == "patient":
+            qs = qs.filter(created_by=self.request.user)
+        return qs
+
+
+class IAQueuesAPIView(APIView):
+    """Files d'analyse par priorité de triage : profondeur et temps d'attente."""
+
+    permission_classes = [IsAuthenticated, IsMedecinOrAdmin]
+    throttle_scope = "ia-status"
+    throttle_classes = [ScopedRateThrottle]
+
+    @extend_schema(tags=["IA"], summary="Files d'analyse par priorité", responses={200: dict})
+    def get(self, request):
+        return Response(cache_stampede.obtenir("ia_queues", triage.etat_files, settings.IA_QUEUE_STATS_CACHE_TIMEOUT))
+
+
+class IAMetricsAPIView(APIView):
+    """Compteurs par fournisseur (appels, échecs, disjoncteurs, bascules, requêtes couvertes, saturation)
+    et succès/échecs du cache clinique sous `cache_clinique`."""
+
+    permission_classes = [IsAuthenticated, IsMedecinOrAdmin]
+    throttle_scope = "ia-status"
+    throttle_classes = [ScopedRateThrottle]
+
+    @extend_schema(tags=["IA"], summary="Métriques des fournisseurs LLM", responses={200: dict})
+    def get(self, request):
+        return Response({**ia_metrics.snapshot(), clinical_cache.METRIQUES: clinical_cache.statistiques()})
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Accepte `Accept: text/event-stream`; les erreurs restent rendues en JSON."""
+
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
+
+
+class AnalyseEventsAPIView(APIView):
+    """Flux Server-Sent Events de la progression d'une analyse.
+
+    Chaque connexion occupe un thread du serveur web pendant au plus
+    `IA_SSE_MAX_DURATION` secondes : déployer gunicorn avec des workers
+    `gthread` (ou en ASGI) plutôt qu'avec des workers synchrones.
+    """
+
+    permission_classes = [IsAuthenticated, IsMedecin]
+    throttle_scope = "ia-events"
+    throttle_classes = [ScopedRateThrottle]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    @extend_schema(
+        tags=["IA"],
+        summary="Suivre une analyse en temps réel (SSE)",
+        description=(
+            "Flux `text/event-stream` : événements `expert` (un expert a répondu), `synthese` (texte ajouté, "
+            "avec `offset`), `status` (fiche passée en `analyse_terminee`), puis `done` ou `error`. "
+            "Reprise après coupure via l'en-tête `Last-Event-ID`."
+        ),
+        parameters=[
+            OpenApiParameter(name="cache_key", location=OpenApiParameter.QUERY, required=False, type=str),
+            OpenApiParameter(name="conversation_id", location=OpenApiParameter.QUERY, required=False, type=int),
+        ],
+        responses={(200, "text/event-stream"): str},
+    )
+    def get(self, request):
+        cache_key = request.query_params.get("cache_key")
+        conversation_id = request.query_params.get("conversation_id")
+        if not cache_key and conversation_id:
+            conversation = get_object_or_404(Conversation, id=conversation_id)
+            cache_key = cache.get(conversation_key(conversation.id))
+            if not cache_key:
+                return Response({"detail": "Aucune analyse pour cette conversation"}, status=404)
+        if not cache_key:
+            return Response({"detail": "cache_key ou conversation_id requis"}, status=400)
+        last_event_id = parse_offset(request.headers.get("Last-Event-ID"))
+        if last_event_id is None:
+            return Response({"detail": "Last-Event-ID invalide"}, status=400)
+
+        response = StreamingHttpResponse(flux_evenements(cache_key, last_event_id), content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # pas de mise en tampon côté nginx
+        return response
@@ -0,0 +1,149 @@
+"""Compaction des réponses d'experts avant la synthèse, selon un budget de tokens.
+
+Chaque réponse d'expert suit le format à 6 sections du prompt d'analyse. Au-delà
+de `settings.IA_SYNTHESE_EXPERT_BUDGET` tokens, elle est réduite en conservant
+les sections par ordre de priorité clinique (diagnostics et traitement d'abord),
+la dernière section retenue étant tronquée sur une fin de ligne. Le prompt de
+synthèse reste ainsi borné quelle que soit la verbosité des experts, ce qui
+stabilise le temps jusqu'au premier token.
+
+Le comptage utilise `tiktoken` s'il est disponible (dépendance de
+`langchain-openai`), sinon une estimation à 4 caractères par token. L'encodeur
+est chargé au démarrage des workers (`prechauffer`) plutôt qu'à la première
+synthèse.
+"""
+
+from __future__ import annotations
+
+import functools
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+
+# Sections du format de réponse, par ordre de priorité pour la synthèse
+PRIORITE_SECTIONS = (2, 4, 1, 3, 5, 6)
+
+_SECTION_RE = re.compile(r"^\s*#{1,6}\s*\**\s*([1-6])\s*[.)]", re.MULTILINE)
+MARQUE_TRONCATURE = "[…]"
+
+
+@functools.lru_cache(maxsize=4)
+def _encodeur(name: str) -> Optional[Any]:
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(name)
+    except Exception:  # module absent ou fichier d'encodage non téléchargeable
+        return None
+
+
+def prechauffer() -> None:
+    """Charge l'encodeur configuré (lecture, voire téléchargement, du fichier d'encodage)."""
+    if settings.IA_TOKENIZER != "approx":
+        _encodeur(settings.IA_TOKENIZER)
+
+
+def compter_tokens(text: str) -> int:
+    encodeur = _encodeur(settings.IA_TOKENIZER) if settings.IA_TOKENIZER != "approx" else None
+    if encodeur is not None:
+        return len(encodeur.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def decouper_sections(text: str) -> Tuple[str, Dict[int, str]]:
+    """Préambule et sections numérotées (1 à 6) d'une réponse d'expert."""
+    matches = list(_SECTION_RE.finditer(text))
+    if not matches:
+        return text, {}
+    sections: Dict[int, str] = {}
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        numero = int(match.group(1))
+        sections[numero] = (sections.get(numero, "") + text[match.start() : end]).rstrip() + "\n"
+    return text[: matches[0].start()].strip(), sections
+
+
+def tronquer(text: str, budget: int) -> str:
+    """Garde les premières lignes de `text` qui tiennent dans `budget` tokens."""
+    if compter_tokens(text) <= budget:
+        return text
+    lignes: List[str] = []
+    used = compter_tokens(MARQUE_TRONCATURE)
+    for ligne in text.splitlines():
+        cost = compter_tokens(ligne + "\n")
+        if used + cost > budget:
+            break
+        lignes.append(ligne)
+        used += cost
+    return "\n".join(lignes + [MARQUE_TRONCATURE]) + "\n"
+
+
+def _mention_omises(numeros: Iterable[int]) -> str:
+    return f"(Sections omises pour la synthèse : {', '.join(str(n) for n in numeros)})\n"
+
+
+@dataclass
+class Compaction:
+    text: str
+    tokens_avant: int
+    tokens_apres: int
+    sections_omises: Tuple[int, ...] = ()
+
+    @property
+    def economie(self) -> int:
+        return self.tokens_avant - self.tokens_apres
+
+
+def compacter_reponse(text: str, budget: Optional[int] = None) -> Compaction:
+    """Réduit une réponse d'expert à `budget` tokens (0 = pas de compaction)."""
+    budget = settings.IA_SYNTHESE_EXPERT_BUDGET if budget is None else budget
+    avant = compter_tokens(text)
+    if not budget or avant <= budget:
+        return Compaction(text, avant, avant)
+
+    _, sections = decouper_sections(text)
+    if not sections:
+        compact = tronquer(text, budget)
+        return Compaction(compact, avant, compter_tokens(compact))
+
+    parts: List[str] = []
+    omises: List[int] = []
+    # Place réservée à la mention des sections omises
+    restant = budget - compter_tokens(_mention_omises(PRIORITE_SECTIONS))
+    for numero in PRIORITE_SECTIONS:
+        section = sections.get(numero)
+        if section is None:
+            continue
+        cout = compter_tokens(section)
+        if cout > restant:
+            section = tronquer(section, restant)
+            cout = compter_tokens(section)
+            if section.count("\n") < 2:  # titre seul ou rien : section omise
+                omises.append(numero)
+                continue
+        parts.append(section)
+        restant -= cout
+    if omises:
+        parts.append(_mention_omises(sorted(omises)))
+    compact = "".join(parts)
+    return Compaction(compact, avant, compter_tokens(compact), tuple(sorted(omises)))
+
+
+def compacter_resultats(
+    results: Dict[str, str], budget: Optional[int] = None
+) -> Tuple[Dict[str, str], Dict[str, Dict[str, Any]]]:
+    """Compacte chaque réponse; retourne les textes et les statistiques d'économie par expert."""
+    textes: Dict[str, str] = {}
+    stats: Dict[str, Dict[str, Any]] = {}
+    for name, text in results.items():
+        compaction = compacter_reponse(text, budget)
+        textes[name] = compaction.text
+        stats[name] = {
+            "tokens_avant": compaction.tokens_avant,
+            "tokens_apres": compaction.tokens_apres,
+            "economie": compaction.economie,
+            "sections_omises": list(compaction.sections_omises),
+        }
+    return textes, stats
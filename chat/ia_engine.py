@@ -0,0 +1,442 @@
+"""Moteur asynchrone d'orchestration de l'analyse IA multi-LLM.
+
+Les trois experts (gpt4, claude, gemini) et la synthèse sont appelés via les
+API asynchrones LangChain (`ainvoke` / `astream`) sur une boucle d'événements
+partagée par processus, exécutée dans un thread démon. Chaque tâche Celery ne
+fait que soumettre ses coroutines à cette boucle : un même worker (pool
+`threads`) peut ainsi mener des dizaines d'analyses concurrentes en réutilisant
+les pools de connexions HTTP des clients LLM, au lieu de créer un
+`ThreadPoolExecutor` par tâche.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Coroutine, Dict, Iterable, List, Optional, Set
+
+from django.conf import settings
+
+EXPERTS = ("gpt4", "claude", "gemini")
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+_loop_lock = threading.Lock()
+# Experts encore en cours après la synthèse (mode quorum)
+_en_retard: Set[asyncio.Future] = set()
+
+
+@dataclass
+class ExpertResult:
+    """Réponse d'un expert IA (ou message d'erreur) avec ses horodatages."""
+
+    name: str
+    content: str
+    ok: bool = True
+    started_at: float = 0.0
+    ended_at: float = 0.0
+    cached: bool = False
+    late: bool = False
+    usage: Dict[str, int] = field(default_factory=dict)
+    waited: float = 0.0
+    served_by: str = ""
+
+    @property
+    def duration(self) -> float:
+        return max(self.ended_at - self.started_at, 0.0)
+
+    def as_stats(self) -> Dict[str, Any]:
+        """Résumé sérialisable (JSON) pour le suivi des exécutions."""
+        return {
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            "duration": round(self.duration, 3),
+            "ok": self.ok,
+            "cached": self.cached,
+            "late": self.late,
+            "tokens": self.usage,
+            "waited": round(self.waited, 3),
+            "served_by": self.served_by or self.name,
+        }
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Retourne la boucle partagée du processus (recréée après un fork prefork)."""
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop.is_closed() or _loop_pid != os.getpid():
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="ia-engine-loop", daemon=True)
+            thread.start()
+            _loop, _loop_pid = loop, os.getpid()
+        return _loop
+
+
+def run_sync(coro: Coroutine[Any, Any, Any], timeout: Optional[float] = None) -> Any:
+    """Exécute une coroutine sur la boucle partagée et attend son résultat (code synchrone)."""
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    try:
+        return future.result(timeout)
+    except BaseException:
+        future.cancel()
+        raise
+
+
+def _default_experts() -> Dict[str, Any]:
+    from .llm_config import get_llm
+
+    return {name: get_llm(name) for name in EXPERTS}
+
+
+def _default_synthese_llm() -> Any:
+    from .llm_config import get_llm
+
+    return get_llm("synthese")
+
+
+def expert_cache_key(name: str, prompt: str) -> str:
+    """Clé de cache de la réponse d'un expert : hash du prompt, fournisseur et modèle."""
+    from .llm_config import get_llm_config
+
+    try:
+        config = get_llm_config(name)
+    except Exception:
+        config = {}
+    signature = f"{config.get('backend', '')}|{config.get('model', '')}|{prompt}"
+    return f"ia_expert_{name}_{hashlib.sha256(signature.encode('utf-8')).hexdigest()}"
+
+
+def _erreur(name: str, exc: BaseException) -> str:
+    return f"Erreur {name} : {exc or exc.__class__.__name__}"
+
+
+def _absent(name: str) -> str:
+    return f"Réponse de {name} non disponible à temps (non prise en compte dans la synthèse)."
+
+
+def _expert_timeout(name: str, timeout: Optional[float]) -> float:
+    """Délai d'un expert : argument explicite, sinon `timeout` du fournisseur, sinon IA_EXPERT_TIMEOUT."""
+    if timeout is not None:
+        return timeout
+    from .llm_config import get_llm_config
+
+    try:
+        return float(get_llm_config(name).get("timeout", settings.IA_EXPERT_TIMEOUT))
+    except Exception:
+        return settings.IA_EXPERT_TIMEOUT
+
+
+def construire_prompt_analyse(symptomes: str) -> str:
+    """Prompt structuré (6 sections) envoyé à chaque expert.
+
+    Les instructions fixes précèdent les données patient : toutes les analyses
+    partagent ainsi le même préfixe, réutilisable par le cache de prompt des fournisseurs.
+    """
+    return f"""
+        En tant qu'assistant médical IA, analysez les données patient fournies à la fin et fournissez une réponse
+        structurée.
+
+        ## FORMAT DE RÉPONSE REQUIS
+        Veuillez structurer votre réponse selon les sections suivantes :
+
+        ### 1. SYNTHÈSE CLINIQUE
+        - Résumé des éléments cliniques clés
+        - Points saillants du dossier
+
+        ### 2. DIAGNOSTICS DIFFÉRENTIELS
+        - Diagnostic principal avec niveau de certitude (%)
+        - Diagnostics différentiels possibles
+        - Argumentation clinique pour chaque hypothèse
+
+        ### 3. ANALYSES PARACLINIQUES RECOMMANDÉES
+        - Examens biologiques nécessaires
+        - Imagerie médicale si indiquée
+        - Autres explorations spécialisées
+        - Priorisation selon l'urgence
+
+        ### 4. TRAITEMENT PROPOSÉ
+        - Traitement médicamenteux avec posologie précise
+        - Durée du traitement
+        - Surveillance nécessaire
+        - Effets secondaires à surveiller
+
+        ### 5. ÉDUCATION THÉRAPEUTIQUE ET CONSEILS
+        - Conseils hygiéno-diététiques
+        - Modifications du mode de vie
+        - Signes d'alerte à surveiller
+        - Suivi recommandé
+
+        ### 6. RÉFÉRENCES BIBLIOGRAPHIQUES
+        - Sources scientifiques pertinentes (PubMed, CINAHL, HAS)
+        - Guidelines et recommandations officielles
+        - Format : Auteur(s). Titre. Journal. Année. [URL si disponible]
+
+        Soyez précis, prudent et toujours rappeler que cette analyse nécessite validation par un médecin.
+
+        ## DONNÉES PATIENT
+        {symptomes}
+        """
+
+
+def construire_prompt_synthese(results: Dict[str, str], absents: Iterable[str] = ()) -> str:
+    """Prompt de synthèse à partir des réponses des trois experts.
+
+    `absents` liste les experts en retard ou en échec, signalés au modèle de synthèse.
+    """
+    absents = list(absents)
+    avertissement = ""
+    if absents:
+        avertissement = (
+            f"\n        - Expert(s) sans réponse exploitable : {', '.join(absents)}. "
+            "N'en déduisez aucun consensus et mentionnez-le dans la synthèse"
+        )
+    return f"""
+        Vous disposez des analyses de trois experts IA médicaux. Votre rôle est de produire une synthèse médicale
+        structurée et consensuelle.
+
+        ## ANALYSES EXPERTES :
+
+        ### 🤖 GPT-4 - Analyse Générale
+        {results['gpt4']}
+
+        ### 🧠 Claude 3 - Raisonnement Médical
+        {results['claude']}
+
+        ### 🔬 Gemini Pro - Synthèse Diagnostique
+        {results['gemini']}
+
+        ## SYNTHÈSE DEMANDÉE :
+
+        Produisez une synthèse médicale structurée en conservant le format à 6 sections :
+        1. Synthèse clinique consensuelle
+        2. Diagnostics avec niveaux de certitude
+        3. Analyses paracliniques prioritaires
+        4. Traitement avec posologies précises
+        5. Éducation thérapeutique adaptée
+        6. Références bibliographiques fiables
+
+        ### DIRECTIVES :
+        - Intégrez les points de convergence entre les experts
+        - Signaler les divergences s'il y en a
+        - Privilégiez la prudence et la sécurité du patient
+        - Utilisez des emojis pour améliorer la lisibilité 🩺
+        - Rappeler que cette analyse doit être validée par un médecin{avertissement}
+
+        Répondez comme un assistant médical expert, rigoureux et bienveillant.
+        """
+
+
+async def appeler_expert(
+    name: str, llm: Any, prompt: str, timeout: float, max_wait: Optional[float] = None
+) -> ExpertResult:
+    """Appelle un expert via `ainvoke`; une erreur ou un dépassement de délai devient un texte d'erreur.
+
+    `timeout` comprend l'attente des plafonds du cluster, bornée en plus par `max_wait`.
+    """
+    from langchain.schema import HumanMessage
+
+    from .llm_guards import appel_resilient
+
+    started = time.time()
+    try:
+        # Plafonds du cluster, disjoncteur, bascule et requête couverte (voir llm_guards)
+        response, served_by, waited = await appel_resilient(
+            name, llm, [HumanMessage(content=prompt)], timeout, max_wait
+        )
+        usage = dict(getattr(response, "usage_metadata", None) or {})
+        return ExpertResult(
+            name, response.content, True, started, time.time(), usage=usage, waited=waited, served_by=served_by
+        )
+    except Exception as exc:
+        return ExpertResult(name, _erreur(name, exc), False, started, time.time())
+
+
+async def executer_experts_async(
+    symptomes: str,
+    experts: Optional[Dict[str, Any]] = None,
+    timeout: Optional[float] = None,
+    on_result: Optional[Callable[[ExpertResult], None]] = None,
+    use_cache: bool = True,
+    quorum: Optional[int] = None,
+    deadline: Optional[float] = None,
+) -> Dict[str, ExpertResult]:
+    """Interroge tous les experts en parallèle sur la boucle courante.
+
+    Les réponses réussies sont mises en cache par expert : une ré-analyse du même
+    prompt n'appelle que les experts absents du cache ou en échec la fois précédente.
+
+    Mode quorum : le retour a lieu dès que `quorum` experts ont répondu avec succès
+    ou que `deadline` secondes sont écoulées (`settings.IA_QUORUM` /
+    `settings.IA_GLOBAL_DEADLINE`, 0 = attendre tous les experts). Les experts encore
+    en cours figurent dans le résultat avec `late=True` et continuent en arrière-plan.
+
+    `on_result` est appelé dès qu'un expert répond, y compris en retard (dans un
+    thread de l'exécuteur par défaut, pour ne pas bloquer la boucle sur des E/S).
+    """
+    from .cache_compression import compressed_cache
+
+    experts = experts if experts is not None else _default_experts()
+    quorum = settings.IA_QUORUM if quorum is None else quorum
+    deadline = settings.IA_GLOBAL_DEADLINE if deadline is None else deadline
+    prompt = construire_prompt_analyse(symptomes)
+    loop = asyncio.get_running_loop()
+    keys = {name: expert_cache_key(name, prompt) for name in experts}
+    cached = await loop.run_in_executor(None, compressed_cache.get_many, list(keys.values())) if use_cache else {}
+    collecte_terminee = False
+
+    async def interroger(name: str, llm: Any) -> ExpertResult:
+        if keys[name] in cached:
+            now = time.time()
+            result = ExpertResult(name, cached[keys[name]], True, now, now, cached=True)
+        else:
+            # Attente des plafonds décomptée de l'échéance globale
+            attente_max = None if limite is None else max(limite - loop.time(), 0)
+            result = await appeler_expert(name, llm, prompt, _expert_timeout(name, timeout), attente_max)
+            # Réponse d'un fournisseur de secours : non mise en cache sous la clé du fournisseur principal
+            if result.ok and use_cache and result.served_by == name:
+                await loop.run_in_executor(
+                    None,
+                    partial(compressed_cache.set, keys[name], result.content, settings.IA_EXPERT_CACHE_TIMEOUT),
+                )
+        result.late = collecte_terminee
+        if on_result:
+            await loop.run_in_executor(None, on_result, result)
+        return result
+
+    started = time.time()
+    limite = loop.time() + deadline if deadline else None
+    tasks = {name: asyncio.ensure_future(interroger(name, llm)) for name, llm in experts.items()}
+    quorum = min(quorum, len(tasks)) if quorum else len(tasks)
+    pending = set(tasks.values())
+    while pending:
+        attente = None if limite is None else max(limite - loop.time(), 0)
+        done, pending = await asyncio.wait(pending, timeout=attente, return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            break  # échéance globale atteinte
+        if sum(1 for t in tasks.values() if t.done() and t.result().ok) >= quorum:
+            break
+    collecte_terminee = True
+
+    results = {}
+    for name, task in tasks.items():
+        if task.done():
+            results[name] = task.result()
+        else:
+            # L'expert termine en arrière-plan (cache + `on_result`); garder une référence forte
+            _en_retard.add(task)
+            task.add_done_callback(_en_retard.discard)
+            results[name] = ExpertResult(name, _absent(name), False, started, time.time(), late=True)
+    return results
+
+
+class _RelaisFragments:
+    """Transmet les fragments de synthèse à `on_chunk` depuis l'exécuteur, un appel à la fois.
+
+    Le callback écrit dans le cache (`SynthesePublisher`) : exécuté sur la boucle partagée, chaque
+    aller-retour Redis bloquerait toutes les analyses du processus. Les fragments reçus pendant un
+    appel sont regroupés pour le suivant, dans l'ordre.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, on_chunk: Callable[[str], None]):
+        self.loop = loop
+        self.on_chunk = on_chunk
+        self.en_attente: List[str] = []
+        self.envoi: Optional[asyncio.Future] = None
+
+    def __call__(self, fragment: str) -> None:
+        self.en_attente.append(fragment)
+        if self.envoi is None or self.envoi.done():
+            self._envoyer()
+
+    def _envoyer(self) -> None:
+        if self.envoi is not None:
+            self.envoi.result()  # erreur du callback précédent
+        texte = "".join(self.en_attente)
+        self.en_attente.clear()
+        self.envoi = self.loop.run_in_executor(None, self.on_chunk, texte)
+
+    async def vider(self) -> None:
+        """Attend la transmission de tous les fragments reçus."""
+        if self.envoi is not None:
+            await self.envoi
+        if self.en_attente:
+            self._envoyer()
+            await self.envoi
+
+
+async def generer_synthese_async(
+    results: Dict[str, str],
+    synthese_llm: Any = None,
+    on_chunk: Optional[Callable[[str], None]] = None,
+    absents: Iterable[str] = (),
+    stats: Optional[Dict[str, Any]] = None,
+) -> str:
+    """Streame la synthèse via `astream`; `on_chunk` reçoit les fragments au fil de l'eau.
+
+    `on_chunk` est appelé hors de la boucle partagée (`_RelaisFragments`) : des fragments
+    arrivés pendant un appel lui sont transmis ensemble à l'appel suivant.
+
+    Le flux, attente des plafonds comprise, est borné par `IA_SYNTHESE_TIMEOUT` (le bail de
+    l'emplacement du gouverneur couvre ce délai). Les réponses d'experts sont d'abord compactées
+    au budget `IA_SYNTHESE_EXPERT_BUDGET` (voir `ia_compaction`). Si `stats` est fourni, il reçoit `started_at`, `ended_at`,
+    `tokens` (usage cumulé) et `compaction` (tokens économisés par expert).
+    """
+    from langchain.schema import HumanMessage
+
+    from .ia_compaction import compacter_resultats
+    from .llm_guards import CircuitOuvert, Disjoncteur, FournisseurSature, Gouverneur, _attente_max
+
+    synthese_llm = synthese_llm if synthese_llm is not None else _default_synthese_llm()
+    loop = asyncio.get_running_loop()
+    # Comptage des tokens et découpage en sections hors de la boucle partagée
+    results, compaction = await loop.run_in_executor(None, compacter_resultats, results)
+    message = HumanMessage(content=construire_prompt_synthese(results, absents))
+    parts = []
+    tokens: Dict[str, int] = {}
+    started = time.time()
+    relais = _RelaisFragments(loop, on_chunk) if on_chunk else None
+    disjoncteur = Disjoncteur("synthese")
+    if not await loop.run_in_executor(None, disjoncteur.autorise):
+        raise CircuitOuvert("circuit synthese ouvert, fournisseur temporairement écarté")
+    timeout = settings.IA_SYNTHESE_TIMEOUT
+
+    async def streamer() -> None:
+        async with Gouverneur("synthese", max_wait=_attente_max(timeout, None), lease=timeout + 30):
+            async for chunk in synthese_llm.astream([message]):
+                for key, value in (getattr(chunk, "usage_metadata", None) or {}).items():
+                    if isinstance(value, int):
+                        tokens[key] = tokens.get(key, 0) + value
+                content = getattr(chunk, "content", None)
+                if content:
+                    parts.append(content)
+                    if relais:
+                        relais(content)
+
+    try:
+        await asyncio.wait_for(streamer(), timeout)
+        if relais:
+            await relais.vider()
+    except FournisseurSature:
+        raise  # saturation locale au cluster : pas une panne du fournisseur
+    except Exception:
+        await loop.run_in_executor(None, disjoncteur.echec)
+        raise
+    await loop.run_in_executor(None, disjoncteur.succes)
+    if stats is not None:
+        stats.update(started_at=started, ended_at=time.time(), tokens=tokens, compaction=compaction)
+    return "".join(parts)
+
+
+def executer_experts(symptomes: str, **kwargs) -> Dict[str, ExpertResult]:
+    """Version synchrone de `executer_experts_async` (tâches Celery)."""
+    return run_sync(executer_experts_async(symptomes, **kwargs))
+
+
+def generer_synthese(results: Dict[str, str], **kwargs) -> str:
+    """Version synchrone de `generer_synthese_async` (tâches Celery)."""
+    return run_sync(generer_synthese_async(results, **kwargs))
@@ -0,0 +1,64 @@
+"""Compteurs d'exploitation du pipeline IA, partagés par les workers via le cache.
+
+Chaque compteur est une clé `ia_metrics:<nom>:<fournisseur>` incrémentée avec
+`cache.incr`. `snapshot()` les relit tous pour l'endpoint `api/ia/metrics/`.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+
+METRICS = (
+    "appels",
+    "echecs",
+    "circuit_ouvert",
+    "court_circuit",
+    "basculement",
+    "hedge_envoye",
+    "hedge_gagne",
+    "saturation",
+)
+
+# Compteurs conservés une semaine sans activité
+METRICS_TIMEOUT = 7 * 24 * 3600
+
+
+def _key(metric: str, provider: str) -> str:
+    return f"ia_metrics:{metric}:{provider}"
+
+
+def incr(metric: str, provider: str, delta: int = 1) -> None:
+    key = _key(metric, provider)
+    if cache.add(key, delta, timeout=METRICS_TIMEOUT):
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, timeout=METRICS_TIMEOUT)
+
+
+def _providers() -> Iterable[str]:
+    names = set(getattr(settings, "IA_LLM_PROVIDERS", {}))
+    names.update(getattr(settings, "IA_LLM_RATE_LIMITS", {}))
+    return sorted(names)
+
+
+def snapshot() -> Dict[str, Dict[str, int]]:
+    """`{fournisseur: {métrique: valeur}}` pour tous les fournisseurs configurés."""
+    providers = list(_providers())
+    keys = {(metric, provider): _key(metric, provider) for metric in METRICS for provider in providers}
+    values = cache.get_many(list(keys.values()))
+    result: Dict[str, Dict[str, int]] = {provider: {} for provider in providers}
+    for (metric, provider), key in keys.items():
+        result[provider][metric] = values.get(key, 0)
+    return result
+
+
+def compteurs(provider: str, metrics: Iterable[str]) -> Dict[str, int]:
+    """Valeurs de quelques compteurs d'un même "fournisseur" (0 si absents)."""
+    keys = {metric: _key(metric, provider) for metric in metrics}
+    values = cache.get_many(list(keys.values()))
+    return {metric: values.get(key, 0) for metric, key in keys.items()}
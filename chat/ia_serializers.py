@@ -1,5 +1,8 @@
+from django.conf import settings
 from rest_framework import serializers
 
+from .models import AnalysisBatch, AnalysisRun
+
 
 class AnalyseSymptomesRequestSerializer(serializers.Serializer):
     symptomes = serializers.CharField(help_text="Description libre des symptômes du patient.")
@@ -7,12 +10,104 @@ class AnalyseSymptomesRequestSerializer(serializers.Serializer):
 
 
 class AnalyseResultSerializer(serializers.Serializer):
-    status = serializers.ChoiceField(choices=["pending", "done"], help_text="État de l'analyse")
-    response = serializers.CharField(allow_blank=True, required=False, help_text="Résultat de l'analyse IA")
+    status = serializers.ChoiceField(choices=["pending", "partial", "done"], help_text="État de l'analyse")
+    response = serializers.CharField(
+        allow_blank=True, required=False, help_text="Résultat de l'analyse IA (texte ajouté depuis `offset`)"
+    )
     cache_key = serializers.CharField(help_text="Clé de cache utilisée pour récupérer le résultat")
+    offset = serializers.IntegerField(
+        required=False, help_text="Longueur totale déjà produite, à renvoyer comme `offset` au prochain appel"
+    )
+    seq = serializers.IntegerField(required=False, help_text="Numéro de séquence de la publication partielle")
+
+
+class AnalysisRunSerializer(serializers.ModelSerializer):
+    synthese_duration = serializers.FloatField(read_only=True, allow_null=True)
+    total_duration = serializers.FloatField(read_only=True, allow_null=True)
+    queue_duration = serializers.FloatField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = AnalysisRun
+        fields = [
+            "id",
+            "task_id",
+            "cache_key",
+            "prompt_hash",
+            "cache_hit",
+            "status",
+            "priority",
+            "triage_score",
+            "conversation",
+            "fiche",
+            "experts",
+            "synthese_started_at",
+            "synthese_ended_at",
+            "synthese_duration",
+            "synthese_tokens",
+            "compaction",
+            "synthese_message",
+            "error_message",
+            "created_at",
+            "started_at",
+            "completed_at",
+            "queue_duration",
+            "total_duration",
+        ]
+        read_only_fields = fields
 
 
 class TaskStatusSerializer(serializers.Serializer):
     task_id = serializers.CharField(help_text="ID de la tâche Celery")
     state = serializers.CharField(help_text="État de la tâche")
     info = serializers.CharField(allow_blank=True, required=False, help_text="Information ou erreur de la tâche")
+    run = AnalysisRunSerializer(required=False, help_text="Suivi détaillé de l'exécution (si disponible)")
+
+
+class AnalysisBatchRequestSerializer(serializers.Serializer):
+    fiches = serializers.ListField(
+        child=serializers.IntegerField(), required=False, default=list, help_text="IDs de fiches existantes à analyser"
+    )
+    payloads = serializers.ListField(
+        child=serializers.DictField(),
+        required=False,
+        default=list,
+        help_text="Fiches à créer puis analyser (mêmes champs que la création d'une fiche)",
+    )
+    concurrency = serializers.IntegerField(
+        required=False, min_value=1, max_value=20, help_text="Analyses simultanées (défaut : IA_BATCH_CONCURRENCY)"
+    )
+
+    def validate(self, attrs):
+        total = len(attrs["fiches"]) + len(attrs["payloads"])
+        if not total:
+            raise serializers.ValidationError("Au moins une fiche (fiches ou payloads) est requise.")
+        if total > settings.IA_BATCH_MAX_SIZE:
+            raise serializers.ValidationError(f"Un lot est limité à {settings.IA_BATCH_MAX_SIZE} fiches.")
+        return attrs
+
+
+class AnalysisBatchSerializer(serializers.ModelSerializer):
+    status = serializers.SerializerMethodField(help_text="done quand toutes les fiches sont terminées")
+    progress = serializers.SerializerMethodField(help_text="Nombre de fiches par statut, total et termine")
+    items = serializers.SerializerMethodField(help_text="Par fiche : fiche, conversation, cache_key, task_id, status")
+
+    class Meta:
+        model = AnalysisBatch
+        fields = ["id", "status", "progress", "items", "concurrency", "precedent", "created_at", "completed_at"]
+        read_only_fields = fields
+
+    def _statuts(self, batch):
+        # Calculé une fois par lot pour `items`, `progress` et `status`
+        if getattr(batch, "_statuts_cache", None) is None:
+            batch._statuts_cache = batch.statuts_items()
+        return batch._statuts_cache
+
+    def get_items(self, batch):
+        return self._statuts(batch)
+
+    def get_progress(self, batch):
+        return batch.progression(self._statuts(batch))
+
+    def get_status(self, batch):
+        progress = self.get_progress(batch)
+        return "done" if progress["termine"] == progress["total"] else "running"
@@ -0,0 +1,314 @@
+"""Lancement des analyses IA avec déduplication des requêtes identiques (single-flight).
+
+Un verrou `<cache_key>:inflight` (posé avec `cache.add`, atomique sur Redis)
+contient l'identifiant de la tâche en cours. Une soumission identique pendant
+l'analyse ne crée pas de nouvelle tâche : elle se rattache à la tâche existante,
+reçoit le même `task_id`, et sa conversation est inscrite comme abonnée pour
+recevoir les mêmes messages une fois l'analyse terminée.
+
+Chaque tâche lancée est tracée par un `AnalysisRun` créé dans la même
+transaction que la requête, avec l'identifiant de tâche généré à l'avance.
+
+Un lot (`AnalysisBatch`, voir `lancer_lot`) lit les résultats en cache de toutes
+ses fiches en une seule requête, puis crée ses exécutions en file (`queued`),
+texte analysé compris : `avancer_lot` n'en démarre que `concurrency` à la fois,
+et relance la suivante à la fin de chacune. Le verrou n'est posé qu'au
+démarrage d'une exécution, pour qu'il n'expire pas pendant l'attente en file.
+Un lot chaîné à un précédent (`apres`) n'en démarre aucune avant que celui-ci
+soit terminé : les lots d'un import en masse partagent ainsi une concurrence.
+
+Avant tout lancement, une synthèse du même contenu clinique (`clinical_cache`)
+est reprise telle quelle : re-soumissions et relances d'un même cas ne
+rappellent pas les LLM.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import uuid
+from functools import partial
+from typing import Any, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import clinical_cache, result_store, triage
+from .cache_compression import compressed_cache
+from .fiche_formatter import formater_fiche
+from .ia_stream import conversation_key, preparer_suivi
+
+
+def cle_analyse(texte: str) -> str:
+    """Clé de cache du résultat final d'une analyse."""
+    return f"diagnostic_{hashlib.md5(texte.encode('utf-8')).hexdigest()}"  # nosec B324
+
+
+def hash_prompt(texte: str) -> str:
+    return hashlib.sha256(texte.encode("utf-8")).hexdigest()
+
+
+def inflight_key(cache_key: str) -> str:
+    return f"{cache_key}:inflight"
+
+
+def _abonnes_key(cache_key: str) -> str:
+    return f"{cache_key}:abonnes"
+
+
+def _abonne_key(cache_key: str, index: int) -> str:
+    return f"{cache_key}:abonne:{index}"
+
+
+def tache_en_cours(cache_key: str) -> Optional[str]:
+    """Identifiant de la tâche qui calcule actuellement `cache_key`, s'il y en a une."""
+    return cache.get(inflight_key(cache_key))
+
+
+def _verrouiller(cache_key: str, task_id: str) -> Optional[str]:
+    """Pose le verrou de `cache_key` pour `task_id`; retourne la tâche qui le détient déjà, sinon None."""
+    while not cache.add(inflight_key(cache_key), task_id, timeout=settings.IA_INFLIGHT_TIMEOUT):
+        existing = tache_en_cours(cache_key)
+        if existing:
+            return existing
+        # Verrou expiré entre add() et get() : nouvelle tentative
+    return None
+
+
+def _abonner(cache_key: str, conversation_id: int) -> None:
+    timeout = settings.IA_INFLIGHT_TIMEOUT
+    counter = _abonnes_key(cache_key)
+    cache.add(counter, 0, timeout=timeout)
+    try:
+        index = cache.incr(counter)
+    except ValueError:
+        cache.set(counter, 1, timeout=timeout)
+        index = 1
+    cache.set(_abonne_key(cache_key, index), conversation_id, timeout=timeout)
+    cache.set(conversation_key(conversation_id), cache_key, timeout=settings.IA_PARTIAL_TIMEOUT)
+
+
+def liberer(cache_key: str) -> List[int]:
+    """Fin de l'analyse (succès ou échec définitif) : retire le verrou et retourne les conversations abonnées.
+
+    À appeler après la mise en cache du résultat final, pour que les nouvelles
+    requêtes le trouvent au lieu de relancer une tâche.
+    """
+    cache.delete(inflight_key(cache_key))
+    total = cache.get(_abonnes_key(cache_key)) or 0
+    keys = [_abonne_key(cache_key, index) for index in range(1, total + 1)]
+    found = cache.get_many(keys)
+    cache.delete_many(keys + [_abonnes_key(cache_key)])
+    return [found[key] for key in keys if key in found]
+
+
+def demarrer_tache(
+    texte: str, user_id: int, conversation_id: int, cache_key: str, task_id: str, priorite: str = triage.NORMAL
+) -> None:
+    """Envoie l'analyse à Celery selon `IA_PIPELINE`, sous l'identifiant `task_id`, sur la file de sa priorité."""
+    from .tasks import analyse_symptomes_task, lancer_chord_analyse
+
+    queue = triage.file_attente(priorite)
+    if settings.IA_PIPELINE == "chord":
+        lancer_chord_analyse(texte, user_id, conversation_id, cache_key, task_id, queue=queue)
+    else:
+        analyse_symptomes_task.apply_async(
+            args=[texte, user_id, conversation_id, cache_key], task_id=task_id, queue=queue
+        )
+
+
+def cle_clinique(texte: str, fiche) -> str:
+    """Clé du cache clinique si `texte` est le texte canonique de `fiche`, sinon "" (texte libre, ancien format)."""
+    if fiche is None or texte != formater_fiche(fiche):
+        return ""
+    return clinical_cache.cle_clinique(fiche) or ""
+
+
+def servir_depuis_cache(
+    synthese: str, texte: str, user_id: int, conversation_id: int, cache_key: str, clinical_key: str
+) -> str:
+    """Synthèse reprise du cache clinique : message, fiche et `AnalysisRun` terminé, sans tâche ni appel LLM."""
+    from .models import AnalysisRun, Conversation, MessageIA
+    from .tasks import _terminer_fiche
+
+    conversation = Conversation.objects.select_related("fiche").get(id=conversation_id)
+    message = MessageIA.objects.create(conversation=conversation, role="synthese", content=synthese)
+    # Lu par les endpoints de résultat et le flux SSE, comme une synthèse calculée
+    result_store.enregistrer(cache_key, synthese)
+    task_id = str(uuid.uuid4())
+    AnalysisRun.objects.create(
+        task_id=task_id,
+        cache_key=cache_key,
+        prompt_hash=hash_prompt(texte),
+        clinical_key=clinical_key,
+        cache_hit=True,
+        conversation=conversation,
+        fiche=conversation.fiche,
+        user_id=user_id,
+        status=AnalysisRun.RunStatus.DONE,
+        synthese_message=message,
+        completed_at=timezone.now(),
+    )
+    _terminer_fiche(conversation, synthese, cache_key)
+    return task_id
+
+
+def lancer_analyse(
+    texte: str, user_id: int, conversation_id: int, cache_key: Optional[str] = None, batch=None
+) -> Tuple[str, str, bool]:
+    """Lance `analyse_symptomes_task` après commit, ou se rattache à la tâche identique en cours.
+
+    Une synthèse du même contenu clinique déjà en cache (`clinical_cache`) est servie
+    immédiatement, via un `AnalysisRun` terminé (`cache_hit`).
+    La priorité est évaluée sur les signes vitaux de la fiche de la conversation (`triage`).
+    Avec `batch`, l'exécution est seulement mise en file avec son texte, sans verrou :
+    `avancer_lot` la démarrera.
+    Retourne `(task_id, cache_key, deja_en_cours)`.
+    """
+    from .models import AnalysisRun, FicheConsultation
+
+    cache_key = cache_key or cle_analyse(texte)
+    fiche = FicheConsultation.objects.filter(conversations__id=conversation_id).first()
+    clinical_key = cle_clinique(texte, fiche)
+    # Un lot a déjà consulté le cache clinique pour toutes ses fiches (`lancer_lot`)
+    synthese = clinical_cache.lire(clinical_key) if batch is None else None
+    if synthese is not None:
+        task_id = servir_depuis_cache(synthese, texte, user_id, conversation_id, cache_key, clinical_key)
+        return task_id, cache_key, False
+
+    task_id = str(uuid.uuid4())
+    if batch is None:
+        existing = _verrouiller(cache_key, task_id)
+        if existing:
+            _abonner(cache_key, conversation_id)
+            return existing, cache_key, True
+        preparer_suivi(cache_key, conversation_id)
+    evaluation = triage.evaluer(fiche) if fiche else None
+    priorite = evaluation.priorite if evaluation else triage.NORMAL
+    AnalysisRun.objects.create(
+        task_id=task_id,
+        cache_key=cache_key,
+        prompt_hash=hash_prompt(texte),
+        prompt=texte if batch is not None else "",
+        clinical_key=clinical_key,
+        conversation_id=conversation_id,
+        fiche=fiche,
+        user_id=user_id,
+        batch=batch,
+        status=AnalysisRun.RunStatus.QUEUED if batch is not None else AnalysisRun.RunStatus.PENDING,
+        priority=priorite,
+        triage_score=evaluation.score if evaluation else None,
+    )
+    if batch is None:
+        transaction.on_commit(partial(demarrer_tache, texte, user_id, conversation_id, cache_key, task_id, priorite))
+    return task_id, cache_key, False
+
+
+def lancer_lot(
+    user, entrees: Sequence[Tuple[str, Any]], concurrency: Optional[int] = None, apres: Optional[int] = None
+):
+    """Soumet un lot de `(texte, conversation)`; retourne l'`AnalysisBatch` créé.
+
+    Les résultats déjà en cache (clé du texte, puis cache clinique) sont servis
+    immédiatement, en une lecture `get_many` par cache pour tout le lot; les textes
+    identiques du lot partagent une tâche. Avec `apres` (id d'un lot), les analyses
+    ne démarrent qu'une fois ce lot terminé.
+    """
+    from .models import AnalysisBatch, MessageIA
+    from .tasks import _terminer_fiche
+
+    batch = AnalysisBatch.objects.create(
+        created_by=user, concurrency=concurrency or settings.IA_BATCH_CONCURRENCY, precedent_id=apres
+    )
+    keys = [cle_analyse(texte) for texte, _ in entrees]
+    en_cache = compressed_cache.get_many(set(keys))
+    cles_cliniques = [cle_clinique(texte, conversation.fiche) for texte, conversation in entrees]
+    en_cache_clinique = clinical_cache.lire_plusieurs(
+        cle for cle, cache_key in zip(cles_cliniques, keys) if cache_key not in en_cache
+    )
+    items = []
+    for (texte, conversation), cache_key, clinical_key in zip(entrees, keys, cles_cliniques):
+        item = {"fiche": conversation.fiche_id, "conversation": conversation.id, "cache_key": cache_key}
+        synthese = en_cache.get(cache_key, en_cache_clinique.get(clinical_key))
+        if synthese is not None:
+            MessageIA.objects.create(conversation=conversation, role="synthese", content=synthese)
+            _terminer_fiche(conversation, synthese, cache_key)
+            item.update(task_id=None, cached=True)
+        else:
+            task_id, _, _ = lancer_analyse(texte, user.id, conversation.id, cache_key, batch=batch)
+            item.update(task_id=task_id, cached=False)
+        items.append(item)
+    batch.items = items
+    batch.save(update_fields=["items"])
+    transaction.on_commit(partial(avancer_lot, batch.id))
+    return batch
+
+
+def _demarrer_en_file(run, item) -> bool:
+    """Démarre une exécution en file du lot; False si elle a été servie du cache ou rattachée à une tâche en cours.
+
+    Dans ces deux cas l'exécution n'a plus de tâche propre : `item` (entrée du lot) est mis à jour.
+    """
+    from .models import AnalysisRun, MessageIA
+    from .tasks import _terminer_fiche
+
+    # Texte identique analysé depuis la soumission (plus tôt dans le lot, ou ailleurs)
+    synthese = result_store.lire_cache(run.cache_key)
+    if synthese is not None:
+        MessageIA.objects.create(conversation=run.conversation, role="synthese", content=synthese)
+        _terminer_fiche(run.conversation, synthese, run.cache_key)
+        item.update(task_id=None, cached=True)
+        return False
+    existing = _verrouiller(run.cache_key, run.task_id)
+    if existing:
+        _abonner(run.cache_key, run.conversation_id)
+        item.update(task_id=existing)
+        return False
+
+    preparer_suivi(run.cache_key, run.conversation_id)
+    run.status = AnalysisRun.RunStatus.PENDING
+    run.save(update_fields=["status"])
+    transaction.on_commit(
+        partial(demarrer_tache, run.prompt, run.user_id, run.conversation_id, run.cache_key, run.task_id, run.priority)
+    )
+    return True
+
+
+def avancer_lot(batch_id: int) -> None:
+    """Démarre des exécutions en file du lot, sans dépasser sa concurrence; marque le lot terminé à la fin.
+
+    Le verrou de chaque exécution est posé à son démarrage (`_demarrer_en_file`); celles servies du
+    cache ou rattachées à une analyse identique en cours n'occupent pas de place du lot.
+    """
+    from .models import AnalysisBatch, AnalysisRun
+
+    with transaction.atomic():
+        batch = AnalysisBatch.objects.select_for_update().get(pk=batch_id)
+        if batch.precedent_id and AnalysisBatch.objects.filter(pk=batch.precedent_id, completed_at=None).exists():
+            return  # démarré à la fin du lot précédent
+        runs = batch.runs.all()
+        actives = runs.filter(status__in=[AnalysisRun.RunStatus.PENDING, AnalysisRun.RunStatus.RUNNING]).count()
+        # Cas les plus graves du lot d'abord
+        en_file = runs.filter(status=AnalysisRun.RunStatus.QUEUED).order_by(
+            F("triage_score").desc(nulls_last=True), "id"
+        )
+        items = {item["task_id"]: item for item in batch.items if item.get("task_id")}
+        places = batch.concurrency - actives
+        demarrees, sans_tache = 0, []
+        for run in en_file.select_related("conversation"):
+            if demarrees >= places:
+                break
+            if _demarrer_en_file(run, items.get(run.task_id, {})):
+                demarrees += 1
+            else:
+                sans_tache.append(run.pk)
+        if sans_tache:
+            AnalysisRun.objects.filter(pk__in=sans_tache).delete()
+            batch.save(update_fields=["items"])
+        if not demarrees and not actives and batch.completed_at is None and not en_file.exists():
+            batch.completed_at = timezone.now()
+            batch.save(update_fields=["completed_at"])
+            for suivant in batch.suivants.values_list("id", flat=True):
+                transaction.on_commit(partial(avancer_lot, suivant))
@@ -0,0 +1,212 @@
+"""Publication progressive de la synthèse IA dans le cache.
+
+Pendant le streaming de la synthèse, le texte déjà produit est publié sous
+`<cache_key>:partial` avec un numéro de séquence. Les endpoints de résultat
+exposent alors `status: "partial"` et ne renvoient que le texte ajouté depuis
+l'offset (en caractères) fourni par le client.
+
+Chaque étape de l'analyse (expert terminé, fragment de synthèse, changement de
+statut de la fiche, fin) est aussi ajoutée à un journal d'événements en cache
+(`<cache_key>:events` pour le compteur, `<cache_key>:event:<seq>` par événement)
+que l'endpoint SSE relit : le cache partagé (Redis) sert de canal entre le
+worker Celery et n'importe quel worker web.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import result_store
+from .cache_compression import compresser, decompresser
+
+
+def partial_key(cache_key: str) -> str:
+    return f"{cache_key}:partial"
+
+
+def conversation_key(conversation_id: int) -> str:
+    """Clé de cache pointant vers le `cache_key` de la dernière analyse d'une conversation."""
+    return f"ia_conversation_{conversation_id}"
+
+
+class SynthesePublisher:
+    """Callback `on_chunk` qui publie la synthèse partielle au plus toutes les `interval` secondes."""
+
+    def __init__(self, cache_key: str, interval: Optional[float] = None):
+        self.cache_key = cache_key
+        self.interval = settings.IA_PARTIAL_PUBLISH_INTERVAL if interval is None else interval
+        self.seq = 0
+        self._parts: List[str] = []
+        self._published_len = 0
+        self._last_publish = 0.0
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def __call__(self, chunk: str) -> None:
+        self._parts.append(chunk)
+        # Premier fragment publié immédiatement, puis par paliers de temps
+        if self.seq == 0 or time.monotonic() - self._last_publish >= self.interval:
+            self.publish()
+
+    def publish(self) -> None:
+        text = self.text
+        if len(text) == self._published_len:
+            return
+        self.seq += 1
+        cache.set(
+            partial_key(self.cache_key),
+            {"seq": self.seq, "text": compresser(text)},
+            timeout=settings.IA_PARTIAL_TIMEOUT,
+        )
+        publish_event(
+            self.cache_key, "synthese", {"delta": text[self._published_len :], "offset": len(text), "seq": self.seq}
+        )
+        self._published_len = len(text)
+        self._last_publish = time.monotonic()
+
+    def finish(self) -> None:
+        """À appeler une fois le résultat final en cache : l'état partiel devient inutile."""
+        cache.delete(partial_key(self.cache_key))
+
+
+def lire_resultat(cache_key: str, offset: int = 0) -> Dict[str, Any]:
+    """État d'une analyse (`done`, `partial` ou `pending`) à partir de l'offset client."""
+    from .ia_service import tache_en_cours
+
+    final = result_store.lire_cache(cache_key)
+    if final:
+        return {"status": "done", "response": final[offset:], "offset": len(final), "cache_key": cache_key}
+    partial = cache.get(partial_key(cache_key))
+    if partial:
+        text = decompresser(partial["text"])
+        return {
+            "status": "partial",
+            "response": text[offset:],
+            "offset": len(text),
+            "seq": partial["seq"],
+            "cache_key": cache_key,
+        }
+    # Cache expiré : résultat durable de la dernière exécution terminée, sauf ré-analyse en cours
+    final = None if tache_en_cours(cache_key) else result_store.lire_base(cache_key)
+    if final:
+        return {"status": "done", "response": final[offset:], "offset": len(final), "cache_key": cache_key}
+    return {"status": "pending", "response": "", "offset": offset, "cache_key": cache_key}
+
+
+def parse_offset(value: Optional[str]) -> Optional[int]:
+    """Offset client (entier >= 0); None si la valeur est invalide."""
+    if value in (None, ""):
+        return 0
+    try:
+        offset = int(value)
+    except (TypeError, ValueError):
+        return None
+    return offset if offset >= 0 else None
+
+
+def events_key(cache_key: str) -> str:
+    return f"{cache_key}:events"
+
+
+def event_key(cache_key: str, seq: int) -> str:
+    return f"{cache_key}:event:{seq}"
+
+
+def preparer_suivi(cache_key: str, conversation_id: Optional[int] = None) -> None:
+    """À appeler au lancement d'une analyse : repart d'un journal vide et relie la conversation.
+
+    Le résultat, la synthèse partielle et les événements d'une exécution précédente de même
+    `cache_key` sont retirés : ils ne doivent pas être servis comme ceux de la nouvelle.
+    """
+    last = cache.get(events_key(cache_key)) or 0
+    cache.delete_many(
+        [events_key(cache_key), partial_key(cache_key)] + [event_key(cache_key, seq) for seq in range(1, last + 1)]
+    )
+    result_store.invalider(cache_key)
+    if conversation_id is not None:
+        cache.set(conversation_key(conversation_id), cache_key, timeout=settings.IA_PARTIAL_TIMEOUT)
+
+
+def publish_event(cache_key: str, event: str, data: Dict[str, Any]) -> int:
+    """Ajoute un événement au journal de l'analyse et retourne son numéro (croissant)."""
+    timeout = settings.IA_PARTIAL_TIMEOUT
+    counter = events_key(cache_key)
+    cache.add(counter, 0, timeout=timeout)
+    try:
+        seq = cache.incr(counter)
+    except ValueError:  # compteur expiré entre add() et incr()
+        cache.set(counter, 1, timeout=timeout)
+        seq = 1
+    cache.set(event_key(cache_key, seq), {"event": event, "data": data}, timeout=timeout)
+    return seq
+
+
+def lire_evenements(cache_key: str, after: int = 0) -> List[Tuple[int, str, Dict[str, Any]]]:
+    """Événements publiés après `after`, dans l'ordre; s'arrête au premier trou (écriture en cours)."""
+    last = cache.get(events_key(cache_key)) or 0
+    if last <= after:
+        return []
+    keys = [event_key(cache_key, seq) for seq in range(after + 1, last + 1)]
+    found = cache.get_many(keys)
+    events = []
+    for seq, key in enumerate(keys, start=after + 1):
+        if key not in found:
+            break
+        events.append((seq, found[key]["event"], found[key]["data"]))
+    return events
+
+
+def format_sse(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def flux_evenements(
+    cache_key: str,
+    last_event_id: int = 0,
+    max_duration: Optional[float] = None,
+    poll_interval: Optional[float] = None,
+) -> Iterator[str]:
+    """Générateur SSE : relit le journal jusqu'à l'événement `done`/`error` ou `max_duration`.
+
+    Si le résultat final est déjà en cache sans événement `done` à relire (analyse
+    servie depuis le cache, journal expiré), un `done` est émis directement. En cas
+    de coupure, le client reprend avec l'en-tête `Last-Event-ID`.
+    """
+    max_duration = settings.IA_SSE_MAX_DURATION if max_duration is None else max_duration
+    poll_interval = settings.IA_SSE_POLL_INTERVAL if poll_interval is None else poll_interval
+    deadline = time.monotonic() + max_duration
+    last_write = time.monotonic()
+    after = last_event_id
+    yield "retry: 3000\n\n"
+    while True:
+        events = lire_evenements(cache_key, after)
+        for seq, event, data in events:
+            after = seq
+            yield format_sse(event, data, seq)
+            if event in ("done", "error"):
+                return
+        if events:
+            last_write = time.monotonic()
+        else:
+            final = result_store.lire_cache(cache_key)
+            if final and not lire_evenements(cache_key, after):
+                yield format_sse("done", {"response": final, "offset": len(final), "cache_key": cache_key})
+                return
+            if time.monotonic() - last_write >= 15:
+                yield ": keep-alive\n\n"
+                last_write = time.monotonic()
+            time.sleep(poll_interval)
+        if time.monotonic() >= deadline:
+            return
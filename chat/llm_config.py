@@ -1,81 +1,121 @@
+"""Registre des fournisseurs LLM, construits à la première utilisation.
+
+Aucun client LangChain (ni `langchain_openai` / `langchain_google_genai`) n'est
+importé au chargement du module : `migrate`, `collectstatic` ou les workers web
+qui n'appellent jamais de LLM n'en paient pas le coût. Chaque modèle est décrit
+dans `settings.IA_LLM_PROVIDERS` (backend, modèle, température) puis construit
+une seule fois par processus via `get_llm(name)`.
+
+Les anciens noms (`gpt4`, `claude`, `gemini`, `synthese_llm`) restent
+importables depuis ce module et déclenchent la construction paresseuse.
+
+Avec `IA_LLM_FAKE=True`, tous les fournisseurs utilisent le backend local
+`fake` (`chat/llm_fake.py`) : tests de charge et développement hors ligne.
+"""
+
+from __future__ import annotations
+
 import os
+import threading
+from typing import Any, Callable, Dict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+BACKENDS: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+
+# Noms historiques exposés par ce module -> entrée de IA_LLM_PROVIDERS
+ALIASES = {"gpt4": "gpt4", "claude": "claude", "gemini": "gemini", "synthese_llm": "synthese"}
+
+_clients: Dict[str, Any] = {}
+_clients_pid = None
+_clients_lock = threading.Lock()
+
+
+def register_backend(name: str):
+    """Décorateur d'enregistrement d'une fabrique de client LLM (`config -> client`)."""
+
+    def decorator(factory: Callable[[Dict[str, Any]], Any]):
+        BACKENDS[name] = factory
+        return factory
+
+    return decorator
+
+
+def _require_key(setting: str) -> str:
+    key = getattr(settings, setting, "")
+    if not key:
+        raise ImproperlyConfigured(f"⚠️ {setting} doit être définie dans le fichier .env")
+    return key
+
+
+@register_backend("openai")
+def _openai(config: Dict[str, Any]) -> Any:
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=config["model"],
+        temperature=config.get("temperature", 0.3),
+        openai_api_key=_require_key("OPENAI_API_KEY"),
+        streaming=config.get("streaming", False),
+    )
+
+
+@register_backend("google")
+def _google(config: Dict[str, Any]) -> Any:
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=config["model"],
+        temperature=config.get("temperature", 0.3),
+        google_api_key=_require_key("GOOGLE_API_KEY"),
+    )
+
+
+@register_backend("fake")
+def _fake(config: Dict[str, Any]) -> Any:
+    from .llm_fake import FakeChatModel
+
+    options = {**settings.IA_LLM_FAKE_OPTIONS, **config.get("fake", {})}
+    return FakeChatModel(name=config.get("name", "fake"), **options)
+
+
+def get_llm_config(name: str) -> Dict[str, Any]:
+    """Configuration (backend, modèle, ...) d'un fournisseur déclaré dans les settings."""
+    try:
+        return settings.IA_LLM_PROVIDERS[name]
+    except KeyError:
+        raise ImproperlyConfigured(f"Fournisseur LLM inconnu : {name}")
+
+
+def get_llm(name: str) -> Any:
+    """Client LLM `name`, construit au premier appel puis réutilisé dans le processus."""
+    global _clients_pid
+    with _clients_lock:
+        if _clients_pid != os.getpid():
+            # Après un fork, ne pas partager les pools HTTP du processus parent
+            _clients.clear()
+            _clients_pid = os.getpid()
+        client = _clients.get(name)
+        if client is None:
+            config = get_llm_config(name)
+            if settings.IA_LLM_FAKE:
+                config = {**config, "backend": "fake", "name": name}
+            try:
+                factory = BACKENDS[config["backend"]]
+            except KeyError:
+                raise ImproperlyConfigured(f"Backend LLM inconnu pour {name} : {config.get('backend')}")
+            client = _clients[name] = factory(config)
+        return client
+
+
+def reset_llms() -> None:
+    """Oublie les clients construits (changement de settings, tests)."""
+    with _clients_lock:
+        _clients.clear()
+
 
-from dotenv import load_dotenv
-from httpx import stream
-
-# from langchain_anthropic import ChatAnthropic
-from langchain_google_genai import ChatGoogleGenerativeAI
-
-# from langchain_community.chat_models import ChatOpenAI
-from langchain_openai import ChatOpenAI
-
-# Charger les variables d'environnement depuis .env
-load_dotenv()
-
-# Clés API
-openai_key = os.getenv("OPENAI_API_KEY")
-# anthropic_key = os.getenv("ANTHROPIC_API_KEY")
-google_key = os.getenv("GOOGLE_API_KEY")
-
-# Vérification de la présence des clés
-if not all([openai_key, google_key]):
-    raise ValueError("⚠️ Les clés API OpenAI et Google doivent être définies dans le fichier .env")
-
-# Instanciation des modèles LLM
-gpt4 = ChatOpenAI(model="gpt-4.1", temperature=0.3, openai_api_key=openai_key)  # ou "gpt-4.1" selon ta version
-
-claude = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.3, google_api_key=google_key)
-
-gemini = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.3, google_api_key=google_key)
-
-# Modèle utilisé pour la synthèse finale
-synthese_llm = ChatOpenAI(model="gpt-4.1", temperature=0.2, openai_api_key=openai_key, model_kwargs={"stream": True})
-
-
-# import os
-# import requests
-# from dotenv import load_dotenv
-# from langchain.schema import BaseMessage, HumanMessage, AIMessage
-#
-# # Charger les variables d'environnement
-# load_dotenv()
-#
-# RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY", "25bf45b4famsha577558dcd485e6p1e53f5jsne9f69d176218")  # valeur par défaut
-#
-# def call_rapidapi_llm(message: BaseMessage, nom_model: str) -> AIMessage:
-#     """ Appelle l'API RapidAPI pour simuler un modèle LLM. """
-#     url = "https://chatgpt-42.p.rapidapi.com/gpt4o"
-#
-#     headers = {
-#         "x-rapidapi-key": RAPIDAPI_KEY,
-#         "x-rapidapi-host": "chatgpt-42.p.rapidapi.com",
-#         "Content-Type": "application/json"
-#     }
-#
-#     payload = {
-#         "messages": [{"role": "user", "content": message.content}],
-#         "web_access": False
-#     }
-#
-#     try:
-#         response = requests.post(url, json=payload, headers=headers)
-#         response.raise_for_status()
-#         content = response.json().get("result", "[Erreur] Réponse manquante.")
-#     except Exception as e:
-#         content = f"[Erreur {nom_model}] Impossible de récupérer la réponse : {e}"
-#
-#     return AIMessage(content=content)
-#
-# # Les trois modèles (simulés via RapidAPI pour le moment)
-# def gpt4(messages: list[BaseMessage]) -> AIMessage:
-#     return call_rapidapi_llm(messages[-1], "GPT-4")
-#
-# def claude(messages: list[BaseMessage]) -> AIMessage:
-#     return call_rapidapi_llm(messages[-1], "Claude 3")
-#
-# def gemini(messages: list[BaseMessage]) -> AIMessage:
-#     return call_rapidapi_llm(messages[-1], "Gemini Pro")
-#
-# # Synthèse (on utilise la même API, en attendant la vraie clé OpenAI)
-# def synthese_llm(messages: list[BaseMessage]) -> AIMessage:
-#     return call_rapidapi_llm(messages[-1], "Synthèse GPT-4")
+def __getattr__(attr: str) -> Any:
+    if attr in ALIASES:
+        return get_llm(ALIASES[attr])
+    raise AttributeError(f"module {__name__!r} has no attribute {attr!r}")
@@ -0,0 +1,167 @@
+"""Modèle de chat local et déterministe, pour mesurer le pipeline IA sans appel réseau.
+
+Sélectionné pour tous les fournisseurs avec `IA_LLM_FAKE=True` (options dans
+`settings.IA_LLM_FAKE_OPTIONS`, surchargeables par fournisseur avec une clé
+"fake" dans `IA_LLM_PROVIDERS`) ou pour un seul avec `"backend": "fake"`.
+
+Chaque appel attend une latence tirée selon `distribution` :
+
+- `fixed` : exactement `latency` secondes;
+- `uniform` : entre `latency * (1 - spread)` et `latency * (1 + spread)`;
+- `lognormal` : médiane `latency`, dispersion `spread` (queue longue réaliste).
+
+puis produit une réponse au format à 6 sections, au débit de
+`tokens_per_second` (0 = instantané). Une fraction `error_rate` des appels
+échoue avec `FakeLLMError`. Les tirages viennent d'un générateur initialisé
+par `seed` : une même séquence d'appels donne les mêmes latences et réponses.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+DIAGNOSTICS = (
+    ("Paludisme simple", "Artéméther-luméfantrine 20/120 mg, 4 comprimés 2 fois par jour pendant 3 jours"),
+    ("Fièvre typhoïde", "Ciprofloxacine 500 mg 2 fois par jour pendant 7 jours"),
+    ("Infection respiratoire basse", "Amoxicilline 1 g 3 fois par jour pendant 7 jours"),
+    ("Hypertension artérielle essentielle", "Amlodipine 5 mg 1 fois par jour, contrôle tensionnel à 2 semaines"),
+    ("Gastro-entérite aiguë", "Réhydratation orale (SRO), zinc 20 mg par jour pendant 10 jours"),
+)
+
+
+class FakeLLMError(Exception):
+    """Échec simulé d'un appel au fournisseur."""
+
+
+class FakeChatModel(BaseChatModel):
+    name: str = "fake"
+    latency: float = 1.0
+    distribution: str = "lognormal"
+    spread: float = 0.4
+    tokens_per_second: float = 50.0
+    error_rate: float = 0.0
+    seed: int = 42
+
+    _rng: random.Random = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    def model_post_init(self, __context: Any) -> None:
+        self._rng = random.Random(f"{self.seed}:{self.name}")
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-medical"
+
+    # ------- tirages -------
+    def _tirage(self):
+        """Latence, échec et réponse de l'appel, tirés sous verrou (appels concurrents)."""
+        with self._lock:
+            if self.distribution == "fixed":
+                latency = self.latency
+            elif self.distribution == "uniform":
+                latency = self._rng.uniform(self.latency * (1 - self.spread), self.latency * (1 + self.spread))
+            else:
+                latency = self.latency * math.exp(self._rng.gauss(0, self.spread))
+            echec = self._rng.random() < self.error_rate
+            diagnostic, traitement = DIAGNOSTICS[self._rng.randrange(len(DIAGNOSTICS))]
+            certitude = self._rng.randint(55, 90)
+        return max(latency, 0.0), echec, self._reponse(diagnostic, traitement, certitude)
+
+    def _reponse(self, diagnostic: str, traitement: str, certitude: int) -> str:
+        return (
+            f"### 1. SYNTHÈSE CLINIQUE\n- Tableau compatible avec : {diagnostic.lower()} ({self.name})\n\n"
+            f"### 2. DIAGNOSTICS DIFFÉRENTIELS\n- {diagnostic} ({certitude} %)\n- Autre cause infectieuse à exclure\n\n"
+            "### 3. ANALYSES PARACLINIQUES RECOMMANDÉES\n- NFS, CRP, goutte épaisse / TDR paludisme\n\n"
+            f"### 4. TRAITEMENT PROPOSÉ\n- {traitement}\n- Paracétamol 1 g si fièvre, maximum 4 g par jour\n\n"
+            "### 5. ÉDUCATION THÉRAPEUTIQUE ET CONSEILS\n- Hydratation, repos; consulter si aggravation\n\n"
+            "### 6. RÉFÉRENCES BIBLIOGRAPHIQUES\n- OMS. Guidelines for malaria. 2023.\n\n"
+            "Analyse simulée : validation par un médecin nécessaire."
+        )
+
+    @staticmethod
+    def _morceaux(text: str) -> List[str]:
+        # Un "token" par mot (espaces inclus), approximation suffisante pour le débit
+        words = text.split(" ")
+        return [word + " " for word in words[:-1]] + [words[-1]]
+
+    def _usage(self, prompt: str, morceaux: List[str]) -> dict:
+        input_tokens = max(len(prompt) // 4, 1)
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": len(morceaux),
+            "total_tokens": input_tokens + len(morceaux),
+        }
+
+    def _duree_generation(self, morceaux: List[str]) -> float:
+        return len(morceaux) / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    @staticmethod
+    def _prompt(messages: List[BaseMessage]) -> str:
+        return "\n".join(str(message.content) for message in messages)
+
+    def _resultat(self, text: str, prompt: str) -> ChatResult:
+        message = AIMessage(content=text, usage_metadata=self._usage(prompt, self._morceaux(text)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    # ------- API LangChain -------
+    def _generate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        prompt = self._prompt(messages)
+        latency, echec, text = self._tirage()
+        time.sleep(latency)
+        if echec:
+            raise FakeLLMError(f"erreur simulée ({self.name})")
+        time.sleep(self._duree_generation(self._morceaux(text)))
+        return self._resultat(text, prompt)
+
+    async def _agenerate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any
+    ) -> ChatResult:
+        prompt = self._prompt(messages)
+        latency, echec, text = self._tirage()
+        await asyncio.sleep(latency)
+        if echec:
+            raise FakeLLMError(f"erreur simulée ({self.name})")
+        await asyncio.sleep(self._duree_generation(self._morceaux(text)))
+        return self._resultat(text, prompt)
+
+    def _stream(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        prompt = self._prompt(messages)
+        latency, echec, text = self._tirage()
+        time.sleep(latency)
+        if echec:
+            raise FakeLLMError(f"erreur simulée ({self.name})")
+        morceaux = self._morceaux(text)
+        delay = 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+        for morceau in morceaux:
+            time.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=morceau))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt, morceaux)))
+
+    async def _astream(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        prompt = self._prompt(messages)
+        latency, echec, text = self._tirage()
+        await asyncio.sleep(latency)
+        if echec:
+            raise FakeLLMError(f"erreur simulée ({self.name})")
+        morceaux = self._morceaux(text)
+        delay = 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+        for morceau in morceaux:
+            await asyncio.sleep(delay)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=morceau))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt, morceaux)))
@@ -0,0 +1,316 @@
+"""Limitation des appels LLM partagée par tous les workers (cache Django / Redis).
+
+Chaque fournisseur appartient à un groupe de quota (`rate_group` dans
+`settings.IA_LLM_PROVIDERS`, par défaut son nom) dont les plafonds sont définis
+dans `settings.IA_LLM_RATE_LIMITS` :
+
+- `rpm` : requêtes par minute, compteur par fenêtre d'une minute (`cache.incr`);
+- `max_concurrency` : appels simultanés, sémaphore à jetons (`cache.add` sur
+  `max_concurrency` emplacements, chacun avec un bail qui expire si un worker
+  meurt en le détenant).
+
+Un appelant qui dépasse un plafond attend (avec gigue) au plus
+`settings.IA_LLM_MAX_WAIT` secondes avant d'échouer avec `FournisseurSature`.
+Cette attente est décomptée du délai de l'appel : le bail d'un emplacement
+(délai de l'appel + marge) couvre donc toujours l'appel qui le détient.
+
+`appel_resilient` ajoute autour de chaque appel :
+
+- un disjoncteur par fournisseur (`Disjoncteur`) : après
+  `IA_CIRCUIT_FAILURE_THRESHOLD` échecs en `IA_CIRCUIT_WINDOW` secondes, le
+  fournisseur est écarté pendant `IA_CIRCUIT_COOLDOWN` secondes, puis un seul
+  appel test est autorisé; pendant ce temps l'appel bascule sur le fournisseur
+  `alternate` s'il est configuré, sinon échoue immédiatement;
+- une requête couverte (hedging, `IA_HEDGING`) : si l'appel dépasse le p90 des
+  latences récentes du fournisseur, un doublon part vers `alternate` et la
+  première réponse réussie l'emporte.
+
+Les opérations de cache sont exécutées hors de la boucle d'événements, et
+chaque déclenchement est compté dans `ia_metrics`.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import ia_metrics as metrics
+
+
+class FournisseurSature(Exception):
+    """Plafond du fournisseur toujours atteint après l'attente maximale."""
+
+
+class CircuitOuvert(Exception):
+    """Fournisseur écarté par son disjoncteur et aucun fournisseur de secours disponible."""
+
+
+async def _en_thread(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+
+def rate_group(name: str) -> str:
+    from .llm_config import get_llm_config
+
+    try:
+        return get_llm_config(name).get("rate_group", name)
+    except Exception:
+        return name
+
+
+def limites(group: str) -> Dict[str, int]:
+    return getattr(settings, "IA_LLM_RATE_LIMITS", {}).get(group, {})
+
+
+class Gouverneur:
+    """Contexte asynchrone `async with Gouverneur("gpt4"):` autour d'un appel LLM."""
+
+    def __init__(self, name: str, max_wait: Optional[float] = None, lease: Optional[float] = None):
+        self.name = name
+        self.group = rate_group(name)
+        config = limites(self.group)
+        self.rpm = int(config.get("rpm", 0))
+        self.max_concurrency = int(config.get("max_concurrency", 0))
+        self.max_wait = settings.IA_LLM_MAX_WAIT if max_wait is None else max_wait
+        # Bail d'un emplacement : un appel ne dure jamais plus que le délai expert (+ marge)
+        self.lease = int(lease if lease is not None else settings.IA_EXPERT_TIMEOUT + 30)
+        self.waited = 0.0
+        self._slot: Optional[str] = None
+        self._owner = uuid.uuid4().hex
+
+    @property
+    def actif(self) -> bool:
+        return bool(self.rpm or self.max_concurrency)
+
+    def _prendre_emplacement(self) -> Optional[str]:
+        start = random.randrange(self.max_concurrency)  # nosec B311 - répartition, pas de sécurité
+        for i in range(self.max_concurrency):
+            key = f"ia_llm_slot:{self.group}:{(start + i) % self.max_concurrency}"
+            if cache.add(key, self._owner, timeout=self.lease):
+                return key
+        return None
+
+    def _liberer_emplacement(self) -> None:
+        if self._slot and cache.get(self._slot) == self._owner:
+            cache.delete(self._slot)
+        self._slot = None
+
+    def _consommer_quota(self) -> Tuple[bool, float]:
+        now = time.time()
+        window = int(now // 60)
+        key = f"ia_llm_rpm:{self.group}:{window}"
+        cache.add(key, 0, timeout=120)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=120)
+            count = 1
+        if count <= self.rpm:
+            return True, 0.0
+        return False, (window + 1) * 60 - now
+
+    def essayer(self) -> Tuple[bool, float]:
+        """Une tentative d'acquisition (synchrone); retourne (acquis, attente suggérée)."""
+        if self.max_concurrency:
+            self._slot = self._prendre_emplacement()
+            if self._slot is None:
+                return False, 0.2
+        if self.rpm:
+            ok, retry_after = self._consommer_quota()
+            if not ok:
+                self._liberer_emplacement()
+                return False, retry_after
+        return True, 0.0
+
+    async def acquerir(self) -> None:
+        if not self.actif:
+            return
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        while True:
+            ok, retry_after = await loop.run_in_executor(None, self.essayer)
+            if ok:
+                self.waited = loop.time() - start
+                return
+            remaining = self.max_wait - (loop.time() - start)
+            if remaining <= 0:
+                self.waited = loop.time() - start
+                await _en_thread(metrics.incr, "saturation", self.group)
+                raise FournisseurSature(f"limite {self.group} atteinte après {self.max_wait:.0f} s d'attente")
+            await asyncio.sleep(min(retry_after * random.uniform(1.0, 1.5), remaining))  # nosec B311
+
+    async def liberer(self) -> None:
+        if self._slot:
+            await asyncio.get_running_loop().run_in_executor(None, self._liberer_emplacement)
+
+    async def __aenter__(self) -> "Gouverneur":
+        await self.acquerir()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.liberer()
+
+
+class Disjoncteur:
+    """Disjoncteur d'un fournisseur, état partagé dans le cache (fermé / ouvert / semi-ouvert)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.threshold = settings.IA_CIRCUIT_FAILURE_THRESHOLD
+        self.window = settings.IA_CIRCUIT_WINDOW
+        self.cooldown = settings.IA_CIRCUIT_COOLDOWN
+
+    def _key(self, suffix: str) -> str:
+        return f"ia_circuit:{self.name}:{suffix}"
+
+    def autorise(self) -> bool:
+        """False si le circuit est ouvert; après le refroidissement, un seul appel test passe."""
+        if not self.threshold:
+            return True
+        open_until = cache.get(self._key("open_until"))
+        if open_until is None:
+            return True
+        if time.time() < open_until:
+            return False
+        return cache.add(self._key("probe"), 1, timeout=int(settings.IA_EXPERT_TIMEOUT) + 30)
+
+    def succes(self) -> None:
+        if self.threshold:
+            cache.delete_many([self._key("failures"), self._key("open_until"), self._key("probe")])
+
+    def echec(self) -> None:
+        if not self.threshold:
+            return
+        key = self._key("failures")
+        cache.add(key, 0, timeout=self.window)
+        try:
+            failures = cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=self.window)
+            failures = 1
+        if failures >= self.threshold or cache.get(self._key("probe")):
+            # Ouverture (ou réouverture après un appel test raté)
+            cache.set(self._key("open_until"), time.time() + self.cooldown, timeout=max(self.cooldown * 10, 60))
+            cache.delete_many([key, self._key("probe")])
+            metrics.incr("circuit_ouvert", self.name)
+
+
+class Latences:
+    """Latences récentes des appels réussis, par fournisseur (mémoire du processus)."""
+
+    def __init__(self, size: int = 100):
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=size))
+        self._lock = threading.Lock()
+
+    def ajouter(self, name: str, duration: float) -> None:
+        with self._lock:
+            self._samples[name].append(duration)
+
+    def p90(self, name: str) -> Optional[float]:
+        with self._lock:
+            samples: List[float] = sorted(self._samples[name])
+        if len(samples) < settings.IA_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(int(len(samples) * 0.9), len(samples) - 1)]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+
+latences = Latences()
+
+
+def alternate(name: str) -> Optional[str]:
+    from .llm_config import get_llm_config
+
+    try:
+        return get_llm_config(name).get("alternate")
+    except Exception:
+        return None
+
+
+def _attente_max(timeout: float, max_wait: Optional[float]) -> float:
+    """Attente des plafonds autorisée : `IA_LLM_MAX_WAIT`, bornée par le délai de l'appel et `max_wait`."""
+    return min(settings.IA_LLM_MAX_WAIT, timeout, settings.IA_LLM_MAX_WAIT if max_wait is None else max_wait)
+
+
+async def _appel_surveille(
+    name: str, llm: Any, messages: List[Any], timeout: float, max_wait: Optional[float] = None
+) -> Tuple[Any, str, float]:
+    """Un appel gouverné (débit / concurrence) qui alimente le disjoncteur et les latences.
+
+    `timeout` couvre l'attente des plafonds et l'appel; `max_wait` borne en plus l'attente.
+    """
+    disjoncteur = Disjoncteur(name)
+    gouverneur = Gouverneur(name, max_wait=_attente_max(timeout, max_wait), lease=timeout + 30)
+    await _en_thread(metrics.incr, "appels", name)
+    try:
+        async with gouverneur:
+            started = time.monotonic()
+            response = await asyncio.wait_for(llm.ainvoke(messages), max(timeout - gouverneur.waited, 0.001))
+    except asyncio.CancelledError:
+        raise
+    except FournisseurSature:
+        raise  # saturation locale au cluster : pas une panne du fournisseur
+    except Exception:
+        await _en_thread(metrics.incr, "echecs", name)
+        await _en_thread(disjoncteur.echec)
+        raise
+    latences.ajouter(name, time.monotonic() - started)
+    await _en_thread(disjoncteur.succes)
+    return response, name, gouverneur.waited
+
+
+async def appel_resilient(
+    name: str, llm: Any, messages: List[Any], timeout: float, max_wait: Optional[float] = None
+) -> Tuple[Any, str, float]:
+    """Appel protégé par disjoncteur, avec bascule et requête couverte vers `alternate`.
+
+    Retourne `(réponse, fournisseur ayant répondu, attente due aux plafonds)`.
+    """
+    from .llm_config import get_llm
+
+    secours = alternate(name)
+    if not await _en_thread(Disjoncteur(name).autorise):
+        await _en_thread(metrics.incr, "court_circuit", name)
+        if secours and await _en_thread(Disjoncteur(secours).autorise):
+            await _en_thread(metrics.incr, "basculement", name)
+            return await _appel_surveille(secours, get_llm(secours), messages, timeout, max_wait)
+        raise CircuitOuvert(f"circuit {name} ouvert, fournisseur temporairement écarté")
+
+    principal = asyncio.ensure_future(_appel_surveille(name, llm, messages, timeout, max_wait))
+    seuil = latences.p90(name) if settings.IA_HEDGING and secours else None
+    if seuil is None:
+        return await principal
+
+    done, _ = await asyncio.wait({principal}, timeout=seuil)
+    if done or not await _en_thread(Disjoncteur(secours).autorise):
+        return await principal
+
+    await _en_thread(metrics.incr, "hedge_envoye", name)
+    doublon = asyncio.ensure_future(_appel_surveille(secours, get_llm(secours), messages, timeout, max_wait))
+    pending = {principal, doublon}
+    erreurs: Dict[asyncio.Future, BaseException] = {}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is doublon:
+                        await _en_thread(metrics.incr, "hedge_gagne", name)
+                    return task.result()
+                erreurs[task] = task.exception()
+        # Les deux ont échoué : l'erreur du fournisseur principal est la plus parlante
+        raise erreurs.get(principal) or erreurs[doublon]
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,219 @@
+import json
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from celery import current_app
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from authentication.models import CustomUser
+from chat.api_views import FicheConsultationViewSet
+from chat.llm_config import reset_llms
+from chat.models import AnalysisRun, Conversation, FicheConsultation
+
+ETAPES = ("soumission", "file", "experts", "synthese", "tache", "bout_en_bout")
+LIBELLES = {
+    "soumission": "Soumission",
+    "file": "File d'attente",
+    "experts": "Experts",
+    "synthese": "Synthèse",
+    "tache": "Tâche (total)",
+    "bout_en_bout": "Bout en bout",
+}
+
+
+def percentile(values, p):
+    """Percentile par rang le plus proche (None si aucune valeur)."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(int(round(p / 100 * len(values))) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Test de charge du pipeline d'analyse IA : N fiches via _lancer_analyse_async -> analyse_symptomes_task, "
+        "LLM simulés par défaut; rapporte débit, latences p50/p95/p99 par étape et requêtes SQL"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fiches", type=int, default=20, help="Nombre de fiches analysées")
+        parser.add_argument("--concurrency", type=int, default=4, help="Soumissions simultanées")
+        parser.add_argument("--latency", type=float, help="Latence médiane du LLM simulé (s)")
+        parser.add_argument("--distribution", choices=["fixed", "uniform", "lognormal"])
+        parser.add_argument("--spread", type=float, help="Dispersion de la latence")
+        parser.add_argument("--tokens-per-second", type=float, help="Débit de génération (0 = instantané)")
+        parser.add_argument("--error-rate", type=float, help="Fraction d'appels LLM en échec")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--real-llm", action="store_true", help="Utiliser les fournisseurs configurés")
+        parser.add_argument(
+            "--broker", action="store_true", help="Envoyer aux workers Celery au lieu d'exécuter dans ce processus"
+        )
+        parser.add_argument("--timeout", type=float, default=600, help="Attente maximale des analyses (--broker)")
+        parser.add_argument("--keep", action="store_true", help="Conserver fiches, conversations et exécutions")
+        parser.add_argument("--json", action="store_true", help="Rapport JSON")
+
+    def handle(self, *args, **options):
+        previous = (settings.IA_LLM_FAKE, settings.IA_LLM_FAKE_OPTIONS, current_app.conf.task_always_eager)
+        if not options["real_llm"]:
+            fake_options = dict(settings.IA_LLM_FAKE_OPTIONS, seed=options["seed"])
+            for option in ("latency", "distribution", "spread", "tokens_per_second", "error_rate"):
+                if options[option] is not None:
+                    fake_options[option] = options[option]
+            settings.IA_LLM_FAKE, settings.IA_LLM_FAKE_OPTIONS = True, fake_options
+            reset_llms()
+        current_app.conf.task_always_eager = not options["broker"]
+
+        user, _ = CustomUser.objects.get_or_create(username="ia_loadtest", defaults={"role": "medecin"})
+        fiches = self._creer_fiches(user, options["fiches"], options["seed"])
+        try:
+            rapport = self._executer(user, fiches, options)
+        finally:
+            settings.IA_LLM_FAKE, settings.IA_LLM_FAKE_OPTIONS, current_app.conf.task_always_eager = previous
+            reset_llms()
+            if not options["keep"]:
+                AnalysisRun.objects.filter(fiche__in=fiches).delete()
+                FicheConsultation.objects.filter(id__in=[fiche.id for fiche in fiches]).delete()
+
+        if options["json"]:
+            self.stdout.write(json.dumps(rapport, indent=2))
+        else:
+            self._afficher(rapport)
+
+    def _creer_fiches(self, user, count, seed):
+        """Fiches synthétiques aux constantes variées, rendues uniques pour éviter tout cache."""
+        rng = random.Random(seed)
+        marqueur = uuid.uuid4().hex[:8]
+        fiches = []
+        for i in range(count):
+            fiches.append(
+                FicheConsultation.objects.create(
+                    user=user,
+                    nom="Charge",
+                    postnom="Test",
+                    prenom=f"Patient{i}",
+                    date_naissance="1990-01-01",
+                    age=rng.randint(1, 90),
+                    sexe=rng.choice(["M", "F"]),
+                    telephone="+243000000000",
+                    etat="Conservé",
+                    capacite_physique="Top",
+                    capacite_psychologique="Top",
+                    febrile=rng.choice(["Oui", "Non"]),
+                    coloration_bulbaire="Normale",
+                    coloration_palpebrale="Normale",
+                    tegument="Normal",
+                    temperature=round(rng.uniform(36.0, 40.5), 1),
+                    spo2=rng.randint(82, 99),
+                    pouls=rng.randint(55, 140),
+                    frequence_respiratoire=rng.randint(12, 30),
+                    tension_arterielle=f"{rng.randint(85, 180)}/{rng.randint(50, 110)}",
+                    motif_consultation=f"Test de charge {marqueur} #{i} : fièvre et céphalées",
+                    status="en_analyse",
+                )
+            )
+        return fiches
+
+    def _analyser(self, viewset, user, fiche, broker, timeout):
+        conversation = Conversation.objects.create(user=user, fiche=fiche)
+        start = time.perf_counter()
+        erreur = None
+        with CaptureQueriesContext(connection) as queries:
+            try:
+                task_id, _, _ = viewset._lancer_analyse_async(fiche, conversation)
+            except Exception as exc:  # tâche exécutée sur place : son échec remonte ici
+                erreur = str(exc)
+                task_id = (
+                    AnalysisRun.objects.filter(conversation=conversation).values_list("task_id", flat=True).first()
+                )
+        soumission = time.perf_counter() - start
+        if broker:
+            # Les requêtes des workers ne sont pas comptées ici
+            terminaux = [AnalysisRun.RunStatus.DONE, AnalysisRun.RunStatus.FAILED]
+            while not AnalysisRun.objects.filter(task_id=task_id, status__in=terminaux).exists():
+                if time.perf_counter() - start > timeout:
+                    break
+                time.sleep(0.2)
+        return {
+            "task_id": task_id,
+            "soumission": soumission,
+            "bout_en_bout": time.perf_counter() - start,
+            "requetes": None if broker else len(queries),
+            "erreur": erreur,
+        }
+
+    def _executer(self, user, fiches, options):
+        viewset = FicheConsultationViewSet()
+
+        def analyser(fiche):
+            return self._analyser(viewset, user, fiche, options["broker"], options["timeout"])
+
+        def analyser_en_thread(fiche):
+            try:
+                return analyser(fiche)
+            finally:
+                connection.close()
+
+        start = time.perf_counter()
+        if options["concurrency"] > 1:
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+                mesures = list(pool.map(analyser_en_thread, fiches))
+        else:
+            mesures = [analyser(fiche) for fiche in fiches]
+        duree = time.perf_counter() - start
+        runs = AnalysisRun.objects.in_bulk([m["task_id"] for m in mesures], field_name="task_id")
+        etapes = {etape: [] for etape in ETAPES}
+        for mesure in mesures:
+            etapes["soumission"].append(mesure["soumission"])
+            etapes["bout_en_bout"].append(mesure["bout_en_bout"])
+            run = runs.get(mesure["task_id"])
+            if run is None:
+                continue
+            durees_experts = [expert.get("duration") for expert in run.experts.values() if expert.get("duration")]
+            for etape, value in (
+                ("file", run.queue_duration),
+                ("experts", max(durees_experts) if durees_experts else None),
+                ("synthese", run.synthese_duration),
+                ("tache", run.total_duration),
+            ):
+                if value is not None:
+                    etapes[etape].append(value)
+
+        statuts = [run.status for run in runs.values()]
+        requetes = [m["requetes"] for m in mesures if m["requetes"] is not None]
+        return {
+            "analyses": len(fiches),
+            "reussies": statuts.count(AnalysisRun.RunStatus.DONE),
+            "echecs": statuts.count(AnalysisRun.RunStatus.FAILED),
+            "duree": round(duree, 3),
+            "debit": round(len(fiches) / duree, 3) if duree else None,
+            "latences": {
+                etape: {
+                    f"p{p}": round(v, 3) if (v := percentile(values, p)) is not None else None for p in (50, 95, 99)
+                }
+                for etape, values in etapes.items()
+            },
+            "requetes_sql": {
+                "moyenne": round(sum(requetes) / len(requetes), 1) if requetes else None,
+                "max": max(requetes) if requetes else None,
+            },
+        }
+
+    def _afficher(self, rapport):
+        self.stdout.write(self.style.MIGRATE_HEADING("Test de charge du pipeline IA"))
+        self.stdout.write(
+            f"{rapport['analyses']} analyses ({rapport['reussies']} réussies, {rapport['echecs']} en échec) "
+            f"en {rapport['duree']:.2f} s, débit {rapport['debit']} analyses/s"
+        )
+        self.stdout.write(f"{'Étape':<16}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for etape, valeurs in rapport["latences"].items():
+            cells = "".join(f"{'-' if v is None else f'{v:.3f}':>10}" for v in valeurs.values())
+            self.stdout.write(f"{LIBELLES[etape]:<16}{cells}")
+        sql = rapport["requetes_sql"]
+        if sql["moyenne"] is not None:
+            self.stdout.write(f"Requêtes SQL par analyse : moyenne {sql['moyenne']}, max {sql['max']}")
+        self.stdout.write(self.style.SUCCESS("Test de charge terminé."))
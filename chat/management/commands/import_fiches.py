@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from authentication.models import CustomUser
+from chat import fiche_import
+
+
+class Command(BaseCommand):
+    help = (
+        "Import en masse de fiches de consultation depuis un fichier CSV ou JSON lines, validées et insérées par "
+        "blocs; rapporte les lignes rejetées"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("fichier", help="Chemin du fichier (.csv, .jsonl ou .ndjson)")
+        parser.add_argument("--user", required=True, help="Nom d'utilisateur au nom duquel les fiches sont créées")
+        parser.add_argument("--format", choices=fiche_import.FORMATS, help="Défaut : déduit de l'extension")
+        parser.add_argument("--chunk-size", type=int, help="Lignes par bloc (défaut : FICHE_IMPORT_CHUNK_SIZE)")
+        parser.add_argument("--analyser", action="store_true", help="Mettre en file l'analyse IA des fiches importées")
+        parser.add_argument("--json", action="store_true", help="Rapport JSON")
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(username=options["user"])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"Utilisateur introuvable : {options['user']}")
+        try:
+            rapport = fiche_import.importer_fichier(
+                options["fichier"],
+                user,
+                format=options["format"],
+                analyser=options["analyser"],
+                chunk_size=options["chunk_size"],
+            )
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        if options["json"]:
+            self.stdout.write(json.dumps(rapport.as_dict(), ensure_ascii=False, indent=2, default=str))
+            return
+        for ligne in fiche_import.iter_erreurs(rapport):
+            self.stderr.write(ligne)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{rapport.importees}/{rapport.total} fiches importées, {len(rapport.erreurs)} rejetées"
+                + (f", lots d'analyse : {', '.join(map(str, rapport.lots))}" if rapport.lots else "")
+            )
+        )
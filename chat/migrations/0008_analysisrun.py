@@ -0,0 +1,106 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:24
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("chat", "0007_ficheconsultation_nom_hopital"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AnalysisRun",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("task_id", models.CharField(help_text="ID de la tâche Celery", max_length=64, unique=True)),
+                (
+                    "cache_key",
+                    models.CharField(db_index=True, help_text="Clé de cache du résultat final", max_length=100),
+                ),
+                ("prompt_hash", models.CharField(db_index=True, help_text="SHA-256 du texte analysé", max_length=64)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "En attente"),
+                            ("running", "En cours"),
+                            ("done", "Terminée"),
+                            ("failed", "Échec"),
+                        ],
+                        db_index=True,
+                        default="pending",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "experts",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        help_text="Par expert : début, fin, durée, succès, cache, retard et tokens",
+                    ),
+                ),
+                ("synthese_started_at", models.DateTimeField(blank=True, null=True)),
+                ("synthese_ended_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "synthese_tokens",
+                    models.JSONField(blank=True, default=dict, help_text="Tokens consommés par la synthèse"),
+                ),
+                ("error_message", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("started_at", models.DateTimeField(blank=True, null=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "conversation",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="analysis_runs",
+                        to="chat.conversation",
+                    ),
+                ),
+                (
+                    "fiche",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="analysis_runs",
+                        to="chat.ficheconsultation",
+                    ),
+                ),
+                (
+                    "synthese_message",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Synthèse stockée",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="chat.messageia",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="analysis_runs",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Exécution Analyse IA",
+                "verbose_name_plural": "Exécutions Analyse IA",
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
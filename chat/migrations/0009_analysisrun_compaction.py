@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0008_analysisrun"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="analysisrun",
+            name="compaction",
+            field=models.JSONField(
+                blank=True, default=dict, help_text="Tokens des réponses d'experts avant/après compaction, par expert"
+            ),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("chat", "0009_analysisrun_compaction"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="analysisrun",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "En file (lot)"),
+                    ("pending", "En attente"),
+                    ("running", "En cours"),
+                    ("done", "Terminée"),
+                    ("failed", "Échec"),
+                ],
+                db_index=True,
+                default="pending",
+                max_length=20,
+            ),
+        ),
+        migrations.CreateModel(
+            name="AnalysisBatch",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "items",
+                    models.JSONField(
+                        blank=True,
+                        default=list,
+                        help_text="Par fiche : fiche, conversation, cache_key, task_id et cached (résultat déjà connu)",
+                    ),
+                ),
+                (
+                    "concurrency",
+                    models.PositiveSmallIntegerField(default=4, help_text="Analyses du lot exécutées simultanément"),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("completed_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="analysis_batches",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Lot d'analyses IA",
+                "verbose_name_plural": "Lots d'analyses IA",
+                "ordering": ["-created_at"],
+            },
+        ),
+        migrations.AddField(
+            model_name="analysisrun",
+            name="batch",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Lot d'origine",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="runs",
+                to="chat.analysisbatch",
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0010_analysisbatch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="analysisrun",
+            name="priority",
+            field=models.CharField(
+                choices=[("high", "Haute"), ("normal", "Normale"), ("low", "Basse")],
+                db_index=True,
+                default="normal",
+                help_text="Priorité de triage",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="analysisrun",
+            name="triage_score",
+            field=models.IntegerField(blank=True, help_text="Score de gravité des signes vitaux", null=True),
+        ),
+    ]
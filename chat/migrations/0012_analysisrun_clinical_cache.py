@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0011_analysisrun_priority"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="analysisrun",
+            name="cache_hit",
+            field=models.BooleanField(default=False, help_text="Synthèse reprise du cache clinique, sans appel LLM"),
+        ),
+        migrations.AddField(
+            model_name="analysisrun",
+            name="clinical_key",
+            field=models.CharField(
+                blank=True, default="", help_text="Clé du cache par contenu clinique de la fiche", max_length=100
+            ),
+        ),
+    ]
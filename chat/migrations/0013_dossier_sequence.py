@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:59
+
+import datetime
+
+from django.db import migrations, models
+
+
+def initialiser_sequences(apps, schema_editor):
+    """Reprend, par jour, le plus grand numéro `CONS-AAAAMMJJ-NNN` déjà attribué."""
+    FicheConsultation = apps.get_model("chat", "FicheConsultation")
+    DossierSequence = apps.get_model("chat", "DossierSequence")
+    derniers = {}
+    numeros = FicheConsultation.objects.filter(numero_dossier__startswith="CONS-").values_list(
+        "numero_dossier", flat=True
+    )
+    for numero in numeros.iterator():
+        try:
+            _, jour, suffixe = numero.split("-")
+            jour, suffixe = datetime.datetime.strptime(jour, "%Y%m%d").date(), int(suffixe)
+        except ValueError:
+            continue
+        derniers[jour] = max(derniers.get(jour, 0), suffixe)
+    DossierSequence.objects.bulk_create(
+        [DossierSequence(jour=jour, dernier=dernier) for jour, dernier in derniers.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0012_analysisrun_clinical_cache"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DossierSequence",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("jour", models.DateField(unique=True)),
+                ("dernier", models.PositiveIntegerField(default=0, help_text="Dernier numéro attribué pour ce jour")),
+            ],
+            options={
+                "verbose_name": "Séquence de dossiers",
+                "verbose_name_plural": "Séquences de dossiers",
+            },
+        ),
+        migrations.RunPython(initialiser_sequences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:25
+
+from django.db import migrations, models
+
+
+def reprendre_textes_en_file(apps, schema_editor):
+    """Exécutions déjà en file : texte repris du dernier message utilisateur de leur conversation."""
+    AnalysisRun = apps.get_model("chat", "AnalysisRun")
+    MessageIA = apps.get_model("chat", "MessageIA")
+    for run in AnalysisRun.objects.filter(status="queued").exclude(conversation=None).iterator():
+        run.prompt = (
+            MessageIA.objects.filter(conversation_id=run.conversation_id, role="user")
+            .order_by("-timestamp", "-id")
+            .values_list("content", flat=True)
+            .first()
+        ) or ""
+        run.save(update_fields=["prompt"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0013_dossier_sequence"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="analysisrun",
+            name="prompt",
+            field=models.TextField(
+                blank=True, default="", help_text="Texte à analyser d'une exécution mise en file (lot)"
+            ),
+        ),
+        migrations.RunPython(reprendre_textes_en_file, migrations.RunPython.noop),
+    ]
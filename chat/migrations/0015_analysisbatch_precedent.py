@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0014_analysisrun_prompt"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="analysisbatch",
+            name="precedent",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Lot à terminer avant de démarrer celui-ci (imports en masse)",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="suivants",
+                to="chat.analysisbatch",
+            ),
+        ),
+    ]
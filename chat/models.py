@@ -244,57 +244,9 @@ class FicheConsultation(models.Model):
             self.heure_debut = timezone.localtime().time()
 
         if not self.numero_dossier:
-            from django.conf import settings
+            from .dossier_sequence import prochain_numero
 
-            # Mode test : numérotation simplifiée pour éviter les collisions
-            if getattr(settings, "TESTING", False) or "test" in str(settings.DATABASES["default"]["NAME"]):
-
-                import random
-                import time
-
-                timestamp = int(time.time() * 1000) % 1000000
-                random_suffix = random.randint(100, 999)
-                self.numero_dossier = f"TEST-{timestamp:06d}-{random_suffix}"
-            else:
-                # Mode production : numérotation standard
-                today = timezone.now().date()
-                prefix = f"CONS-{today.strftime('%Y%m%d')}"
-
-                # Approche robuste pour éviter les doublons
-                from django.db import transaction
-
-                with transaction.atomic():
-                    # Obtenir le dernier numéro pour aujourd'hui
-                    last_fiche = (
-                        FicheConsultation.objects.filter(date_consultation=today, numero_dossier__startswith=prefix)
-                        .order_by("-numero_dossier")
-                        .first()
-                    )
-
-                    if last_fiche and last_fiche.numero_dossier:
-                        # Extraire le numéro et incrémenter
-                        try:
-                            last_num = int(last_fiche.numero_dossier.split("-")[-1])
-                            count = last_num + 1
-                        except (ValueError, IndexError):
-                            count = FicheConsultation.objects.filter(date_consultation=today).count() + 1
-                    else:
-                        count = 1
-
-                    # Générer un numéro unique avec retry en cas de collision
-                    max_attempts = 10
-                    for attempt in range(max_attempts):
-                        numero = f"{prefix}-{count:03d}"
-                        if not FicheConsultation.objects.filter(numero_dossier=numero).exists():
-                            self.numero_dossier = numero
-                            break
-                        count += 1
-                    else:
-                        # Fallback avec timestamp si impossible de générer un numéro unique
-                        import time
-
-                        timestamp = int(time.time() * 1000) % 10000  # 4 derniers chiffres
-                        self.numero_dossier = f"{prefix}-{timestamp:04d}"
+            self.numero_dossier = prochain_numero()
 
         super().save(*args, **kwargs)
 
@@ -307,6 +259,21 @@ class FicheConsultation(models.Model):
         ordering = ["-date_consultation"]
 
 
+class ConversationQuerySet(models.QuerySet):
+    def avec_apercu(self):
+        """Annote `messages_count`, `first_message` et `first_user_message` dans la même requête.
+
+        Évite deux à trois requêtes par conversation dans les listes (`ConversationSerializer`, `titre`).
+        Le `Count` (GROUP BY) écarte `Meta.ordering` : trier explicitement le résultat.
+        """
+        messages = MessageIA.objects.filter(conversation=models.OuterRef("pk")).order_by("timestamp", "id")
+        return self.annotate(
+            messages_count=models.Count("messageia"),
+            first_message=models.Subquery(messages.values("content")[:1]),
+            first_user_message=models.Subquery(messages.filter(role="user").values("content")[:1]),
+        )
+
+
 class Conversation(models.Model):
     nom = models.CharField(max_length=100, blank=True, null=True)
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="conversations")
@@ -316,12 +283,18 @@ class Conversation(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ConversationQuerySet.as_manager()
+
     @property
     def titre(self):
         if self.nom:
             return self.nom
-        msg = self.messageia_set.filter(role="user").first()
-        return msg.content[:30] + "..." if msg else "Conversation"
+        if hasattr(self, "first_user_message"):  # annoté par `avec_apercu()`
+            content = self.first_user_message
+        else:
+            msg = self.messageia_set.filter(role="user").first()
+            content = msg.content if msg else None
+        return content[:30] + "..." if content else "Conversation"
 
     def __str__(self):
         if self.fiche:
@@ -774,3 +747,161 @@ class DataExportJob(models.Model):
         ordering = ["-created_at"]
         verbose_name = "Job Export Données"
         verbose_name_plural = "Jobs Export Données"
+
+
+class AnalysisRun(models.Model):
+    """Exécution d'une analyse IA multi-LLM : timings par étape, tokens et résultat."""
+
+    class RunStatus(models.TextChoices):
+        QUEUED = "queued", "En file (lot)"
+        PENDING = "pending", "En attente"
+        RUNNING = "running", "En cours"
+        DONE = "done", "Terminée"
+        FAILED = "failed", "Échec"
+
+    class Priority(models.TextChoices):
+        HIGH = "high", "Haute"
+        NORMAL = "normal", "Normale"
+        LOW = "low", "Basse"
+
+    task_id = models.CharField(max_length=64, unique=True, help_text="ID de la tâche Celery")
+    cache_key = models.CharField(max_length=100, db_index=True, help_text="Clé de cache du résultat final")
+    prompt_hash = models.CharField(max_length=64, db_index=True, help_text="SHA-256 du texte analysé")
+    prompt = models.TextField(blank=True, default="", help_text="Texte à analyser d'une exécution mise en file (lot)")
+    clinical_key = models.CharField(
+        max_length=100, blank=True, default="", help_text="Clé du cache par contenu clinique de la fiche"
+    )
+    cache_hit = models.BooleanField(default=False, help_text="Synthèse reprise du cache clinique, sans appel LLM")
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.SET_NULL, null=True, blank=True, related_name="analysis_runs"
+    )
+    fiche = models.ForeignKey(
+        FicheConsultation, on_delete=models.SET_NULL, null=True, blank=True, related_name="analysis_runs"
+    )
+    user = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name="analysis_runs")
+    batch = models.ForeignKey(
+        "AnalysisBatch",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="runs",
+        help_text="Lot d'origine",
+    )
+    status = models.CharField(max_length=20, choices=RunStatus.choices, default=RunStatus.PENDING, db_index=True)
+    priority = models.CharField(
+        max_length=10, choices=Priority.choices, default=Priority.NORMAL, db_index=True, help_text="Priorité de triage"
+    )
+    triage_score = models.IntegerField(null=True, blank=True, help_text="Score de gravité des signes vitaux")
+    experts = models.JSONField(
+        default=dict, blank=True, help_text="Par expert : début, fin, durée, succès, cache, retard et tokens"
+    )
+    synthese_started_at = models.DateTimeField(null=True, blank=True)
+    synthese_ended_at = models.DateTimeField(null=True, blank=True)
+    synthese_tokens = models.JSONField(default=dict, blank=True, help_text="Tokens consommés par la synthèse")
+    compaction = models.JSONField(
+        default=dict, blank=True, help_text="Tokens des réponses d'experts avant/après compaction, par expert"
+    )
+    synthese_message = models.ForeignKey(
+        MessageIA, on_delete=models.SET_NULL, null=True, blank=True, related_name="+", help_text="Synthèse stockée"
+    )
+    error_message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Analyse {self.task_id} ({self.get_status_display()})"
+
+    @property
+    def synthese_duration(self):
+        """Durée de la synthèse en secondes."""
+        if self.synthese_started_at and self.synthese_ended_at:
+            return (self.synthese_ended_at - self.synthese_started_at).total_seconds()
+        return None
+
+    @property
+    def total_duration(self):
+        """Durée totale de l'exécution en secondes."""
+        if self.started_at and self.completed_at:
+            return (self.completed_at - self.started_at).total_seconds()
+        return None
+
+    @property
+    def queue_duration(self):
+        """Attente en file avant le démarrage de la tâche, en secondes."""
+        if self.started_at:
+            return (self.started_at - self.created_at).total_seconds()
+        return None
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Exécution Analyse IA"
+        verbose_name_plural = "Exécutions Analyse IA"
+
+
+class AnalysisBatch(models.Model):
+    """Lot de fiches soumises ensemble à l'analyse IA, avec concurrence bornée."""
+
+    created_by = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="analysis_batches")
+    items = models.JSONField(
+        default=list,
+        blank=True,
+        help_text="Par fiche : fiche, conversation, cache_key, task_id et cached (résultat déjà connu)",
+    )
+    concurrency = models.PositiveSmallIntegerField(default=4, help_text="Analyses du lot exécutées simultanément")
+    precedent = models.ForeignKey(
+        "self",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="suivants",
+        help_text="Lot à terminer avant de démarrer celui-ci (imports en masse)",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Lot {self.id} ({len(self.items)} fiches)"
+
+    def statuts_items(self):
+        """Statut de chaque fiche du lot : résultat déjà en cache, sinon celui de sa tâche."""
+        runs = AnalysisRun.objects.filter(task_id__in=[item["task_id"] for item in self.items if item.get("task_id")])
+        status_by_task = dict(runs.values_list("task_id", "status"))
+        statuts = []
+        for item in self.items:
+            if item.get("cached"):
+                statut = AnalysisRun.RunStatus.DONE
+            else:
+                statut = status_by_task.get(item.get("task_id"), AnalysisRun.RunStatus.PENDING)
+            statuts.append({**item, "status": statut})
+        return statuts
+
+    def progression(self, statuts=None):
+        """Nombre de fiches par statut, plus `total` et `termine` (analyses réussies ou en échec)."""
+        statuts = self.statuts_items() if statuts is None else statuts
+        compte = {choice: 0 for choice in AnalysisRun.RunStatus.values}
+        for statut in statuts:
+            compte[statut["status"]] += 1
+        compte["cached"] = sum(1 for item in self.items if item.get("cached"))
+        compte["total"] = len(self.items)
+        compte["termine"] = compte[AnalysisRun.RunStatus.DONE] + compte[AnalysisRun.RunStatus.FAILED]
+        return compte
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Lot d'analyses IA"
+        verbose_name_plural = "Lots d'analyses IA"
+
+
+class DossierSequence(models.Model):
+    """Compteur journalier des numéros de dossier (`CONS-AAAAMMJJ-NNN`), voir `chat.dossier_sequence`."""
+
+    jour = models.DateField(unique=True)
+    dernier = models.PositiveIntegerField(default=0, help_text="Dernier numéro attribué pour ce jour")
+
+    def __str__(self):
+        return f"Séquence {self.jour:%Y%m%d} ({self.dernier})"
+
+    class Meta:
+        verbose_name = "Séquence de dossiers"
+        verbose_name_plural = "Séquences de dossiers"
@@ -15,6 +15,8 @@ from django.conf import settings
 from django.core.cache import cache
 from django.utils import timezone
 
+from .cache_stampede import liberer_verrou, prendre_verrou
+
 # Configuration du logging
 logger = logging.getLogger(__name__)
 
@@ -94,7 +96,18 @@ class TwilioNotificationService:
             logger.info(f"SMS déjà envoyé aujourd'hui à {to_number}")
             return NotificationResult(success=True, message_sid=cache.get(cache_key), status="already_sent")
 
+        # Un seul envoi à la fois pour une même notification (appels concurrents)
+        verrou = prendre_verrou(cache_key)
+        if verrou is None:
+            logger.info(f"SMS déjà en cours d'envoi à {to_number}")
+            return NotificationResult(success=True, status="in_progress")
+
         try:
+            # Envoi terminé par un autre appelant entre la vérification et la prise du verrou
+            if not force_resend and self._is_already_sent(cache_key):
+                logger.info(f"SMS déjà envoyé aujourd'hui à {to_number}")
+                return NotificationResult(success=True, message_sid=cache.get(cache_key), status="already_sent")
+
             # Formatage du numéro
             if not to_number.startswith("+"):
                 to_number = f"+{to_number}"
@@ -112,6 +125,8 @@ class TwilioNotificationService:
         except Exception as e:
             logger.error(f"Erreur envoi SMS à {to_number}: {str(e)}")
             return NotificationResult(success=False, error=str(e))
+        finally:
+            liberer_verrou(cache_key, verrou)
 
     def send_whatsapp(
         self, to_number: str, message: str, content_variables: dict = None, force_resend: bool = False
@@ -140,7 +155,17 @@ class TwilioNotificationService:
             logger.info(f"Message WhatsApp déjà envoyé aujourd'hui à {to_number}")
             return NotificationResult(success=True, message_sid=cache.get(cache_key), status="already_sent")
 
+        verrou = prendre_verrou(cache_key)
+        if verrou is None:
+            logger.info(f"Message WhatsApp déjà en cours d'envoi à {to_number}")
+            return NotificationResult(success=True, status="in_progress")
+
         try:
+            # Envoi terminé par un autre appelant entre la vérification et la prise du verrou
+            if not force_resend and self._is_already_sent(cache_key):
+                logger.info(f"Message WhatsApp déjà envoyé aujourd'hui à {to_number}")
+                return NotificationResult(success=True, message_sid=cache.get(cache_key), status="already_sent")
+
             # Formatage des numéros WhatsApp
             if not to_number.startswith("+"):
                 to_number = f"+{to_number}"
@@ -210,6 +235,8 @@ Merci !"""
                     pass
 
             return NotificationResult(success=False, error=str(e))
+        finally:
+            liberer_verrou(cache_key, verrou)
 
     def generate_consultation_summary(self, fiche) -> str:
         """
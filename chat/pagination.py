@@ -0,0 +1,93 @@
+"""Pagination des listes volumineuses : numéro de page ou curseur (keyset).
+
+`PageNumberPagination` exécute un `COUNT(*)` puis un `OFFSET` qui parcourt
+toutes les lignes précédentes : le coût d'une page croît avec sa profondeur.
+La pagination par curseur filtre sur la position de la dernière ligne servie
+(`created_at < …`, index utilisé) : latence constante à toute profondeur, sans
+`count` ni accès direct à une page arbitraire.
+
+`ModePagination` sert les deux modes sur le même endpoint :
+
+- `?pagination=cursor` ou `?pagination=page` choisit le mode; un paramètre
+  `cursor` (liens `next`/`previous`) implique le mode curseur;
+- à défaut, `default_mode` de la classe de l'endpoint, sinon
+  `API_PAGINATION_DEFAULT_MODE`.
+
+Chaque endpoint déclare l'ordre de son curseur (`cursor_ordering`) : champ
+horodaté puis `id` pour départager les égalités.
+"""
+
+from __future__ import annotations
+
+from django.conf import settings
+from rest_framework.pagination import BasePagination, CursorPagination, PageNumberPagination
+from rest_framework.settings import api_settings
+
+MODES = ("page", "cursor")
+
+
+class ModePagination(BasePagination):
+    cursor_ordering = ("-created_at", "-id")
+    default_mode = None
+    page_size = None  # défaut : REST_FRAMEWORK["PAGE_SIZE"]
+    mode_query_param = "pagination"
+
+    def __init__(self):
+        self.page_paginator = PageNumberPagination()
+        self.cursor_paginator = CursorPagination()
+        self.cursor_paginator.ordering = self.cursor_ordering
+        self.page_paginator.page_size = self.cursor_paginator.page_size = self.page_size or api_settings.PAGE_SIZE
+        self.active = self.page_paginator
+
+    def get_mode(self, request) -> str:
+        params = request.query_params
+        mode = params.get(self.mode_query_param)
+        if mode in MODES:
+            return mode
+        if params.get(self.cursor_paginator.cursor_query_param):
+            return "cursor"
+        return self.default_mode or settings.API_PAGINATION_DEFAULT_MODE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.active = self.cursor_paginator if self.get_mode(request) == "cursor" else self.page_paginator
+        return self.active.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.active.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        # Schéma commun : `count` n'est renvoyé qu'en mode page
+        response_schema = self.page_paginator.get_paginated_response_schema(schema)
+        response_schema["required"] = ["results"]
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.mode_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Mode de pagination : page (numéro de page, avec count) ou cursor (keyset)",
+                "schema": {"type": "string", "enum": list(MODES)},
+            },
+            *self.page_paginator.get_schema_operation_parameters(view),
+            *self.cursor_paginator.get_schema_operation_parameters(view),
+        ]
+
+    @property
+    def display_page_controls(self):
+        return getattr(self.active, "display_page_controls", False)
+
+    def get_results(self, data):
+        return self.active.get_results(data)
+
+    def to_html(self):
+        return self.active.to_html()
+
+
+class MessagePagination(ModePagination):
+    cursor_ordering = ("timestamp", "id")
+
+
+class WebhookEventPagination(ModePagination):
+    cursor_ordering = ("-received_at", "-id")
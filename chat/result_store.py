@@ -0,0 +1,175 @@
+"""Stockage des synthèses IA en trois niveaux, lu de proche en proche.
+
+1. LRU en mémoire du processus : `IA_RESULT_LRU_SIZE` entrées et
+   `IA_RESULT_LRU_MAX_BYTES` octets au plus (les moins récemment lues sont
+   évincées en premier), chaque entrée expirant après `IA_RESULT_LRU_TTL`
+   secondes. Une entrée n'est servie que si sa génération est celle de la clé
+   dans le cache partagé (`<cache_key>:generation`, incrémentée par chaque
+   ré-analyse) : une ré-analyse est vue aussitôt par tous les workers;
+2. cache partagé (Redis) sous `cache_key`, `IA_RESULT_CACHE_TIMEOUT` secondes,
+   compressé au-delà d'une taille seuil (`cache_compression`);
+3. base de données : synthèse (`MessageIA`) de la dernière exécution terminée
+   (`AnalysisRun`) de même `cache_key` ou de même `prompt_hash`.
+
+Un succès à un niveau repeuple les niveaux supérieurs; une seule lecture en base
+par clé à la fois (`cache_stampede`). Une ré-analyse invalide les niveaux mémoire
+et cache à son lancement (`invalider`). La base étant la source
+de vérité, un résultat reste lisible après l'expiration du cache.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+
+from .cache_compression import compressed_cache
+from .cache_stampede import attendre, verrou_recalcul
+
+
+class LRU:
+    """Cache LRU thread-safe borné en nombre d'entrées et en octets, avec durée de vie par entrée."""
+
+    def __init__(self):
+        self._data: "OrderedDict[str, Tuple[str, int, float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.taille_octets = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str, generation: Optional[int] = None) -> Optional[str]:
+        """Valeur de `key`; None si absente, expirée ou d'une autre `generation` que celle indiquée."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, _, expires, entry_generation = entry
+            if expires <= time.monotonic() or generation not in (None, entry_generation):
+                self._retirer(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, generation: int = 0) -> None:
+        max_entries, max_bytes = settings.IA_RESULT_LRU_SIZE, settings.IA_RESULT_LRU_MAX_BYTES
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            self._retirer(key)
+            if max_entries <= 0 or size > max_bytes:
+                return
+            self._data[key] = (value, size, time.monotonic() + settings.IA_RESULT_LRU_TTL, generation)
+            self.taille_octets += size
+            while len(self._data) > max_entries or self.taille_octets > max_bytes:
+                self._retirer(next(iter(self._data)))
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._retirer(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.taille_octets = 0
+
+    def _retirer(self, key: str) -> None:
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.taille_octets -= entry[1]
+
+
+_lru = LRU()
+
+
+def generation_key(cache_key: str) -> str:
+    return f"{cache_key}:generation"
+
+
+def generation(cache_key: str) -> int:
+    """Génération courante de `cache_key` dans le cache partagé (0 avant toute ré-analyse)."""
+    return cache.get(generation_key(cache_key)) or 0
+
+
+def enregistrer(cache_key: str, synthese: str) -> None:
+    """Synthèse finale d'une analyse : niveaux mémoire et cache (la base est écrite par la tâche)."""
+    courante = generation(cache_key)
+    compressed_cache.set(cache_key, synthese, timeout=settings.IA_RESULT_CACHE_TIMEOUT)
+    _lru.set(cache_key, synthese, courante)
+
+
+def invalider(cache_key: str) -> None:
+    """Retire la synthèse du cache et de la mémoire de tous les processus : une nouvelle analyse la remplacera."""
+    compressed_cache.delete(cache_key)
+    # Conservée plus longtemps que toute entrée mémoire, pour qu'aucune ne redevienne valide
+    key, timeout = generation_key(cache_key), max(settings.IA_RESULT_CACHE_TIMEOUT, settings.IA_RESULT_LRU_TTL) * 2
+    cache.add(key, 0, timeout=timeout)
+    try:
+        cache.incr(key)
+    except ValueError:  # expirée entre add() et incr()
+        cache.set(key, 1, timeout=timeout)
+    _lru.delete(cache_key)
+
+
+def lire_cache(cache_key: str) -> Optional[str]:
+    """Niveaux mémoire (entrée de la génération courante) puis cache partagé, sans requête SQL."""
+    courante = generation(cache_key)
+    synthese = _lru.get(cache_key, courante)
+    if synthese is None:
+        synthese = compressed_cache.get(cache_key)
+        if synthese:
+            _lru.set(cache_key, synthese, courante)
+    return synthese or None
+
+
+def absence_key(cache_key: str, prompt_hash: Optional[str] = None) -> str:
+    return f"{cache_key}:absent:{prompt_hash or ''}"
+
+
+def lire_base(cache_key: str, prompt_hash: Optional[str] = None) -> Optional[str]:
+    """Synthèse de la dernière exécution terminée; repeuple le cache et la mémoire.
+
+    Un seul lecteur interroge la base pour une clé donnée (`cache_stampede`) : les
+    autres attendent que le cache soit repeuplé, ou que ce lecteur constate
+    l'absence de résultat (marque `<cache_key>:absent`, brève) plutôt que d'attendre
+    `IA_STAMPEDE_WAIT` secondes à chaque sondage d'une analyse pas encore terminée.
+    """
+    absence = absence_key(cache_key, prompt_hash)
+    if cache.get(absence):
+        return None
+    with verrou_recalcul(cache_key) as acquis:
+        if acquis:
+            synthese = _lire_base(cache_key, prompt_hash)
+            if synthese is None:
+                cache.set(absence, True, timeout=max(int(settings.IA_STAMPEDE_WAIT), 1))
+            return synthese
+    # Fin de l'attente dès que la synthèse est en cache ou que son absence est constatée (True)
+    synthese = attendre(lambda: lire_cache(cache_key) or cache.get(absence))
+    return synthese if isinstance(synthese, str) else None
+
+
+def _lire_base(cache_key: str, prompt_hash: Optional[str]) -> Optional[str]:
+    from .models import AnalysisRun
+
+    critere = Q(cache_key=cache_key)
+    if prompt_hash:
+        critere |= Q(prompt_hash=prompt_hash)
+    synthese = (
+        AnalysisRun.objects.filter(critere, status=AnalysisRun.RunStatus.DONE)
+        .exclude(synthese_message=None)
+        .order_by("-completed_at", "-id")
+        .values_list("synthese_message__content", flat=True)
+        .first()
+    )
+    if synthese:
+        enregistrer(cache_key, synthese)
+    return synthese or None
+
+
+def lire(cache_key: str, prompt_hash: Optional[str] = None) -> Optional[str]:
+    """Synthèse finale de `cache_key` quel que soit le niveau qui la détient, ou None."""
+    return lire_cache(cache_key) or lire_base(cache_key, prompt_hash)
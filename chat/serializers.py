@@ -143,13 +143,18 @@ class ConversationSerializer(serializers.ModelSerializer):
             "fiche_numero",
         ]
 
+    # Valeurs annotées par `Conversation.objects.avec_apercu()`; requête par objet sinon (création, mise à jour)
     @extend_schema_field(serializers.CharField(allow_null=True))
     def get_first_message(self, obj):  # pragma: no cover - simple mapping
+        if hasattr(obj, "first_message"):
+            return obj.first_message
         msg = obj.messageia_set.order_by("timestamp").first()
         return msg.content if msg else None
 
     @extend_schema_field(serializers.IntegerField())
     def get_messages_count(self, obj):  # pragma: no cover - simple mapping
+        if hasattr(obj, "messages_count"):
+            return obj.messages_count
         return obj.messageia_set.count()
 
     def create(self, validated_data):  # pragma: no cover - simple override
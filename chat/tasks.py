@@ -1,9 +1,69 @@
 # app/tasks.py
+from datetime import datetime
+from datetime import timezone as dt_timezone
+
 from celery import shared_task
 from celery.exceptions import Ignore
-from django.core.cache import cache
+from celery.signals import worker_init, worker_process_init
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import AnalysisRun, Conversation, FicheConsultation, MessageIA
+
+
+@worker_init.connect
+@worker_process_init.connect
+def _prechauffer_worker(**kwargs):
+    """Encodeur de tokens chargé au démarrage du worker (et de chaque processus enfant), pas pendant une synthèse."""
+    from .ia_compaction import prechauffer
+
+    prechauffer()
+
+
+def _horodatage(ts):
+    return datetime.fromtimestamp(ts, tz=dt_timezone.utc) if ts else None
+
+
+def _demarrer_run(task_id, symptomes, user_id, conversation_id, cache_key):
+    """AnalysisRun de la tâche (créé ici si la tâche n'a pas été lancée via `lancer_analyse`)."""
+    from .ia_service import hash_prompt
+
+    run, _ = AnalysisRun.objects.get_or_create(
+        task_id=task_id,
+        defaults={
+            "cache_key": cache_key,
+            "prompt_hash": hash_prompt(symptomes),
+            "conversation_id": conversation_id,
+            "user_id": user_id,
+        },
+    )
+    run.status = AnalysisRun.RunStatus.RUNNING
+    run.started_at = run.started_at or timezone.now()
+    run.save(update_fields=["status", "started_at"])
+    return run
+
+
+def _noter_expert_tardif(run_id, expert):
+    """Complète les statistiques d'un expert arrivé après la synthèse (mode quorum)."""
+    with transaction.atomic():
+        run = AnalysisRun.objects.select_for_update().get(pk=run_id)
+        run.experts[expert.name] = expert.as_stats()
+        run.save(update_fields=["experts"])
+
+
+def _terminer_fiche(conv, full_response, cache_key):
+    """Reporte la synthèse sur la fiche liée à la conversation et notifie le flux SSE."""
+    from .ia_stream import publish_event
 
-from .models import Conversation, FicheConsultation, MessageIA
+    try:
+        if conv.fiche:
+            conv.fiche.diagnostic_ia = full_response
+            conv.fiche.status = "analyse_terminee"
+            conv.fiche.save()
+            publish_event(cache_key, "status", {"status": "analyse_terminee", "fiche_id": conv.fiche.id})
+    except FicheConsultation.DoesNotExist:
+        pass
 
 
 def stream_synthese(synthese_llm, synthese_message):
@@ -13,148 +73,254 @@ def stream_synthese(synthese_llm, synthese_message):
             yield chunk.content
 
 
-@shared_task(bind=True)
+def _publier_expert(cache_key, expert):
+    from .ia_stream import publish_event
+
+    publish_event(
+        cache_key,
+        "expert",
+        {"name": expert.name, "ok": expert.ok, "duration": round(expert.duration, 3), "late": expert.late},
+    )
+
+
+def _suite_du_lot(run):
+    """Analyse d'un lot terminée : libère sa place pour la suivante."""
+    if run.batch_id:
+        from .ia_service import avancer_lot
+
+        avancer_lot(run.batch_id)
+
+
+def _enregistrer_experts(conv, experts):
+    """Réponses des experts arrivés à temps dans la conversation (les tardifs sont enregistrés à leur arrivée)."""
+    MessageIA.objects.bulk_create(
+        [
+            MessageIA(conversation=conv, role=name, content=expert.content)
+            for name, expert in experts.items()
+            if not expert.late
+        ]
+    )
+
+
+def _finaliser_analyse(run, experts, conversation_id, cache_key):
+    """Étapes communes une fois les experts connus : messages, synthèse, cache, fiche(s) et suivi.
+
+    Retourne une référence à la synthèse (`cache_key`, exécution, message, longueur).
+    """
+    from . import clinical_cache, result_store
+    from .ia_engine import generer_synthese
+    from .ia_service import liberer
+    from .ia_stream import SynthesePublisher, publish_event
+
+    results = {name: expert.content for name, expert in experts.items()}
+    absents = [name for name, expert in experts.items() if not expert.ok]
+    with transaction.atomic():
+        run = AnalysisRun.objects.select_for_update().get(pk=run.pk)
+        # Statistiques de cette tentative prioritaires sur celles d'une tentative précédente, sauf expert
+        # tardif déjà noté par `_noter_expert_tardif` (ses vraies statistiques plutôt que l'absence)
+        nouvelles = {
+            name: expert.as_stats()
+            for name, expert in experts.items()
+            if not (expert.late and run.experts.get(name, {}).get("late"))
+        }
+        run.experts = {**run.experts, **nouvelles}
+        run.save(update_fields=["experts"])
+
+    conv = Conversation.objects.get(id=conversation_id)
+
+    # Synthèse publiée progressivement sous `<cache_key>:partial`
+    publisher = SynthesePublisher(cache_key)
+    stats = {}
+    full_response = generer_synthese(results, on_chunk=publisher, absents=absents, stats=stats)
+    # Messages des experts créés une fois la synthèse obtenue : une nouvelle tentative après un échec
+    # de la synthèse ne les duplique pas
+    _enregistrer_experts(conv, experts)
+    synthese = MessageIA.objects.create(conversation=conv, role="synthese", content=full_response)
+    run.fiche_id = conv.fiche_id
+    run.synthese_started_at = _horodatage(stats.get("started_at"))
+    run.synthese_ended_at = _horodatage(stats.get("ended_at"))
+    run.synthese_tokens = stats.get("tokens", {})
+    run.compaction = stats.get("compaction", {})
+    run.synthese_message = synthese
+    run.status = AnalysisRun.RunStatus.DONE
+    run.completed_at = timezone.now()
+    run.save(
+        update_fields=[
+            "fiche",
+            "synthese_started_at",
+            "synthese_ended_at",
+            "synthese_tokens",
+            "compaction",
+            "synthese_message",
+            "status",
+            "completed_at",
+        ]
+    )
+    result_store.enregistrer(cache_key, full_response)
+    if not absents:
+        # Synthèse complète : réutilisable pour le même contenu clinique (voir clinical_cache)
+        clinical_cache.enregistrer(run.clinical_key, full_response)
+    publisher.finish()
+    _terminer_fiche(conv, full_response, cache_key)
+
+    # Requêtes identiques rattachées pendant l'analyse : mêmes messages, sans nouvel appel LLM
+    for abonne in Conversation.objects.filter(id__in=liberer(cache_key)).exclude(id=conv.id):
+        _enregistrer_experts(abonne, experts)
+        MessageIA.objects.create(conversation=abonne, role="synthese", content=full_response)
+        _terminer_fiche(abonne, full_response, cache_key)
+    publish_event(cache_key, "done", {"offset": len(full_response), "cache_key": cache_key})
+    _suite_du_lot(run)
+    # Référence plutôt que le texte : la synthèse est en base et en cache, inutile de la copier dans le backend Celery
+    return {"cache_key": cache_key, "run_id": run.pk, "message_id": synthese.pk, "length": len(full_response)}
+
+
+def _echec_analyse(run, cache_key, exc):
+    from .ia_service import liberer
+    from .ia_stream import publish_event
+
+    liberer(cache_key)
+    AnalysisRun.objects.filter(pk=run.pk).update(
+        status=AnalysisRun.RunStatus.FAILED, error_message=str(exc), completed_at=timezone.now()
+    )
+    publish_event(cache_key, "error", {"detail": str(exc)})
+    _suite_du_lot(run)
+
+
+@shared_task(bind=True, max_retries=settings.IA_TASK_MAX_RETRIES)
 def analyse_symptomes_task(self, symptomes, user_id, conversation_id, cache_key):
     """
     Analyse les symptômes via plusieurs LLM en parallèle, stocke chaque réponse et la synthèse.
     Résultat final mis en cache avec structure améliorée.
+
+    Les appels LLM passent par le moteur asynchrone (`ia_engine`) : la tâche ne fait
+    qu'attendre la boucle d'événements partagée du worker. Les réponses d'experts
+    étant en cache, une nouvelle tentative ne rappelle que les experts manquants.
     """
+    run = _demarrer_run(self.request.id, symptomes, user_id, conversation_id, cache_key)
     try:
-        from concurrent.futures import ThreadPoolExecutor
-
-        from langchain.schema import HumanMessage
+        from .ia_engine import executer_experts
 
-        from .llm_config import claude, gemini, gpt4, synthese_llm
-
-        # Prompt amélioré et structuré
-        prompt_structure = f"""
-        En tant qu'assistant médical IA, analysez les données suivantes et fournissez une réponse structurée :
+        def on_expert(expert):
+            _publier_expert(cache_key, expert)
+            if expert.late:
+                # Expert arrivé après le quorum : conservé dans la conversation, hors synthèse
+                try:
+                    MessageIA.objects.create(conversation_id=conversation_id, role=expert.name, content=expert.content)
+                    _noter_expert_tardif(run.pk, expert)
+                finally:
+                    connection.close()
 
-        ## DONNÉES PATIENT
-        {symptomes}
+        experts = executer_experts(symptomes, on_result=on_expert)
+        return _finaliser_analyse(run, experts, conversation_id, cache_key)
 
-        ## FORMAT DE RÉPONSE REQUIS
-        Veuillez structurer votre réponse selon les sections suivantes :
+    except Exception as exc:
+        if self.request.retries < self.max_retries and not self.request.is_eager:
+            raise self.retry(exc=exc, countdown=5)
+        _echec_analyse(run, cache_key, exc)
+        self.update_state(state="FAILURE", meta={"error": str(exc), "status": "Erreur lors de l'analyse"})
+        raise Ignore()
 
-        ### 1. SYNTHÈSE CLINIQUE
-        - Résumé des éléments cliniques clés
-        - Points saillants du dossier
 
-        ### 2. DIAGNOSTICS DIFFÉRENTIELS
-        - Diagnostic principal avec niveau de certitude (%)
-        - Diagnostics différentiels possibles
-        - Argumentation clinique pour chaque hypothèse
+def file_expert(name):
+    """File Celery d'un expert (clé "queue" du fournisseur, sinon `ia_<nom>`)."""
+    from .llm_config import get_llm_config
 
-        ### 3. ANALYSES PARACLINIQUES RECOMMANDÉES
-        - Examens biologiques nécessaires
-        - Imagerie médicale si indiquée
-        - Autres explorations spécialisées
-        - Priorisation selon l'urgence
+    try:
+        return get_llm_config(name).get("queue", f"ia_{name}")
+    except Exception:
+        return f"ia_{name}"
 
-        ### 4. TRAITEMENT PROPOSÉ
-        - Traitement médicamenteux avec posologie précise
-        - Durée du traitement
-        - Surveillance nécessaire
-        - Effets secondaires à surveiller
 
-        ### 5. ÉDUCATION THÉRAPEUTIQUE ET CONSEILS
-        - Conseils hygiéno-diététiques
-        - Modifications du mode de vie
-        - Signes d'alerte à surveiller
-        - Suivi recommandé
+def _cle_reponse_expert(cache_key, name, task_id):
+    return f"{cache_key}:expert:{name}:{task_id}"
 
-        ### 6. RÉFÉRENCES BIBLIOGRAPHIQUES
-        - Sources scientifiques pertinentes (PubMed, CINAHL, HAS)
-        - Guidelines et recommandations officielles
-        - Format : Auteur(s). Titre. Journal. Année. [URL si disponible]
 
-        Soyez précis, prudent et toujours rappeler que cette analyse nécessite validation par un médecin.
-        """
+@shared_task(bind=True)
+def analyse_expert_task(self, name, symptomes, cache_key, run_task_id=None):
+    """
+    Pipeline `chord` : interroge un seul expert, sur la file de son fournisseur.
+    Ne lève pas d'exception : un échec devient un résultat `ok=False` transmis à la synthèse.
+    La réponse est déposée dans le cache : seuls sa clé (`content_key`) et les statistiques
+    transitent par le backend de résultats du chord.
+    """
+    from dataclasses import asdict
 
-        message = HumanMessage(content=prompt_structure)
+    from .cache_compression import compressed_cache
+    from .ia_engine import ExpertResult, _erreur, executer_experts
+    from .llm_config import get_llm
 
-        def gpt4_call():
-            return gpt4.invoke([message]).content
+    if run_task_id:
+        AnalysisRun.objects.filter(task_id=run_task_id, started_at__isnull=True).update(
+            status=AnalysisRun.RunStatus.RUNNING, started_at=timezone.now()
+        )
+    try:
+        expert = executer_experts(symptomes, experts={name: get_llm(name)}, quorum=0, deadline=0)[name]
+    except Exception as exc:
+        now = datetime.now().timestamp()
+        expert = ExpertResult(name, _erreur(name, exc), False, now, now)
+    _publier_expert(cache_key, expert)
+    # Conservée le temps de la synthèse et de ses nouvelles tentatives
+    content_key = _cle_reponse_expert(cache_key, name, self.request.id)
+    compressed_cache.set(content_key, expert.content, timeout=settings.IA_INFLIGHT_TIMEOUT)
+    result = asdict(expert)
+    del result["content"]
+    return {**result, "content_key": content_key}
+
+
+def _resoudre_experts(expert_results):
+    """`ExpertResult` des tâches expert du chord, réponses relues depuis le cache."""
+    from .cache_compression import compressed_cache
+    from .ia_engine import ExpertResult, _erreur
+
+    contents = compressed_cache.get_many(result["content_key"] for result in expert_results)
+    experts = {}
+    for result in expert_results:
+        result = dict(result)
+        content = contents.get(result.pop("content_key"))
+        if content is None:
+            content = _erreur(result["name"], TimeoutError("réponse expirée du cache avant la synthèse"))
+            result["ok"] = False
+        experts[result["name"]] = ExpertResult(content=content, **result)
+    return experts
+
+
+@shared_task(bind=True, max_retries=settings.IA_TASK_MAX_RETRIES)
+def synthese_analyse_task(self, expert_results, symptomes, user_id, conversation_id, cache_key):
+    """
+    Pipeline `chord` : callback de synthèse, reçoit les résultats des tâches expert.
+    Même contrat que `analyse_symptomes_task` (cache_key, MessageIA, statut de la fiche).
+    """
+    from .cache_compression import compressed_cache
 
-        def claude_call():
-            return claude.invoke([message]).content
+    run = _demarrer_run(self.request.id, symptomes, user_id, conversation_id, cache_key)
+    try:
+        result = _finaliser_analyse(run, _resoudre_experts(expert_results), conversation_id, cache_key)
+        compressed_cache.delete_many(expert["content_key"] for expert in expert_results)
+        return result
+    except Exception as exc:
+        if self.request.retries < self.max_retries and not self.request.is_eager:
+            raise self.retry(exc=exc, countdown=5)
+        _echec_analyse(run, cache_key, exc)
+        self.update_state(state="FAILURE", meta={"error": str(exc), "status": "Erreur lors de l'analyse"})
+        raise Ignore()
 
-        def gemini_call():
-            return gemini.invoke([message]).content
 
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            tasks = {
-                "gpt4": executor.submit(gpt4_call),
-                "claude": executor.submit(claude_call),
-                "gemini": executor.submit(gemini_call),
-            }
-            results = {}
-            for name, future in tasks.items():
-                try:
-                    results[name] = future.result(timeout=120)
-                except Exception as e:
-                    results[name] = f"Erreur {name} : {e}"
-
-        conv = Conversation.objects.get(id=conversation_id)
-        for model, content in results.items():
-            MessageIA.objects.create(conversation=conv, role=model, content=content)
-
-        # Prompt de synthèse amélioré
-        synthese_message = HumanMessage(
-            content=f"""
-        Vous disposez des analyses de trois experts IA médicaux. Votre rôle est de produire une synthèse médicale 
-        structurée et consensuelle.
-
-        ## ANALYSES EXPERTES :
-
-        ### 🤖 GPT-4 - Analyse Générale
-        {results['gpt4']}
-
-        ### 🧠 Claude 3 - Raisonnement Médical  
-        {results['claude']}
-
-        ### 🔬 Gemini Pro - Synthèse Diagnostique
-        {results['gemini']}
-
-        ## SYNTHÈSE DEMANDÉE :
-        
-        Produisez une synthèse médicale structurée en conservant le format à 6 sections :
-        1. Synthèse clinique consensuelle
-        2. Diagnostics avec niveaux de certitude
-        3. Analyses paracliniques prioritaires
-        4. Traitement avec posologies précises
-        5. Éducation thérapeutique adaptée
-        6. Références bibliographiques fiables
-
-        ### DIRECTIVES :
-        - Intégrez les points de convergence entre les experts
-        - Signaler les divergences s'il y en a
-        - Privilégiez la prudence et la sécurité du patient
-        - Utilisez des emojis pour améliorer la lisibilité 🩺
-        - Rappeler que cette analyse doit être validée par un médecin
-
-        Répondez comme un assistant médical expert, rigoureux et bienveillant.
-        """
-        )
+def lancer_chord_analyse(symptomes, user_id, conversation_id, cache_key, task_id, queue=None):
+    """Une tâche par expert (chacune sur sa file) puis la synthèse; `task_id` est celui de la synthèse.
 
-        full_response = ""
-        for chunk in stream_synthese(synthese_llm, synthese_message):
-            full_response += chunk
-        MessageIA.objects.create(conversation=conv, role="synthese", content=full_response)
-        cache.set(cache_key, full_response, timeout=3600)
+    `queue` est la file de priorité de la synthèse (voir `triage`).
+    """
+    from celery import chord
 
-        try:
-            if conv.fiche:
-                conv.fiche.diagnostic_ia = full_response
-                conv.fiche.status = "analyse_terminee"
-                conv.fiche.save()
-        except FicheConsultation.DoesNotExist:
-            pass
-        return full_response
+    from .ia_engine import EXPERTS
 
-    except Exception as exc:
-        self.update_state(state="FAILURE", meta={"error": str(exc), "status": "Erreur lors de l'analyse"})
-        raise Ignore()
+    header = [
+        analyse_expert_task.s(name, symptomes, cache_key, task_id).set(queue=file_expert(name)) for name in EXPERTS
+    ]
+    body = synthese_analyse_task.s(symptomes, user_id, conversation_id, cache_key).set(task_id=task_id)
+    if queue:
+        body = body.set(queue=queue)
+    return chord(header)(body)
 
 
 @shared_task(bind=True)
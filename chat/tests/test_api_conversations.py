@@ -0,0 +1,43 @@
+"""Integration tests for Conversation API endpoints."""
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+
+from chat.models import Conversation, MessageIA
+
+
+def creer_conversations(user, nombre):
+    for i in range(nombre):
+        conv = Conversation.objects.create(user=user)
+        MessageIA.objects.create(conversation=conv, role="gpt4", content=f"Réponse {i}")
+        MessageIA.objects.create(conversation=conv, role="user", content=f"Question {i} " + "x" * 40)
+
+
+@pytest.mark.integration
+class TestConversationAPI:
+    BASE_URL = "/api/v1/conversations/"
+
+    def _requetes_liste(self, client):
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(self.BASE_URL)
+        assert response.status_code == status.HTTP_200_OK
+        return len(ctx.captured_queries), response.data["results"]
+
+    def test_list_query_count_independent_of_page_size(self, authenticated_client, patient_user):
+        creer_conversations(patient_user, 2)
+        petite, _ = self._requetes_liste(authenticated_client)
+        creer_conversations(patient_user, 8)
+        grande, results = self._requetes_liste(authenticated_client)
+
+        assert len(results) == 10
+        assert grande == petite
+
+    def test_list_reads_annotations(self, authenticated_client, patient_user):
+        creer_conversations(patient_user, 1)
+
+        _, (data,) = self._requetes_liste(authenticated_client)
+        assert data["messages_count"] == 2
+        assert data["first_message"] == "Réponse 0"
+        assert data["titre"] == ("Question 0 " + "x" * 40)[:30] + "..."
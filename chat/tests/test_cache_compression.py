@@ -0,0 +1,44 @@
+"""Tests de la compression des textes volumineux en cache."""
+
+import pytest
+from django.core.cache import cache
+
+from chat import result_store
+from chat.cache_compression import MAGIC, compressed_cache, compresser, decompresser
+from chat.llm_fake import FakeChatModel
+
+SYNTHESE = FakeChatModel()._reponse("Paludisme simple", "Artéméther-luméfantrine", 80) * 3
+
+
+@pytest.fixture(autouse=True)
+def cache_vide():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.mark.parametrize("codec,header", [("zstd", b"s"), ("zlib", b"z")])
+def test_aller_retour(settings, codec, header):
+    settings.IA_CACHE_COMPRESSION = codec
+
+    value = compresser(SYNTHESE)
+    assert value.startswith(MAGIC + header)
+    assert len(value) < len(SYNTHESE.encode("utf-8")) / 2
+    assert decompresser(value) == SYNTHESE
+
+
+def test_valeurs_laissees_intactes(settings):
+    assert compresser("court") == "court"
+    assert compresser({"seq": 1}) == {"seq": 1}
+    assert decompresser("ancienne entrée non compressée") == "ancienne entrée non compressée"
+
+    settings.IA_CACHE_COMPRESSION = "none"
+    assert compresser(SYNTHESE) == SYNTHESE
+
+
+def test_stockage_compresse_et_lecture_transparente():
+    result_store.enregistrer("diagnostic_z", SYNTHESE)
+
+    assert cache.get("diagnostic_z").startswith(MAGIC)
+    assert result_store.lire_cache("diagnostic_z") == SYNTHESE
+    assert compressed_cache.get_many(["diagnostic_z", "absente"]) == {"diagnostic_z": SYNTHESE}
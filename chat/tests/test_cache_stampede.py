@@ -0,0 +1,124 @@
+"""Tests de la protection contre la ruée sur le cache."""
+
+import threading
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+
+from chat import cache_stampede, result_store
+
+
+@pytest.fixture(autouse=True)
+def cache_vide():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+class Calcul:
+    def __init__(self, valeur="liste"):
+        self.valeur, self.appels = valeur, 0
+
+    def __call__(self):
+        self.appels += 1
+        return self.valeur
+
+
+def test_un_seul_calcul_tant_que_valide():
+    calcul = Calcul()
+
+    assert cache_stampede.obtenir("tableau", calcul, timeout=60) == "liste"
+    assert cache_stampede.obtenir("tableau", calcul, timeout=60) == "liste"
+    assert calcul.appels == 1
+
+
+def test_rafraichissement_anticipe():
+    assert cache_stampede.a_rafraichir(0.0, echeance=100.0, now=101.0)
+    assert not cache_stampede.a_rafraichir(0.0, echeance=100.0, now=99.0)
+    # Calcul coûteux (10 s) à 1 s de l'échéance : recalcul anticipé dans la plupart des tirages
+    tirages = [cache_stampede.a_rafraichir(10.0, echeance=100.0, now=99.0) for _ in range(200)]
+    assert sum(tirages) > 150
+
+
+def test_recalcul_en_cours_ailleurs_sert_l_ancienne_valeur(monkeypatch):
+    cache_stampede.obtenir("tableau", Calcul("ancienne"), timeout=60)
+    monkeypatch.setattr(cache_stampede, "a_rafraichir", lambda *args, **kwargs: True)
+    cache_stampede.prendre_verrou("tableau")
+    calcul = Calcul("nouvelle")
+
+    assert cache_stampede.obtenir("tableau", calcul, timeout=60) == "ancienne"
+    assert calcul.appels == 0
+
+
+def test_attend_le_calcul_concurrent():
+    cache_stampede.prendre_verrou("tableau")
+    ecriture = threading.Timer(
+        0.1, lambda: cache.set("tableau", {"valeur": "calculée ailleurs", "duree": 0.1, "echeance": 1e12})
+    )
+    ecriture.start()
+    calcul = Calcul()
+
+    assert cache_stampede.obtenir("tableau", calcul, timeout=60, attente=2) == "calculée ailleurs"
+    assert calcul.appels == 0
+
+
+def test_lecture_en_base_par_un_seul_lecteur(settings, django_assert_num_queries):
+    settings.IA_STAMPEDE_WAIT = 0
+    jeton = cache_stampede.prendre_verrou("diagnostic_x")
+
+    with django_assert_num_queries(0):
+        assert result_store.lire_base("diagnostic_x") is None
+    cache_stampede.liberer_verrou("diagnostic_x", jeton)
+    assert cache.get(cache_stampede.cle_verrou("diagnostic_x")) is None
+
+
+def test_notification_concurrente_envoyee_une_fois():
+    pytest.importorskip("pytz")
+    from chat.notification_service import TwilioNotificationService
+
+    service = TwilioNotificationService()
+    service._client, service.phone_number = mock.Mock(), "+15550000000"
+    cle = service._generate_cache_key("+243999999999", "Bonjour", "sms")
+    cache_stampede.prendre_verrou(cle)
+
+    result = service.send_sms("+243999999999", "Bonjour")
+
+    assert result.status == "in_progress"
+    service._client.messages.create.assert_not_called()
+
+
+def test_notification_envoyee_pendant_l_attente_du_verrou(monkeypatch):
+    pytest.importorskip("pytz")
+    from chat import notification_service
+
+    service = notification_service.TwilioNotificationService()
+    service._client, service.phone_number = mock.Mock(), "+15550000000"
+    cle = service._generate_cache_key("+243999999999", "Bonjour", "sms")
+    prendre_verrou = notification_service.prendre_verrou
+
+    def envoi_concurrent_termine(key):
+        # Un autre appelant envoie puis libère le verrou entre la vérification et la prise du verrou
+        service._mark_as_sent(cle, "SM-autre")
+        return prendre_verrou(key)
+
+    monkeypatch.setattr(notification_service, "prendre_verrou", envoi_concurrent_termine)
+
+    result = service.send_sms("+243999999999", "Bonjour")
+
+    assert (result.status, result.message_sid) == ("already_sent", "SM-autre")
+    service._client.messages.create.assert_not_called()
+    assert cache.get(cache_stampede.cle_verrou(cle)) is None
+
+
+def test_liberation_atomique_sur_redis(monkeypatch):
+    client = mock.Mock()
+    client.make_key.side_effect = lambda key: f":1:{key}"
+    client.encode.side_effect = lambda value: f"encodé:{value}"
+    monkeypatch.setattr(cache_stampede, "_client_redis", lambda: client)
+
+    cache_stampede.liberer_verrou("tableau", "jeton")
+
+    script, nombre, cle, jeton = client.get_client.return_value.eval.call_args.args
+    assert "redis.call('del'" in script
+    assert (nombre, cle, jeton) == (1, ":1:tableau:recalcul", "encodé:jeton")
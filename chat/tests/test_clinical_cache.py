@@ -0,0 +1,95 @@
+"""Tests du cache des synthèses par contenu clinique des fiches."""
+
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+
+from chat import clinical_cache, llm_config
+from chat.fiche_formatter import formater_fiche
+from chat.ia_service import lancer_analyse
+from chat.models import AnalysisRun, Conversation, FicheConsultation, MessageIA
+
+
+@pytest.fixture(autouse=True)
+def cache_vide():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def envois(monkeypatch):
+    calls = []
+    monkeypatch.setattr("chat.tasks.analyse_symptomes_task.apply_async", lambda *args, **kwargs: calls.append(kwargs))
+    return calls
+
+
+def _copie(fiche, **changes):
+    autre = FicheConsultation.objects.get(pk=fiche.pk)
+    autre.pk, autre.numero_dossier = None, ""
+    for name, value in changes.items():
+        setattr(autre, name, value)
+    autre.save()
+    return autre
+
+
+def test_cle_ignore_identite_et_casse(sample_fiche):
+    autre = _copie(sample_fiche, nom="Autre", telephone="+243111111111", motif_consultation="TEST  consultation")
+
+    assert clinical_cache.cle_clinique(autre) == clinical_cache.cle_clinique(sample_fiche)
+    assert clinical_cache.cle_clinique(_copie(sample_fiche, spo2=85)) != clinical_cache.cle_clinique(sample_fiche)
+
+
+def test_cache_desactive(sample_fiche, settings):
+    settings.IA_CLINICAL_CACHE = False
+    assert clinical_cache.cle_clinique(sample_fiche) is None
+
+
+def test_resoumission_servie_sans_tache(patient_user, sample_fiche, envois, django_capture_on_commit_callbacks):
+    clinical_cache.enregistrer(clinical_cache.cle_clinique(sample_fiche), "synthèse connue")
+    autre = _copie(sample_fiche, nom="Autre")
+    conversation = Conversation.objects.create(user=patient_user, fiche=autre)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        task_id, cache_key, _ = lancer_analyse(formater_fiche(autre), patient_user.id, conversation.id)
+
+    assert envois == []
+    run = AnalysisRun.objects.get(task_id=task_id)
+    assert run.cache_hit and run.status == AnalysisRun.RunStatus.DONE
+    assert run.synthese_message.content == "synthèse connue"
+    assert cache.get(cache_key) == "synthèse connue"
+    autre.refresh_from_db()
+    assert autre.diagnostic_ia == "synthèse connue"
+    assert autre.status == "analyse_terminee"
+
+
+def test_texte_libre_hors_cache_clinique(patient_user, sample_fiche, envois, django_capture_on_commit_callbacks):
+    clinical_cache.enregistrer(clinical_cache.cle_clinique(sample_fiche), "synthèse connue")
+    conversation = Conversation.objects.create(user=patient_user, fiche=sample_fiche)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        task_id, _, _ = lancer_analyse("céphalées depuis 3 jours", patient_user.id, conversation.id)
+
+    assert len(envois) == 1
+    assert AnalysisRun.objects.get(task_id=task_id).clinical_key == ""
+
+
+def test_synthese_complete_enregistree_et_statistiques(
+    patient_user, medecin_user, api_client, sample_fiche, settings, django_capture_on_commit_callbacks
+):
+    settings.IA_LLM_FAKE = True
+    settings.IA_LLM_FAKE_OPTIONS = {"latency": 0, "tokens_per_second": 0}
+    llm_config.reset_llms()
+    conversation = Conversation.objects.create(user=patient_user, fiche=sample_fiche)
+    try:
+        with django_capture_on_commit_callbacks(execute=True):
+            lancer_analyse(formater_fiche(sample_fiche), patient_user.id, conversation.id)
+    finally:
+        llm_config.reset_llms()
+
+    synthese = MessageIA.objects.get(conversation=conversation, role="synthese").content
+    assert clinical_cache.lire(clinical_cache.cle_clinique(sample_fiche)) == synthese
+
+    api_client.force_authenticate(user=medecin_user)
+    stats = api_client.get(reverse("ia_metrics")).data["cache_clinique"]
+    assert stats == {"hits": 1, "misses": 1, "hit_ratio": 0.5, "miss_ratio": 0.5}
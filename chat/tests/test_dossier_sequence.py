@@ -0,0 +1,48 @@
+"""Tests de l'attribution des numéros de dossier par compteur journalier."""
+
+import datetime
+
+import pytest
+
+from chat import dossier_sequence
+from chat.models import DossierSequence
+
+JOUR = datetime.date(2026, 3, 14)
+
+
+@pytest.mark.django_db
+def test_numeros_consecutifs_en_une_requete(django_assert_num_queries):
+    with django_assert_num_queries(1):
+        premier = dossier_sequence.prochain_numero(JOUR)
+
+    assert premier == "CONS-20260314-001"
+    assert dossier_sequence.prochain_numero(JOUR) == "CONS-20260314-002"
+    assert dossier_sequence.prochain_numero(JOUR + datetime.timedelta(days=1)) == "CONS-20260315-001"
+
+
+@pytest.mark.django_db
+def test_reservation_d_un_bloc():
+    dossier_sequence.prochain_numero(JOUR)
+
+    assert dossier_sequence.reserver(3, JOUR) == range(2, 5)
+    assert dossier_sequence.reserver_numeros(2, JOUR) == ["CONS-20260314-005", "CONS-20260314-006"]
+    assert DossierSequence.objects.get(jour=JOUR).dernier == 6
+    with pytest.raises(ValueError):
+        dossier_sequence.reserver(0, JOUR)
+
+
+@pytest.mark.django_db
+def test_repli_par_verrou(monkeypatch):
+    monkeypatch.setattr(dossier_sequence, "_upsert_supporte", lambda: False)
+
+    assert dossier_sequence.reserver(2, JOUR) == range(1, 3)
+    assert dossier_sequence.prochain_numero(JOUR) == "CONS-20260314-003"
+
+
+@pytest.mark.django_db
+def test_fiche_numerotee_a_l_enregistrement(sample_fiche):
+    sample_fiche.pk, sample_fiche.numero_dossier = None, ""
+    sample_fiche.save()
+    autre = type(sample_fiche).objects.get(pk=sample_fiche.pk)
+
+    assert autre.numero_dossier == dossier_sequence.format_numero(autre.date_consultation, 1)
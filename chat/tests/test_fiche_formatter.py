@@ -0,0 +1,37 @@
+"""Tests du texte canonique des fiches envoyé aux experts IA."""
+
+from chat.fiche_formatter import formater_fiche
+from chat.ia_service import cle_analyse
+from chat.models import FicheConsultation
+
+
+def test_meme_contenu_clinique_meme_cle(sample_fiche):
+    sample_fiche.temperature, sample_fiche.motif_consultation, sample_fiche.tete = 38.5, "Fièvre  et\ntoux", ""
+    autre = FicheConsultation.objects.get(pk=sample_fiche.pk)
+    autre.pk = None
+    autre.nom, autre.telephone, autre.contact_nom = "Autre", "+243111111111", "Quelqu'un"
+    autre.temperature, autre.motif_consultation, autre.tete = 38.50, " Fièvre et toux ", None
+
+    assert formater_fiche(autre) == formater_fiche(sample_fiche)
+    assert cle_analyse(formater_fiche(autre)) == cle_analyse(formater_fiche(sample_fiche))
+
+
+def test_normalisation(sample_fiche):
+    sample_fiche.temperature, sample_fiche.spo2, sample_fiche.cephalees = 37.0, None, None
+    sample_fiche.tabac, sample_fiche.poumons = "tres_souvent", "Râles\r\n  crépitants"
+
+    texte = formater_fiche(sample_fiche)
+    assert "- Température : 37 °C" in texte
+    assert "- SpO2 : NR" in texte
+    assert "- Céphalées : NR" in texte
+    assert "- Hypertension : Non" in texte
+    assert "- Tabac : Très souvent" in texte
+    assert "- Poumons : Râles crépitants" in texte
+    assert "- Cou :" not in texte
+
+
+def test_sans_donnees_identifiantes(sample_fiche):
+    texte = formater_fiche(sample_fiche)
+    for value in (sample_fiche.nom, sample_fiche.telephone):
+        assert value not in texte
+    assert texte.startswith("Patient :\n- Âge : ")
@@ -0,0 +1,145 @@
+"""Tests de l'import en masse de fiches (fichier CSV / JSON lines)."""
+
+import csv
+import io
+import json
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.urls import reverse
+
+from chat import fiche_import
+from chat.models import AnalysisBatch, Conversation, FicheConsultation
+
+LIGNE = {
+    "nom": "Kabila",
+    "postnom": "Mwamba",
+    "prenom": "Grace",
+    "date_naissance": "1985-06-01",
+    "age": "40",
+    "sexe": "F",
+    "telephone": "+243811111111",
+    "occupation": "Commerçante",
+    "avenue": "Av. du Marché",
+    "quartier": "Matonge",
+    "commune": "Kalamu",
+    "contact_nom": "Jean",
+    "contact_telephone": "+243822222222",
+    "contact_adresse": "Kinshasa",
+    "etat": "Conservé",
+    "capacite_physique": "Top",
+    "capacite_psychologique": "Top",
+    "febrile": "Oui",
+    "tegument": "Normal",
+    "motif_consultation": "Fièvre",
+}
+
+
+def fichier_csv(lignes):
+    flux = io.StringIO()
+    writer = csv.DictWriter(flux, fieldnames=[*LIGNE, "temperature"])
+    writer.writeheader()
+    writer.writerows({"temperature": "", **ligne} for ligne in lignes)
+    return flux.getvalue().encode("utf-8")
+
+
+def test_import_csv_par_blocs(medecin_user, django_assert_max_num_queries):
+    lignes = [dict(LIGNE, prenom=f"Patient {i}") for i in range(5)] + [dict(LIGNE, age="abc")]
+
+    with django_assert_max_num_queries(20):
+        rapport = fiche_import.importer(io.BytesIO(fichier_csv(lignes)), "csv", medecin_user, chunk_size=4)
+
+    assert (rapport.total, rapport.importees) == (6, 5)
+    assert rapport.erreurs[0]["ligne"] == 7
+    assert "age" in rapport.erreurs[0]["erreurs"]
+    fiches = FicheConsultation.objects.order_by("numero_dossier")
+    assert [fiche.numero_dossier[-3:] for fiche in fiches] == ["001", "002", "003", "004", "005"]
+    assert fiches[0].temperature is None
+    assert Conversation.objects.filter(fiche__in=fiches, user=medecin_user).count() == 5
+
+
+def test_import_jsonl_lignes_invalides(patient_user):
+    contenu = "\n".join([json.dumps(LIGNE), "{pas du json", "[]", "", json.dumps(dict(LIGNE, nom=""))])
+
+    rapport = fiche_import.importer(io.StringIO(contenu), "jsonl", patient_user)
+
+    assert rapport.importees == 1
+    assert [erreur["ligne"] for erreur in rapport.erreurs] == [2, 3, 5]
+    # Fiches importées par un patient : rattachées à son compte
+    assert FicheConsultation.objects.get().user == patient_user
+
+
+def test_import_avec_analyse_en_lot(medecin_user, monkeypatch):
+    lancees = []
+    monkeypatch.setattr("chat.ia_service.demarrer_tache", lambda *args: lancees.append(args))
+
+    rapport = fiche_import.importer(
+        io.BytesIO(fichier_csv([LIGNE, dict(LIGNE, prenom="Autre")])), "csv", medecin_user, analyser=True
+    )
+
+    batch = AnalysisBatch.objects.get(pk=rapport.lots[0])
+    assert len(batch.items) == 2
+    assert "Fièvre" in Conversation.objects.get(pk=batch.items[0]["conversation"]).messageia_set.get().content
+
+
+def test_analyse_en_lots_bornes_par_la_taille_maximale(medecin_user, monkeypatch, settings):
+    monkeypatch.setattr("chat.ia_service.demarrer_tache", lambda *args: None)
+    settings.IA_BATCH_MAX_SIZE = 2
+    lignes = [dict(LIGNE, prenom=f"Patient {i}") for i in range(5)]
+
+    rapport = fiche_import.importer(io.BytesIO(fichier_csv(lignes)), "csv", medecin_user, analyser=True)
+
+    lots = AnalysisBatch.objects.filter(pk__in=rapport.lots).order_by("pk")
+    assert [len(batch.items) for batch in lots] == [2, 2, 1]
+    assert rapport.importees == 5
+
+
+def test_lots_chaines_concurrence_bornee_pour_tout_l_import(
+    medecin_user, monkeypatch, settings, django_capture_on_commit_callbacks
+):
+    from chat.ia_service import avancer_lot
+    from chat.models import AnalysisRun
+
+    monkeypatch.setattr("chat.ia_service.demarrer_tache", lambda *args: None)
+    settings.IA_BATCH_MAX_SIZE = 2
+    settings.IA_BATCH_CONCURRENCY = 2
+    lignes = [dict(LIGNE, motif_consultation=f"Motif {i}") for i in range(5)]
+    en_cours = AnalysisRun.objects.filter(status__in=[AnalysisRun.RunStatus.PENDING, AnalysisRun.RunStatus.RUNNING])
+
+    with django_capture_on_commit_callbacks(execute=True):
+        rapport = fiche_import.importer(
+            io.BytesIO(fichier_csv(lignes)), "csv", medecin_user, analyser=True, chunk_size=3
+        )
+
+    lots = list(AnalysisBatch.objects.filter(pk__in=rapport.lots).order_by("pk"))
+    # Blocs de 3 puis 2 lignes : lots de 2, 1 et 2 fiches, chacun chaîné au précédent
+    assert [len(batch.items) for batch in lots] == [2, 1, 2]
+    assert [batch.precedent_id for batch in lots] == [None, lots[0].pk, lots[1].pk]
+    for batch in lots:
+        # Seul le lot courant a des analyses en cours, jamais plus que sa concurrence
+        assert en_cours.count() == len(batch.items) <= settings.IA_BATCH_CONCURRENCY
+        assert set(en_cours.values_list("batch", flat=True)) == {batch.pk}
+        en_cours.update(status=AnalysisRun.RunStatus.DONE)
+        with django_capture_on_commit_callbacks(execute=True):
+            avancer_lot(batch.pk)
+    assert not AnalysisRun.objects.filter(status=AnalysisRun.RunStatus.QUEUED).exists()
+    assert all(batch.completed_at for batch in AnalysisBatch.objects.filter(pk__in=rapport.lots))
+
+
+def test_endpoint_et_commande(api_client, medecin_user, patient_user, tmp_path):
+    url = reverse("chat_api:fiche-consultation-importer")
+    api_client.force_authenticate(user=patient_user)
+    assert api_client.post(url, {}, format="multipart").status_code == 403
+
+    api_client.force_authenticate(user=medecin_user)
+    upload = SimpleUploadedFile("registre.csv", fichier_csv([LIGNE]), content_type="text/csv")
+    response = api_client.post(url, {"fichier": upload}, format="multipart")
+    assert response.status_code == 200
+    assert response.data["importees"] == 1
+
+    chemin = tmp_path / "registre.jsonl"
+    chemin.write_text(json.dumps(LIGNE) + "\n", encoding="utf-8")
+    sortie = io.StringIO()
+    call_command("import_fiches", str(chemin), user=medecin_user.username, json=True, stdout=sortie)
+    assert json.loads(sortie.getvalue())["importees"] == 1
+    assert FicheConsultation.objects.count() == 2
@@ -0,0 +1,52 @@
+"""Tests de l'historique paginé des conversations du chat."""
+
+from django.urls import reverse
+
+from chat import history_service
+from chat.models import Conversation, MessageIA
+
+
+def creer_conversations(user, nombre):
+    conversations = []
+    for i in range(nombre):
+        conv = Conversation.objects.create(user=user)
+        MessageIA.objects.create(conversation=conv, role="user", content=f"Question {i}")
+        MessageIA.objects.create(conversation=conv, role="gpt4", content="Réponse d'expert")
+        MessageIA.objects.create(conversation=conv, role="synthese", content=f"Synthèse {i}")
+        conversations.append(conv)
+    return conversations
+
+
+def test_page_limitee_a_l_utilisateur(medecin_user, patient_user, django_assert_num_queries):
+    mes_conversations = creer_conversations(medecin_user, 3)
+    creer_conversations(patient_user, 2)
+    Conversation.objects.create(user=medecin_user)  # sans message : absente de l'historique
+
+    with django_assert_num_queries(2):
+        page = history_service.page_historique(medecin_user, taille=2)
+        contenus = [[msg.content for msg in item["messages"]] for item in page.items]
+
+    assert [item["conversation"] for item in page.items] == mes_conversations[::-1][:2]
+    assert contenus[0] == ["Question 2", "Synthèse 2"]
+    assert page.next_page == 2
+
+    suivante = history_service.page_historique(medecin_user, page=2, taille=2)
+    assert [item["conversation"] for item in suivante.items] == [mes_conversations[0]]
+    assert not suivante.has_more
+
+
+def test_charger_plus(client, medecin_user, settings):
+    settings.CHAT_HISTORY_PAGE_SIZE = 2
+    creer_conversations(medecin_user, 3)
+    client.force_login(medecin_user)
+    url = reverse("chat_history_partial")
+
+    premiere = client.get(url).json()
+    assert 'id="chat-history"' in premiere["html"]
+    assert 'data-next-page="2"' in premiere["html"]
+
+    suite = client.get(url, {"page": 2}).json()
+    assert suite == {"html": suite["html"], "page": 2, "next_page": None, "has_more": False}
+    assert "chat-history" not in suite["html"]
+    assert "Question 0" in suite["html"]
+    assert client.get(url, {"page": "abc"}).json()["page"] == 1
@@ -0,0 +1,376 @@
+"""Tests des endpoints IA asynchrones (résultat, progression)."""
+
+import json
+
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+
+from chat.ia_stream import SynthesePublisher, partial_key, preparer_suivi, publish_event
+
+
+@pytest.fixture
+def medecin_client(api_client, medecin_user):
+    api_client.force_authenticate(user=medecin_user)
+    return api_client
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+class TestAnalyseResultPartial:
+    def test_pending_without_cache(self, medecin_client):
+        response = medecin_client.get(reverse("ia_result"), {"cache_key": "diagnostic_x"})
+        assert response.status_code == 200
+        assert response.data["status"] == "pending"
+
+    def test_partial_returns_delta_since_offset(self, medecin_client):
+        publisher = SynthesePublisher("diagnostic_x", interval=0)
+        publisher("## 1. SYNTHÈSE ")
+        publisher("CLINIQUE")
+
+        first = medecin_client.get(reverse("ia_result"), {"cache_key": "diagnostic_x"}).data
+        assert first["status"] == "partial"
+        assert first["response"] == "## 1. SYNTHÈSE CLINIQUE"
+        assert first["seq"] == 2
+
+        publisher("\nFièvre")
+        second = medecin_client.get(reverse("ia_result"), {"cache_key": "diagnostic_x", "offset": first["offset"]})
+        assert second.data["response"] == "\nFièvre"
+        assert second.data["offset"] == len("## 1. SYNTHÈSE CLINIQUE\nFièvre")
+
+    def test_done_replaces_partial(self, medecin_client):
+        publisher = SynthesePublisher("diagnostic_x", interval=0)
+        publisher("début")
+        cache.set("diagnostic_x", "début et fin")
+        publisher.finish()
+
+        data = medecin_client.get(reverse("ia_result"), {"cache_key": "diagnostic_x", "offset": 5}).data
+        assert data["status"] == "done"
+        assert data["response"] == " et fin"
+        assert cache.get(partial_key("diagnostic_x")) is None
+
+    def test_invalid_offset(self, medecin_client):
+        response = medecin_client.get(reverse("ia_result"), {"cache_key": "diagnostic_x", "offset": "-1"})
+        assert response.status_code == 400
+
+    def test_legacy_diagnostic_result_partial(self, client, medecin_user):
+        SynthesePublisher("diagnostic_y", interval=0)("premier paragraphe")
+        client.force_login(medecin_user)
+        data = client.get(reverse("diagnostic_result"), {"cache_key": "diagnostic_y"}).json()
+        assert data["status"] == "partial"
+        assert data["response"] == "premier paragraphe"
+
+
+def lire_flux(response):
+    """Découpe un flux SSE en liste de (id, event, data)."""
+    body = b"".join(response.streaming_content).decode()
+    events = []
+    for block in body.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":") and ": " in line)
+        if "event" in fields:
+            events.append((fields.get("id"), fields["event"], json.loads(fields["data"])))
+    return events
+
+
+class TestAnalyseEvents:
+    @pytest.fixture(autouse=True)
+    def flux_court(self, settings):
+        settings.IA_SSE_MAX_DURATION = 0.2
+        settings.IA_SSE_POLL_INTERVAL = 0.01
+
+    def test_stream_until_done(self, medecin_client):
+        publish_event("diagnostic_x", "expert", {"name": "gpt4", "ok": True})
+        publisher = SynthesePublisher("diagnostic_x", interval=0)
+        publisher("Fièvre")
+        publish_event("diagnostic_x", "done", {"offset": 6})
+        publish_event("diagnostic_x", "expert", {"name": "après la fin"})
+
+        response = medecin_client.get(
+            reverse("ia_events"), {"cache_key": "diagnostic_x"}, HTTP_ACCEPT="text/event-stream"
+        )
+        assert response.status_code == 200
+        assert response["Content-Type"].startswith("text/event-stream")
+        events = lire_flux(response)
+        assert [e[1] for e in events] == ["expert", "synthese", "done"]
+        assert events[1][2]["delta"] == "Fièvre"
+
+    def test_resume_with_last_event_id(self, medecin_client):
+        for name in ("gpt4", "claude", "gemini"):
+            publish_event("diagnostic_x", "expert", {"name": name})
+        response = medecin_client.get(reverse("ia_events"), {"cache_key": "diagnostic_x"}, HTTP_LAST_EVENT_ID="2")
+        assert [(e[0], e[2]["name"]) for e in lire_flux(response)] == [("3", "gemini")]
+
+    def test_cached_result_emits_done(self, medecin_client):
+        cache.set("diagnostic_x", "synthèse")
+        events = lire_flux(medecin_client.get(reverse("ia_events"), {"cache_key": "diagnostic_x"}))
+        assert events == [(None, "done", {"response": "synthèse", "offset": 8, "cache_key": "diagnostic_x"})]
+
+    def test_by_conversation_id(self, medecin_client, medecin_user):
+        from chat.models import Conversation
+
+        conv = Conversation.objects.create(user=medecin_user)
+        assert medecin_client.get(reverse("ia_events"), {"conversation_id": conv.id}).status_code == 404
+
+        publish_event("diagnostic_x", "error", {"detail": "ancienne analyse"})
+        preparer_suivi("diagnostic_x", conv.id)
+        publish_event("diagnostic_x", "done", {"offset": 0})
+        events = lire_flux(medecin_client.get(reverse("ia_events"), {"conversation_id": conv.id}))
+        assert [e[1] for e in events] == ["done"]
+
+    def test_cache_key_required(self, medecin_client):
+        response = medecin_client.get(reverse("ia_events"), HTTP_ACCEPT="text/event-stream")
+        assert response.status_code == 400
+
+
+class TestRelancerAnalyse:
+    def test_relancer_reuses_last_prompt(self, client, medecin_user, sample_fiche, django_capture_on_commit_callbacks):
+        from unittest import mock
+
+        from chat.models import Conversation, MessageIA
+
+        conv = Conversation.objects.create(user=medecin_user, fiche=sample_fiche)
+        MessageIA.objects.create(conversation=conv, role="user", content="texte initial")
+        client.force_login(medecin_user)
+
+        with mock.patch("chat.tasks.analyse_symptomes_task.apply_async") as apply_async:
+            with django_capture_on_commit_callbacks(execute=True):
+                response = client.post(reverse("relancer_analyse", args=[sample_fiche.id]))
+
+        assert response.status_code == 302
+        texte, _, conv_id, _ = apply_async.call_args.kwargs["args"]
+        assert (texte, conv_id) == ("texte initial", conv.id)
+        sample_fiche.refresh_from_db()
+        assert sample_fiche.status == "en_analyse"
+
+
+class TestRelanceMemeCle:
+    def test_previous_result_not_served_while_rerunning(self, medecin_client, medecin_user, settings):
+        from unittest import mock
+
+        from chat import result_store
+        from chat.ia_service import lancer_analyse
+        from chat.ia_stream import lire_resultat
+        from chat.models import Conversation
+
+        settings.IA_SSE_MAX_DURATION = 0.2
+        settings.IA_SSE_POLL_INTERVAL = 0.01
+        settings.IA_RESULT_LRU_SIZE = 10
+        conv = Conversation.objects.create(user=medecin_user)
+        result_store.enregistrer("diagnostic_x", "ancienne synthèse")
+        publish_event("diagnostic_x", "done", {"offset": 17})
+
+        with mock.patch("chat.tasks.analyse_symptomes_task.apply_async"):
+            lancer_analyse("fièvre", medecin_user.id, conv.id, "diagnostic_x")
+        # Mémoire d'un autre worker, remplie avant la ré-analyse et pas encore expirée
+        result_store._lru.set("diagnostic_x", "ancienne synthèse", generation=0)
+
+        assert lire_resultat("diagnostic_x")["status"] == "pending"
+        assert lire_flux(medecin_client.get(reverse("ia_events"), {"cache_key": "diagnostic_x"})) == []
+
+
+class TestStartAnalyseSingleFlight:
+    def test_second_request_gets_same_task_id(self, medecin_client):
+        first = medecin_client.post(reverse("ia_start"), {"symptomes": "fièvre et toux"}, format="json")
+        second = medecin_client.post(reverse("ia_start"), {"symptomes": "fièvre et toux"}, format="json")
+
+        assert first.status_code == second.status_code == 202
+        assert first.data["task_id"]
+        assert second.data["task_id"] == first.data["task_id"]
+        assert (first.data["already_running"], second.data["already_running"]) == (False, True)
+
+
+class TestAnalysisRuns:
+    def test_status_and_listing_read_analysis_run(self, medecin_client):
+        from chat.models import AnalysisRun
+
+        task_id = medecin_client.post(reverse("ia_start"), {"symptomes": "céphalées"}, format="json").data["task_id"]
+        run = AnalysisRun.objects.get(task_id=task_id)
+        assert run.status == AnalysisRun.RunStatus.PENDING
+
+        status_data = medecin_client.get(reverse("ia_status", args=[task_id])).data
+        assert status_data["state"] == "PENDING"
+        assert status_data["run"]["cache_key"] == run.cache_key
+
+        listing = medecin_client.get(reverse("ia_runs"), {"status": "pending"}).data
+        assert [item["task_id"] for item in listing["results"]] == [task_id]
+
+    def test_result_served_after_cache_expiry(self, medecin_client, medecin_user):
+        from chat.models import AnalysisRun, Conversation, MessageIA
+
+        conv = Conversation.objects.create(user=medecin_user)
+        synthese = MessageIA.objects.create(conversation=conv, role="synthese", content="synthèse archivée")
+        AnalysisRun.objects.create(
+            task_id="t-old", cache_key="diagnostic_old", prompt_hash="h", status="done", synthese_message=synthese
+        )
+
+        data = medecin_client.get(reverse("ia_result"), {"cache_key": "diagnostic_old"}).data
+        assert data["status"] == "done"
+        assert data["response"] == "synthèse archivée"
+
+
+class TestAnalysisBatch:
+    @pytest.fixture
+    def fiches(self, sample_fiche):
+        from chat.models import FicheConsultation
+
+        fiches = [sample_fiche]
+        for i in range(2):
+            fiche = FicheConsultation.objects.get(pk=sample_fiche.pk)
+            fiche.pk = None
+            fiche.numero_dossier = f"{sample_fiche.numero_dossier}-{i}"
+            fiche.motif_consultation = f"Motif {i}"
+            fiche.save()
+            fiches.append(fiche)
+        return fiches
+
+    @pytest.fixture
+    def lancees(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr("chat.ia_service.demarrer_tache", lambda *args: calls.append(args))
+        return calls
+
+    def test_concurrency_bounded_and_next_started_on_completion(
+        self, medecin_client, fiches, lancees, django_capture_on_commit_callbacks
+    ):
+        from chat.ia_service import avancer_lot
+        from chat.models import AnalysisRun
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = medecin_client.post(
+                reverse("chat_api:fiche-consultation-batch-analyse"),
+                {"fiches": [fiche.id for fiche in fiches], "concurrency": 2},
+                format="json",
+            )
+        assert response.status_code == 202
+        assert response.data["progress"]["total"] == 3
+        assert len(lancees) == 2
+        progress = medecin_client.get(reverse("ia_batch", args=[response.data["id"]])).data["progress"]
+        assert progress["queued"] == 1
+        assert progress["pending"] == 2
+
+        first = AnalysisRun.objects.get(task_id=lancees[0][4])
+        first.status = AnalysisRun.RunStatus.DONE
+        first.save()
+        with django_capture_on_commit_callbacks(execute=True):
+            avancer_lot(first.batch_id)
+        assert len(lancees) == 3
+        # Texte conservé sur l'exécution mise en file
+        assert "Motif 1" in lancees[2][0]
+
+        data = medecin_client.get(reverse("ia_batch", args=[response.data["id"]])).data
+        assert data["progress"]["done"] == 1
+        assert data["progress"]["pending"] == 2
+        assert data["status"] == "running"
+
+    def test_lock_taken_when_run_starts(self, medecin_client, fiches, lancees, django_capture_on_commit_callbacks):
+        from chat.ia_service import tache_en_cours
+        from chat.models import AnalysisRun
+
+        with django_capture_on_commit_callbacks(execute=True):
+            medecin_client.post(
+                reverse("chat_api:fiche-consultation-batch-analyse"),
+                {"fiches": [fiche.id for fiche in fiches], "concurrency": 1},
+                format="json",
+            )
+        started = AnalysisRun.objects.get(task_id=lancees[0][4])
+        queued = AnalysisRun.objects.filter(status=AnalysisRun.RunStatus.QUEUED)
+        assert tache_en_cours(started.cache_key) == started.task_id
+        assert queued.count() == 2
+        assert all(tache_en_cours(run.cache_key) is None for run in queued)
+        assert all("Motif" in run.prompt for run in queued)
+
+    @pytest.fixture
+    def conversations_identiques(self, medecin_user, sample_fiche):
+        from chat.fiche_formatter import formater_fiche
+        from chat.models import Conversation
+
+        texte = formater_fiche(sample_fiche)
+        return [(texte, Conversation.objects.create(user=medecin_user, fiche=sample_fiche)) for _ in range(2)]
+
+    def test_identical_texts_share_started_task(
+        self, medecin_user, conversations_identiques, lancees, django_capture_on_commit_callbacks
+    ):
+        from chat.ia_service import lancer_lot, liberer
+        from chat.models import AnalysisRun
+
+        with django_capture_on_commit_callbacks(execute=True):
+            batch = lancer_lot(medecin_user, conversations_identiques, concurrency=2)
+        batch.refresh_from_db()
+        assert len(lancees) == 1
+        assert [item["task_id"] for item in batch.items] == [lancees[0][4]] * 2
+        assert AnalysisRun.objects.filter(batch=batch).count() == 1
+        assert liberer(batch.items[0]["cache_key"]) == [conversations_identiques[1][1].id]
+
+    def test_result_known_at_start_served_without_task(
+        self, medecin_user, conversations_identiques, lancees, django_capture_on_commit_callbacks
+    ):
+        from chat import result_store
+        from chat.ia_service import avancer_lot, lancer_lot, liberer
+        from chat.models import AnalysisRun
+
+        with django_capture_on_commit_callbacks(execute=True):
+            batch = lancer_lot(medecin_user, conversations_identiques, concurrency=1)
+        first = AnalysisRun.objects.get(task_id=lancees[0][4])
+        result_store.enregistrer(first.cache_key, "synthèse du lot")
+        liberer(first.cache_key)
+        first.status = AnalysisRun.RunStatus.DONE
+        first.save()
+        with django_capture_on_commit_callbacks(execute=True):
+            avancer_lot(batch.id)
+
+        batch.refresh_from_db()
+        assert len(lancees) == 1
+        assert batch.items[1]["cached"] is True
+        assert batch.completed_at is not None
+        assert conversations_identiques[1][1].messageia_set.get(role="synthese").content == "synthèse du lot"
+
+    def test_cached_results_served_without_task(self, medecin_client, sample_fiche, lancees):
+        from chat.fiche_formatter import formater_fiche
+        from chat.ia_service import cle_analyse
+
+        cache.set(cle_analyse(formater_fiche(sample_fiche)), "synthèse connue")
+
+        data = medecin_client.post(
+            reverse("chat_api:fiche-consultation-batch-analyse"), {"fiches": [sample_fiche.id]}, format="json"
+        ).data
+        assert data["status"] == "done"
+        assert data["items"][0]["cached"] is True
+        assert lancees == []
+        sample_fiche.refresh_from_db()
+        assert sample_fiche.diagnostic_ia == "synthèse connue"
+        assert sample_fiche.status == "analyse_terminee"
+
+    def test_unknown_fiche_rejected(self, medecin_client, sample_fiche):
+        response = medecin_client.post(
+            reverse("chat_api:fiche-consultation-batch-analyse"), {"fiches": [sample_fiche.id, 999999]}, format="json"
+        )
+        assert response.status_code == 400
+
+    def test_batch_runs_to_completion(
+        self, medecin_client, fiches, monkeypatch, settings, django_capture_on_commit_callbacks
+    ):
+        from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+        monkeypatch.setattr(
+            "chat.ia_engine._default_experts",
+            lambda: {name: FakeListChatModel(responses=[f"analyse {name}"]) for name in ("gpt4", "claude", "gemini")},
+        )
+        monkeypatch.setattr("chat.ia_engine._default_synthese_llm", lambda: FakeListChatModel(responses=["synthèse"]))
+        settings.CELERY_TASK_ALWAYS_EAGER = True
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = medecin_client.post(
+                reverse("chat_api:fiche-consultation-batch-analyse"),
+                {"fiches": [fiche.id for fiche in fiches], "concurrency": 1},
+                format="json",
+            )
+
+        data = medecin_client.get(reverse("ia_batch", args=[response.data["id"]])).data
+        assert data["status"] == "done"
+        assert data["progress"]["done"] == 3
+        assert data["completed_at"] is not None
@@ -0,0 +1,127 @@
+"""Tests de la compaction des réponses d'experts avant la synthèse."""
+
+import threading
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from chat import ia_compaction
+from chat.ia_compaction import MARQUE_TRONCATURE, compacter_reponse, compacter_resultats, compter_tokens
+from chat.ia_engine import generer_synthese
+
+
+def reponse_expert(lignes_par_section=20):
+    titres = {
+        1: "Analyse des symptômes",
+        2: "Diagnostics possibles",
+        3: "Examens complémentaires",
+        4: "Traitement",
+        5: "Éducation du patient",
+        6: "Références",
+    }
+    parts = []
+    for numero, titre in titres.items():
+        parts.append(f"### {numero}. {titre}")
+        parts.extend(f"- point {numero}.{i} : détail clinique pertinent" for i in range(lignes_par_section))
+    return "\n".join(parts)
+
+
+class RecordingChatModel(FakeListChatModel):
+    prompts: list = []
+
+    async def astream(self, messages, *args, **kwargs):
+        self.prompts.append(messages[0].content)
+        async for chunk in super().astream(messages, *args, **kwargs):
+            yield chunk
+
+
+class TestCompaction:
+    def test_reponse_sous_le_budget_inchangee(self):
+        compaction = compacter_reponse("### 2. Diagnostics\n- paludisme", budget=100)
+        assert compaction.text == "### 2. Diagnostics\n- paludisme"
+        assert compaction.economie == 0
+
+    def test_budget_nul_desactive(self):
+        text = reponse_expert()
+        assert compacter_reponse(text, budget=0).text == text
+
+    def test_diagnostics_et_traitement_en_premier(self):
+        text = reponse_expert()
+        compaction = compacter_reponse(text, budget=500)
+
+        assert compaction.tokens_apres <= 500
+        assert compaction.tokens_avant == compter_tokens(text)
+        assert compaction.economie > 0
+        assert compaction.text.startswith("### 2. Diagnostics possibles")
+        assert "### 4. Traitement" in compaction.text
+        assert "point 4.19" in compaction.text
+        assert "### 6. Références" not in compaction.text
+        assert 6 in compaction.sections_omises
+
+    def test_section_tronquee_sur_une_ligne(self):
+        compaction = compacter_reponse(reponse_expert(), budget=120)
+
+        assert compaction.tokens_apres <= 120
+        assert MARQUE_TRONCATURE in compaction.text
+        assert all(
+            line.startswith(("###", "- point 2.", MARQUE_TRONCATURE, "(Sections"))
+            for line in compaction.text.splitlines()
+        )
+
+    def test_texte_non_structure_tronque(self):
+        text = "\n".join(f"ligne {i} sans structure particulière" for i in range(200))
+        compaction = compacter_reponse(text, budget=50)
+
+        assert compaction.tokens_apres <= 50
+        assert compaction.text.startswith("ligne 0 ")
+
+    def test_statistiques_par_expert(self):
+        textes, stats = compacter_resultats({"gpt4": reponse_expert(), "claude": "réponse courte"}, budget=200)
+
+        assert textes["claude"] == "réponse courte"
+        assert stats["claude"]["economie"] == 0
+        assert stats["gpt4"]["tokens_avant"] - stats["gpt4"]["tokens_apres"] == stats["gpt4"]["economie"] > 0
+
+
+class TestSyntheseCompactee:
+    @pytest.fixture(autouse=True)
+    def budget(self, settings):
+        settings.IA_SYNTHESE_EXPERT_BUDGET = 200
+
+    def test_prompt_compacte_et_economie_enregistree(self):
+        llm = RecordingChatModel(responses=["synthèse"], prompts=[])
+        stats = {}
+        results = {"gpt4": reponse_expert(), "claude": "analyse claude", "gemini": "analyse gemini"}
+        generer_synthese(results, synthese_llm=llm, stats=stats)
+
+        assert "point 6.0" not in llm.prompts[0]
+        assert "### 2. Diagnostics possibles" in llm.prompts[0]
+        assert stats["compaction"]["gpt4"]["economie"] > 0
+
+    def test_compaction_hors_de_la_boucle(self, monkeypatch):
+        threads = []
+        compacter = ia_compaction.compacter_resultats
+
+        def enregistrer_thread(results):
+            threads.append(threading.current_thread())
+            return compacter(results)
+
+        monkeypatch.setattr(ia_compaction, "compacter_resultats", enregistrer_thread)
+        llm = RecordingChatModel(responses=["synthèse"], prompts=[])
+        generer_synthese({"gpt4": reponse_expert(), "claude": "c", "gemini": "g"}, synthese_llm=llm)
+
+        loop_thread = next(thread for thread in threading.enumerate() if thread.name == "ia-engine-loop")
+        assert threads and threads[0] is not loop_thread
+
+
+def test_prechauffer_charge_l_encodeur(monkeypatch, settings):
+    charges = []
+    monkeypatch.setattr(ia_compaction, "_encodeur", charges.append)
+
+    settings.IA_TOKENIZER = "approx"
+    ia_compaction.prechauffer()
+    assert charges == []
+
+    settings.IA_TOKENIZER = "cl100k_base"
+    ia_compaction.prechauffer()
+    assert charges == ["cl100k_base"]
@@ -0,0 +1,305 @@
+"""Tests du moteur asynchrone d'analyse IA (LLM simulés, aucun appel réseau)."""
+
+import asyncio
+
+import pytest
+from django.core.cache import cache
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from chat import tasks
+from chat.ia_engine import executer_experts, executer_experts_async, generer_synthese, run_sync
+from chat.models import Conversation, MessageIA
+from chat.tasks import analyse_symptomes_task
+
+
+class SlowFakeChatModel(FakeListChatModel):
+    delay: float = 0.0
+
+    async def ainvoke(self, *args, **kwargs):
+        await asyncio.sleep(self.delay)
+        return await super().ainvoke(*args, **kwargs)
+
+
+class FailingChatModel(FakeListChatModel):
+    async def ainvoke(self, *args, **kwargs):
+        raise RuntimeError("quota dépassé")
+
+
+def fake_experts(**overrides):
+    experts = {
+        "gpt4": FakeListChatModel(responses=["analyse gpt4"]),
+        "claude": FakeListChatModel(responses=["analyse claude"]),
+        "gemini": FakeListChatModel(responses=["analyse gemini"]),
+    }
+    experts.update(overrides)
+    return experts
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+class CountingChatModel(FakeListChatModel):
+    calls: int = 0
+
+    async def ainvoke(self, *args, **kwargs):
+        self.calls += 1
+        return await super().ainvoke(*args, **kwargs)
+
+
+@pytest.fixture
+def fake_llms(monkeypatch):
+    monkeypatch.setattr("chat.ia_engine._default_experts", fake_experts)
+    monkeypatch.setattr(
+        "chat.ia_engine._default_synthese_llm", lambda: FakeListChatModel(responses=["synthèse finale"])
+    )
+
+
+class TestIAEngine:
+    def test_experts_run_concurrently(self):
+        experts = {name: SlowFakeChatModel(responses=[name], delay=0.2) for name in ("gpt4", "claude", "gemini")}
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            results = await asyncio.gather(*(executer_experts_async("toux", experts=experts) for _ in range(10)))
+            return results, loop.time() - start
+
+        results, elapsed = run_sync(run())
+        assert len(results) == 10
+        assert all(r["gpt4"].content == "gpt4" for r in results)
+        # 30 appels de 0,2 s multiplexés sur une seule boucle
+        assert elapsed < 1.0
+
+    def test_expert_failure_becomes_error_text(self):
+        results = executer_experts("toux", experts=fake_experts(gemini=FailingChatModel(responses=["x"])))
+        assert results["gpt4"].ok
+        assert not results["gemini"].ok
+        assert results["gemini"].content == "Erreur gemini : quota dépassé"
+
+    def test_expert_timeout(self):
+        slow = SlowFakeChatModel(responses=["trop tard"], delay=1)
+        results = executer_experts("toux", experts=fake_experts(claude=slow), timeout=0.05)
+        assert not results["claude"].ok
+        assert results["claude"].content.startswith("Erreur claude : ")
+
+    def test_rerun_only_calls_failed_experts(self):
+        first = executer_experts("toux", experts=fake_experts(gemini=FailingChatModel(responses=["x"])))
+        assert not first["gemini"].ok
+
+        experts = {name: CountingChatModel(responses=[f"nouvelle {name}"]) for name in ("gpt4", "claude", "gemini")}
+        second = executer_experts("toux", experts=experts)
+        assert [experts[name].calls for name in ("gpt4", "claude", "gemini")] == [0, 0, 1]
+        assert second["gpt4"].cached and second["gpt4"].content == "analyse gpt4"
+        assert second["gemini"].content == "nouvelle gemini" and not second["gemini"].cached
+
+    def test_expert_cache_key_depends_on_model(self, settings):
+        from chat.ia_engine import expert_cache_key
+
+        before = expert_cache_key("gpt4", "prompt")
+        settings.IA_LLM_PROVIDERS = {**settings.IA_LLM_PROVIDERS, "gpt4": {"backend": "openai", "model": "gpt-5"}}
+        assert expert_cache_key("gpt4", "prompt") != before
+        assert expert_cache_key("gpt4", "autre prompt") != expert_cache_key("gpt4", "prompt")
+
+    def test_quorum_returns_before_slow_expert(self):
+        import threading
+
+        tardifs = []
+        recu = threading.Event()
+
+        def on_result(result):
+            if result.late:
+                tardifs.append(result)
+                recu.set()
+
+        slow = SlowFakeChatModel(responses=["gemini tardif"], delay=0.5)
+        results = executer_experts("toux", experts=fake_experts(gemini=slow), quorum=2, on_result=on_result)
+
+        assert results["gpt4"].ok and results["claude"].ok
+        assert results["gemini"].late and not results["gemini"].ok
+        assert "non disponible" in results["gemini"].content
+        assert not tardifs
+        assert recu.wait(2)
+        assert tardifs[0].content == "gemini tardif"
+
+    def test_global_deadline(self):
+        experts = {name: SlowFakeChatModel(responses=[name], delay=0.5) for name in ("claude", "gemini")}
+        experts["gpt4"] = FakeListChatModel(responses=["rapide"])
+        results = executer_experts("toux", experts=experts, deadline=0.1)
+        assert results["gpt4"].content == "rapide"
+        assert results["claude"].late and results["gemini"].late
+
+    def test_synthese_prompt_marks_absent_experts(self):
+        from chat.ia_engine import construire_prompt_synthese
+
+        prompt = construire_prompt_synthese({"gpt4": "a", "claude": "b", "gemini": "c"}, absents=["gemini"])
+        assert "sans réponse exploitable : gemini" in prompt
+        assert "sans réponse exploitable" not in construire_prompt_synthese({"gpt4": "a", "claude": "b", "gemini": "c"})
+
+    def test_synthese_streams_chunks(self):
+        chunks = []
+        text = generer_synthese(
+            {"gpt4": "a", "claude": "b", "gemini": "c"},
+            synthese_llm=FakeListChatModel(responses=["synthèse"]),
+            on_chunk=chunks.append,
+        )
+        assert text == "synthèse"
+        assert "".join(chunks) == "synthèse"
+        assert len(chunks) > 1
+
+    def test_synthese_chunks_published_off_the_shared_loop(self):
+        import threading
+
+        threads = []
+
+        def on_chunk(fragment):
+            threads.append(threading.current_thread().name)
+
+        generer_synthese(
+            {"gpt4": "a", "claude": "b", "gemini": "c"},
+            synthese_llm=FakeListChatModel(responses=["synthèse"]),
+            on_chunk=on_chunk,
+        )
+        assert threads
+        assert "ia-engine-loop" not in threads
+
+
+class TestAnalyseTask:
+    def test_task_stores_messages_and_cache(self, fake_llms, patient_user, sample_fiche):
+        conv = Conversation.objects.create(user=patient_user, fiche=sample_fiche)
+        result = analyse_symptomes_task.apply(args=["toux", patient_user.id, conv.id, "diagnostic_test"]).get()
+
+        assert result["cache_key"] == "diagnostic_test"
+        assert result["length"] == len("synthèse finale")
+        roles = list(MessageIA.objects.filter(conversation=conv).values_list("role", flat=True))
+        assert roles == ["gpt4", "claude", "gemini", "synthese"]
+        assert cache.get("diagnostic_test") == "synthèse finale"
+        sample_fiche.refresh_from_db()
+        assert sample_fiche.status == "analyse_terminee"
+        assert sample_fiche.diagnostic_ia == "synthèse finale"
+
+    def test_task_publishes_progress_events(self, fake_llms, patient_user, sample_fiche):
+        from chat.ia_stream import lire_evenements
+
+        conv = Conversation.objects.create(user=patient_user, fiche=sample_fiche)
+        analyse_symptomes_task.apply(args=["toux", patient_user.id, conv.id, "diagnostic_events"]).get()
+
+        events = lire_evenements("diagnostic_events")
+        names = [event for _, event, _ in events]
+        assert sorted(data["name"] for _, event, data in events if event == "expert") == ["claude", "gemini", "gpt4"]
+        assert "synthese" in names
+        assert names[-2:] == ["status", "done"]
+        assert events[-2][2] == {"status": "analyse_terminee", "fiche_id": sample_fiche.id}
+
+    def test_task_records_analysis_run(self, fake_llms, patient_user, sample_fiche):
+        from chat.models import AnalysisRun
+
+        conv = Conversation.objects.create(user=patient_user, fiche=sample_fiche)
+        analyse_symptomes_task.apply(args=["toux", patient_user.id, conv.id, "diagnostic_run"], task_id="t-1").get()
+
+        run = AnalysisRun.objects.get(task_id="t-1")
+        assert run.status == AnalysisRun.RunStatus.DONE
+        assert run.fiche == sample_fiche
+        assert set(run.experts) == {"gpt4", "claude", "gemini"}
+        assert run.experts["gpt4"]["ok"] and run.experts["gpt4"]["duration"] >= 0
+        assert run.synthese_message.content == "synthèse finale"
+        assert run.synthese_duration is not None and run.total_duration is not None
+
+    def test_retry_after_synthese_failure_keeps_single_expert_messages(
+        self, fake_llms, monkeypatch, patient_user, sample_fiche
+    ):
+        from chat import ia_engine
+        from chat.tasks import _demarrer_run, _finaliser_analyse
+
+        conv = Conversation.objects.create(user=patient_user, fiche=sample_fiche)
+        run = _demarrer_run("t-retry", "toux", patient_user.id, conv.id, "diagnostic_retry")
+        run.experts = {"gpt4": {"ok": False, "late": False}}
+        run.save(update_fields=["experts"])
+        experts = executer_experts("toux")
+        generer = ia_engine.generer_synthese
+        monkeypatch.setattr(ia_engine, "generer_synthese", lambda *args, **kwargs: 1 / 0)
+
+        with pytest.raises(ZeroDivisionError):
+            _finaliser_analyse(run, experts, conv.id, "diagnostic_retry")
+        assert not MessageIA.objects.filter(conversation=conv).exists()
+
+        monkeypatch.setattr(ia_engine, "generer_synthese", generer)
+        _finaliser_analyse(run, executer_experts("toux"), conv.id, "diagnostic_retry")
+        roles = sorted(MessageIA.objects.filter(conversation=conv).values_list("role", flat=True))
+        assert roles == ["claude", "gemini", "gpt4", "synthese"]
+        run.refresh_from_db()
+        assert run.experts["gpt4"]["ok"] is True
+
+
+class TestSingleFlight:
+    def test_identical_requests_share_one_task(self, fake_llms, patient_user, medecin_user):
+        from chat.ia_service import lancer_analyse, tache_en_cours
+
+        leader = Conversation.objects.create(user=patient_user)
+        follower = Conversation.objects.create(user=medecin_user)
+        task_id, cache_key, running = lancer_analyse("toux", patient_user.id, leader.id)
+        same_id, _, attached = lancer_analyse("toux", medecin_user.id, follower.id)
+        assert (running, attached) == (False, True)
+        assert same_id == task_id
+
+        analyse_symptomes_task.apply(args=["toux", patient_user.id, leader.id, cache_key], task_id=task_id).get()
+
+        assert tache_en_cours(cache_key) is None
+        for conv in (leader, follower):
+            roles = set(MessageIA.objects.filter(conversation=conv).values_list("role", flat=True))
+            assert {"gpt4", "claude", "gemini", "synthese"} <= roles
+
+
+class TestChordPipeline:
+    def test_chord_keeps_task_contract(
+        self, fake_llms, monkeypatch, settings, patient_user, sample_fiche, django_capture_on_commit_callbacks
+    ):
+        from chat.ia_service import lancer_analyse
+        from chat.models import AnalysisRun
+
+        settings.IA_PIPELINE = "chord"
+        monkeypatch.setattr("chat.llm_config.get_llm", lambda name: fake_experts()[name])
+        content_keys = []
+        cle_reponse_expert = tasks._cle_reponse_expert
+
+        def cle_reponse(*args):
+            content_keys.append(cle_reponse_expert(*args))
+            return content_keys[-1]
+
+        monkeypatch.setattr(tasks, "_cle_reponse_expert", cle_reponse)
+        conv = Conversation.objects.create(user=patient_user, fiche=sample_fiche)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            task_id, cache_key, _ = lancer_analyse("toux chord", patient_user.id, conv.id)
+
+        assert cache.get(cache_key) == "synthèse finale"
+        roles = sorted(MessageIA.objects.filter(conversation=conv).values_list("role", flat=True))
+        assert roles == ["claude", "gemini", "gpt4", "synthese"]
+        sample_fiche.refresh_from_db()
+        assert sample_fiche.status == "analyse_terminee"
+        run = AnalysisRun.objects.get(task_id=task_id)
+        assert run.status == AnalysisRun.RunStatus.DONE
+        assert set(run.experts) == {"gpt4", "claude", "gemini"}
+        assert MessageIA.objects.get(conversation=conv, role="gpt4").content == "analyse gpt4"
+        # Réponses des experts retirées du cache une fois la synthèse enregistrée
+        assert len(content_keys) == 3
+        assert cache.get_many(content_keys) == {}
+
+    def test_expert_task_returns_content_reference(self, monkeypatch):
+        from chat.tasks import _resoudre_experts, analyse_expert_task
+
+        monkeypatch.setattr("chat.llm_config.get_llm", lambda name: fake_experts()[name])
+        result = analyse_expert_task.apply(args=["gpt4", "toux", "diagnostic_ref"]).get()
+
+        assert "content" not in result
+        assert result["content_key"].startswith("diagnostic_ref:expert:gpt4:")
+        expert = _resoudre_experts([result])["gpt4"]
+        assert (expert.content, expert.ok) == ("analyse gpt4", True)
+
+        cache.delete(result["content_key"])
+        expert = _resoudre_experts([result])["gpt4"]
+        assert not expert.ok
+        assert "expirée" in expert.content
@@ -0,0 +1,58 @@
+"""Tests du registre paresseux des fournisseurs LLM."""
+
+import subprocess
+import sys
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from chat import llm_config
+
+
+@pytest.fixture(autouse=True)
+def registre_vide():
+    llm_config.reset_llms()
+    yield
+    llm_config.reset_llms()
+
+
+@pytest.fixture
+def fake_backend(monkeypatch):
+    calls = []
+
+    def factory(config):
+        calls.append(config["model"])
+        return FakeListChatModel(responses=[config["model"]])
+
+    monkeypatch.setitem(llm_config.BACKENDS, "fake", factory)
+    return calls
+
+
+def test_import_does_not_load_provider_sdks():
+    code = (
+        "import os, sys, django; os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'agent_medical_ia.settings_test');"
+        "django.setup(); import chat.llm_config, chat.tasks;"
+        "print(any(m in sys.modules for m in ('langchain_openai', 'langchain_google_genai')))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip().endswith("False")
+
+
+def test_client_built_once_per_process(settings, fake_backend):
+    settings.IA_LLM_PROVIDERS = {"gpt4": {"backend": "fake", "model": "m1"}}
+    first = llm_config.get_llm("gpt4")
+    assert llm_config.gpt4 is first
+    assert fake_backend == ["m1"]
+
+
+def test_missing_key_raises_on_first_use(settings):
+    settings.OPENAI_API_KEY = ""
+    settings.IA_LLM_PROVIDERS = {"synthese": {"backend": "openai", "model": "gpt-4.1"}}
+    with pytest.raises(ImproperlyConfigured):
+        llm_config.get_llm("synthese")
+
+
+def test_unknown_provider(settings):
+    with pytest.raises(ImproperlyConfigured):
+        llm_config.get_llm("inconnu")
@@ -0,0 +1,80 @@
+"""Tests du LLM simulé et du test de charge `ia_loadtest`."""
+
+import asyncio
+import json
+from io import StringIO
+
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from langchain_core.messages import HumanMessage
+
+from chat import llm_config
+from chat.ia_compaction import decouper_sections
+from chat.llm_fake import FakeChatModel, FakeLLMError
+from chat.models import AnalysisRun, FicheConsultation
+
+
+@pytest.fixture(autouse=True)
+def registre_vide():
+    llm_config.reset_llms()
+    cache.clear()
+    yield
+    llm_config.reset_llms()
+    cache.clear()
+
+
+def test_reponse_deterministe_en_six_sections():
+    first = FakeChatModel(name="gpt4", latency=0, tokens_per_second=0, seed=7)
+    second = FakeChatModel(name="gpt4", latency=0, tokens_per_second=0, seed=7)
+
+    response = first.invoke([HumanMessage(content="fièvre")])
+    assert response.content == second.invoke([HumanMessage(content="fièvre")]).content
+    assert sorted(decouper_sections(response.content)[1]) == [1, 2, 3, 4, 5, 6]
+    assert response.usage_metadata["output_tokens"] > 0
+
+
+def test_streaming_et_erreurs():
+    async def collect(model):
+        return [chunk async for chunk in model.astream([HumanMessage(content="toux")])]
+
+    chunks = asyncio.run(collect(FakeChatModel(latency=0, tokens_per_second=0)))
+    assert len(chunks) > 10
+    assert chunks[-1].usage_metadata["output_tokens"] == len(chunks) - 1
+
+    with pytest.raises(FakeLLMError):
+        FakeChatModel(latency=0, error_rate=1).invoke([HumanMessage(content="toux")])
+
+
+def test_latence_selon_distribution():
+    fixed = FakeChatModel(latency=0.5, distribution="fixed")
+    uniform = FakeChatModel(latency=1.0, distribution="uniform", spread=0.2)
+
+    assert fixed._tirage()[0] == 0.5
+    assert all(0.8 <= uniform._tirage()[0] <= 1.2 for _ in range(50))
+
+
+def test_selection_par_setting(settings):
+    settings.IA_LLM_FAKE = True
+    settings.IA_LLM_FAKE_OPTIONS = {"latency": 0.01, "tokens_per_second": 0}
+
+    llm = llm_config.get_llm("gpt4")
+    assert isinstance(llm, FakeChatModel)
+    assert llm.name == "gpt4"
+    assert llm.latency == 0.01
+
+
+@pytest.mark.django_db(transaction=True)
+def test_commande_loadtest():
+    out = StringIO()
+    call_command("ia_loadtest", fiches=2, concurrency=1, latency=0, tokens_per_second=0, json=True, stdout=out)
+
+    rapport = json.loads(out.getvalue())
+    assert rapport["analyses"] == rapport["reussies"] == 2
+    assert rapport["latences"]["tache"]["p50"] is not None
+    assert rapport["requetes_sql"]["max"] > 0
+    # Données de test supprimées, settings restaurés
+    assert not FicheConsultation.objects.filter(nom="Charge").exists()
+    assert not AnalysisRun.objects.exists()
+    assert settings.IA_LLM_FAKE is False
@@ -0,0 +1,144 @@
+"""Tests du gouverneur de débit / concurrence des appels LLM."""
+
+import asyncio
+
+import pytest
+from django.core.cache import cache
+
+from chat.ia_engine import executer_experts, generer_synthese, run_sync
+from chat.llm_guards import Disjoncteur, FournisseurSature, Gouverneur
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture
+def limites(settings):
+    def configurer(**config):
+        settings.IA_LLM_RATE_LIMITS = {"openai": config}  # groupe de gpt4
+
+    return configurer
+
+
+def test_concurrency_ceiling_queues_callers(limites):
+    limites(max_concurrency=2)
+    en_cours, pic = 0, 0
+
+    async def appel():
+        nonlocal en_cours, pic
+        async with Gouverneur("gpt4", max_wait=5):
+            en_cours += 1
+            pic = max(pic, en_cours)
+            await asyncio.sleep(0.05)
+            en_cours -= 1
+
+    async def scenario():
+        await asyncio.gather(*(appel() for _ in range(6)))
+
+    run_sync(scenario())
+    assert pic == 2
+    assert not any(cache.get(f"ia_llm_slot:openai:{i}") for i in range(2))
+
+
+def test_rpm_ceiling_fails_after_bounded_wait(limites):
+    limites(rpm=2)
+
+    async def scenario():
+        for _ in range(2):
+            async with Gouverneur("gpt4", max_wait=0):
+                pass
+        async with Gouverneur("gpt4", max_wait=0):
+            pass
+
+    with pytest.raises(FournisseurSature):
+        run_sync(scenario())
+
+
+def test_saturated_provider_becomes_expert_error(limites, settings):
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    limites(rpm=1)
+    settings.IA_LLM_MAX_WAIT = 0
+    experts = {"gpt4": FakeListChatModel(responses=["a", "b"])}
+    assert executer_experts("toux", experts=experts, use_cache=False)["gpt4"].ok
+
+    results = executer_experts("fièvre", experts=experts, use_cache=False)
+    assert not results["gpt4"].ok
+    assert "limite openai atteinte" in results["gpt4"].content
+
+
+def test_saturated_synthese_does_not_trip_circuit(limites, settings):
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    limites(rpm=1)
+    settings.IA_LLM_MAX_WAIT = 0
+    settings.IA_CIRCUIT_FAILURE_THRESHOLD = 1
+    llm = FakeListChatModel(responses=["synthèse", "synthèse"])
+    assert generer_synthese({"gpt4": "a", "claude": "b", "gemini": "c"}, synthese_llm=llm) == "synthèse"
+
+    with pytest.raises(FournisseurSature):
+        generer_synthese({"gpt4": "d", "claude": "e", "gemini": "f"}, synthese_llm=llm)
+    assert Disjoncteur("synthese").autorise()
+
+
+def test_synthese_stream_bounded_by_timeout(limites, settings, monkeypatch):
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    import chat.llm_guards
+
+    baux = []
+
+    class GouverneurEspion(Gouverneur):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            baux.append(self.lease)
+
+    monkeypatch.setattr(chat.llm_guards, "Gouverneur", GouverneurEspion)
+    limites(max_concurrency=1)
+    settings.IA_SYNTHESE_TIMEOUT = 0.2
+    llm = FakeListChatModel(responses=["x" * 50], sleep=0.05)  # ~2,5 s de flux
+
+    with pytest.raises(asyncio.TimeoutError):
+        generer_synthese({"gpt4": "a", "claude": "b", "gemini": "c"}, synthese_llm=llm)
+    assert baux == [30]  # bail dérivé du délai de synthèse, pas de IA_EXPERT_TIMEOUT
+    assert cache.get("ia_llm_slot:openai:0") is None
+
+
+def test_governor_wait_counts_against_call_timeout(limites, settings):
+    import time
+
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    limites(max_concurrency=1)
+    settings.IA_LLM_MAX_WAIT = 30
+    cache.add("ia_llm_slot:openai:0", "autre", timeout=60)
+    experts = {"gpt4": FakeListChatModel(responses=["a"])}
+
+    started = time.monotonic()
+    results = executer_experts("toux", experts=experts, use_cache=False, timeout=0.3)
+    assert not results["gpt4"].ok
+    assert "limite openai atteinte" in results["gpt4"].content
+    assert time.monotonic() - started < 2  # l'attente est décomptée du délai de l'appel
+
+
+def test_governor_wait_bounded_by_quorum_deadline(limites, settings):
+    import time
+
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+    limites(max_concurrency=1)
+    settings.IA_LLM_MAX_WAIT = 30
+    cache.add("ia_llm_slot:openai:0", "autre", timeout=60)
+    recus = []
+    experts = {"gpt4": FakeListChatModel(responses=["a"])}
+
+    started = time.monotonic()
+    executer_experts("toux", experts=experts, use_cache=False, timeout=60, deadline=0.3, on_result=recus.append)
+    while not recus and time.monotonic() - started < 5:
+        time.sleep(0.05)
+    assert recus and not recus[0].ok
+    assert time.monotonic() - started < 2  # l'attente s'arrête à l'échéance, pas après IA_LLM_MAX_WAIT
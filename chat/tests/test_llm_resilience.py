@@ -0,0 +1,87 @@
+"""Tests des disjoncteurs, de la bascule et des requêtes couvertes."""
+
+import pytest
+from django.core.cache import cache
+
+from chat import ia_metrics
+from chat.ia_engine import executer_experts
+from chat.llm_guards import Disjoncteur, latences
+
+from .test_ia_engine import FailingChatModel, SlowFakeChatModel
+
+
+@pytest.fixture(autouse=True)
+def etat_vide(settings):
+    settings.IA_LLM_RATE_LIMITS = {}
+    settings.IA_CIRCUIT_FAILURE_THRESHOLD = 2
+    cache.clear()
+    latences.reset()
+    yield
+    cache.clear()
+    latences.reset()
+
+
+@pytest.fixture
+def secours(monkeypatch):
+    model = SlowFakeChatModel(responses=["réponse de secours"] * 5)
+    monkeypatch.setattr("chat.llm_config.get_llm", lambda name: model)
+    return model
+
+
+def test_circuit_opens_and_fails_fast_without_alternate(settings):
+    settings.IA_LLM_PROVIDERS = {**settings.IA_LLM_PROVIDERS, "gemini": {"backend": "google", "model": "m"}}
+    failing = {"gemini": FailingChatModel(responses=["x"])}
+    for _ in range(2):
+        executer_experts("toux", experts=failing, use_cache=False)
+
+    slow = {"gemini": SlowFakeChatModel(responses=["jamais appelé"], delay=5)}
+    result = executer_experts("toux", experts=slow, use_cache=False)["gemini"]
+    assert not result.ok and "circuit gemini ouvert" in result.content
+    assert result.duration < 1
+    metrics = ia_metrics.snapshot()["gemini"]
+    assert metrics["circuit_ouvert"] == 1 and metrics["court_circuit"] == 1
+
+
+def test_open_circuit_fails_over_to_alternate(secours):
+    failing = {"gemini": FailingChatModel(responses=["x"])}
+    for _ in range(2):
+        executer_experts("toux", experts=failing, use_cache=False)
+
+    result = executer_experts("toux", experts=failing, use_cache=False)["gemini"]
+    assert result.ok and result.content == "réponse de secours"
+    assert result.served_by == "secours_openai"
+    assert ia_metrics.snapshot()["gemini"]["basculement"] == 1
+
+
+def test_half_open_probe_closes_circuit(settings):
+    settings.IA_CIRCUIT_COOLDOWN = 0
+    disjoncteur = Disjoncteur("gpt4")
+    disjoncteur.echec()
+    disjoncteur.echec()
+    assert disjoncteur.autorise()  # appel test
+    assert not disjoncteur.autorise()  # un seul appel test à la fois
+    disjoncteur.succes()
+    assert cache.get("ia_circuit:gpt4:open_until") is None
+
+
+def test_hedged_request_takes_fastest_answer(settings, secours):
+    settings.IA_HEDGING = True
+    settings.IA_HEDGE_MIN_SAMPLES = 3
+    for _ in range(3):
+        latences.ajouter("gpt4", 0.01)
+
+    slow = {"gpt4": SlowFakeChatModel(responses=["principal lent"], delay=1)}
+    result = executer_experts("toux", experts=slow, use_cache=False)["gpt4"]
+    assert result.content == "réponse de secours"
+    assert result.duration < 0.9
+    metrics = ia_metrics.snapshot()["gpt4"]
+    assert metrics["hedge_envoye"] == 1 and metrics["hedge_gagne"] == 1
+
+
+def test_metrics_endpoint(api_client, medecin_user):
+    ia_metrics.incr("appels", "gpt4")
+    api_client.force_authenticate(user=medecin_user)
+    from django.urls import reverse
+
+    data = api_client.get(reverse("ia_metrics")).data
+    assert data["gpt4"]["appels"] == 1
@@ -0,0 +1,64 @@
+"""Tests de la pagination par page ou par curseur des listes volumineuses."""
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from chat.models import Conversation, MessageIA
+
+URL = "/api/v1/messages/"
+
+
+@pytest.fixture
+def medecin_client(api_client, medecin_user):
+    api_client.force_authenticate(user=medecin_user)
+    return api_client
+
+
+@pytest.fixture
+def messages(patient_user, settings):
+    settings.REST_FRAMEWORK = {**settings.REST_FRAMEWORK, "PAGE_SIZE": 2}
+    conv = Conversation.objects.create(user=patient_user)
+    return [MessageIA.objects.create(conversation=conv, role="user", content=f"Message {i}") for i in range(5)]
+
+
+def lister(client, url, **params):
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get(url, params)
+    assert response.status_code == 200
+    return response.data, [query["sql"] for query in ctx.captured_queries]
+
+
+def test_mode_page_par_defaut(medecin_client, messages):
+    data, _ = lister(medecin_client, URL)
+
+    assert data["count"] == 5
+    assert [msg["id"] for msg in data["results"]] == [messages[0].id, messages[1].id]
+
+
+def test_curseur_sans_count_ni_offset(medecin_client, messages):
+    ids, url, params = [], URL, {"pagination": "cursor"}
+    while url:
+        data, requetes = lister(medecin_client, url, **params)
+        assert "count" not in data
+        assert not any("COUNT(" in sql.upper() or "OFFSET" in sql.upper() for sql in requetes)
+        ids += [msg["id"] for msg in data["results"]]
+        url, params = data["next"], {}
+
+    assert ids == [msg.id for msg in messages]
+
+
+def test_mode_par_defaut_configurable(medecin_client, messages, settings):
+    settings.API_PAGINATION_DEFAULT_MODE = "cursor"
+
+    assert "count" not in lister(medecin_client, URL)[0]
+    assert lister(medecin_client, URL, pagination="page")[0]["count"] == 5
+
+
+def test_fiches_recentes_d_abord(medecin_client, sample_fiche, settings):
+    autre = type(sample_fiche).objects.get(pk=sample_fiche.pk)
+    autre.pk, autre.numero_dossier = None, ""
+    autre.save()
+
+    data, _ = lister(medecin_client, "/api/v1/fiche-consultation/", pagination="cursor")
+    assert [fiche["id"] for fiche in data["results"]] == [autre.id, sample_fiche.id]
@@ -0,0 +1,129 @@
+"""Tests du stockage des synthèses en trois niveaux (mémoire, cache, base)."""
+
+import threading
+import time
+
+import pytest
+from django.core.cache import cache
+
+from chat import cache_stampede, result_store
+from chat.ia_service import inflight_key
+from chat.ia_stream import lire_resultat
+from chat.models import AnalysisRun, Conversation, MessageIA
+
+
+@pytest.fixture(autouse=True)
+def niveaux_vides(settings):
+    settings.IA_RESULT_LRU_SIZE, settings.IA_RESULT_LRU_MAX_BYTES, settings.IA_RESULT_LRU_TTL = 3, 100, 300
+    cache.clear()
+    result_store._lru.clear()
+    yield
+    cache.clear()
+    result_store._lru.clear()
+
+
+@pytest.fixture
+def run_termine(patient_user):
+    conversation = Conversation.objects.create(user=patient_user)
+    message = MessageIA.objects.create(conversation=conversation, role="synthese", content="synthèse durable")
+    return AnalysisRun.objects.create(
+        task_id="t1",
+        cache_key="diagnostic_x",
+        prompt_hash="h1",
+        status=AnalysisRun.RunStatus.DONE,
+        synthese_message=message,
+    )
+
+
+class TestLRU:
+    def test_eviction_par_nombre_et_par_taille(self):
+        lru = result_store.LRU()
+        for key in "abc":
+            lru.set(key, key * 10)
+        lru.get("a")
+        lru.set("d", "d" * 10)
+        assert lru.get("b") is None  # moins récemment lue
+        assert lru.get("a") == "a" * 10
+
+        lru.set("gros", "x" * 95)
+        assert len(lru) == 1
+        assert lru.taille_octets == 95
+        lru.set("trop", "x" * 101)
+        assert lru.get("trop") is None
+
+    def test_generation_depassee(self):
+        lru = result_store.LRU()
+        lru.set("a", "valeur", generation=1)
+        assert lru.get("a", 1) == "valeur"
+        assert lru.get("a", 2) is None
+        assert len(lru) == 0
+
+    def test_expiration(self, settings):
+        settings.IA_RESULT_LRU_TTL = 0
+        lru = result_store.LRU()
+        lru.set("a", "valeur")
+        assert lru.get("a") is None
+        assert lru.taille_octets == 0
+
+
+class TestLecture:
+    def test_resultat_lisible_apres_expiration_du_cache(self, run_termine):
+        data = lire_resultat("diagnostic_x")
+
+        assert data["status"] == "done"
+        assert data["response"] == "synthèse durable"
+        # Niveaux supérieurs repeuplés : la lecture suivante ne touche pas la base
+        assert cache.get("diagnostic_x") == "synthèse durable"
+        assert result_store._lru.get("diagnostic_x") == "synthèse durable"
+
+    def test_lecture_par_hash_du_prompt(self, run_termine):
+        assert result_store.lire("diagnostic_autre", prompt_hash="h1") == "synthèse durable"
+        assert result_store.lire("diagnostic_inconnu") is None
+
+    def test_absence_constatee_sans_attente(self, settings, django_assert_num_queries):
+        settings.IA_STAMPEDE_WAIT = 2
+        assert result_store.lire_base("diagnostic_absent") is None
+        # Lecteurs suivants : ni requête ni attente du verrou, même pris par un autre lecteur
+        jeton = cache_stampede.prendre_verrou("diagnostic_absent")
+        debut = time.monotonic()
+        with django_assert_num_queries(0):
+            assert result_store.lire_base("diagnostic_absent") is None
+        assert time.monotonic() - debut < 0.5
+        cache_stampede.liberer_verrou("diagnostic_absent", jeton)
+
+    def test_attente_interrompue_par_l_absence(self, settings):
+        settings.IA_STAMPEDE_WAIT = 2
+        cache_stampede.prendre_verrou("diagnostic_absent")
+        threading.Timer(0.1, lambda: cache.set(result_store.absence_key("diagnostic_absent"), True)).start()
+
+        debut = time.monotonic()
+        assert result_store.lire_base("diagnostic_absent") is None
+        assert time.monotonic() - debut < 1
+
+    def test_reanalyse_en_cours_reste_en_attente(self, run_termine):
+        cache.set(inflight_key("diagnostic_x"), "t2")
+        assert lire_resultat("diagnostic_x")["status"] == "pending"
+
+
+class TestReanalyse:
+    def test_memoire_des_autres_processus_ignoree_apres_reanalyse(self, monkeypatch):
+        assert result_store.lire_cache("diagnostic_x") is None
+        result_store.enregistrer("diagnostic_x", "ancienne")
+        assert result_store.lire_cache("diagnostic_x") == "ancienne"
+
+        # Ré-analyse lancée et terminée dans un autre processus (autre mémoire)
+        with monkeypatch.context() as autre_processus:
+            autre_processus.setattr(result_store, "_lru", result_store.LRU())
+            result_store.invalider("diagnostic_x")
+            result_store.enregistrer("diagnostic_x", "nouvelle")
+
+        assert result_store.lire_cache("diagnostic_x") == "nouvelle"
+        assert result_store._lru.get("diagnostic_x", result_store.generation("diagnostic_x")) == "nouvelle"
+
+    def test_invalidation_vue_pendant_la_reanalyse(self, monkeypatch):
+        result_store.enregistrer("diagnostic_x", "ancienne")
+        with monkeypatch.context() as autre_processus:
+            autre_processus.setattr(result_store, "_lru", result_store.LRU())
+            result_store.invalider("diagnostic_x")
+
+        assert result_store.lire_cache("diagnostic_x") is None
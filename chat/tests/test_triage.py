@@ -0,0 +1,97 @@
+"""Tests du triage des analyses IA par gravité des signes vitaux."""
+
+import pytest
+from django.urls import reverse
+
+from chat import triage
+from chat.ia_service import lancer_analyse
+from chat.models import AnalysisRun, Conversation
+
+
+class TestEvaluer:
+    def test_constantes_normales_priorite_basse(self, sample_fiche):
+        sample_fiche.spo2, sample_fiche.temperature, sample_fiche.pouls = 98, 36.8, 72
+        sample_fiche.frequence_respiratoire, sample_fiche.tension_arterielle = 16, "120/80"
+
+        assert triage.evaluer(sample_fiche) == triage.Triage(0, triage.LOW, False)
+
+    def test_sans_constantes_priorite_normale(self, sample_fiche):
+        assert triage.evaluer(sample_fiche).priorite == triage.NORMAL
+
+    def test_hypoxie_et_fievre_priorite_haute(self, sample_fiche):
+        sample_fiche.spo2, sample_fiche.temperature = 82, 39.5
+
+        evaluation = triage.evaluer(sample_fiche)
+        assert evaluation.score == 5
+        assert evaluation.critique
+        assert evaluation.priorite == triage.HIGH
+
+    def test_score_cumule(self, sample_fiche, settings):
+        settings.IA_PRIORITY_HIGH_SCORE = 5
+        sample_fiche.spo2, sample_fiche.pouls, sample_fiche.tension_arterielle = 93, 115, "10/7"
+
+        evaluation = triage.evaluer(sample_fiche)
+        assert evaluation.score == 6  # 2 (SpO2) + 2 (pouls) + 2 (systolique 100)
+        assert not evaluation.critique
+        assert evaluation.priorite == triage.HIGH
+
+    def test_febrile_sans_temperature(self, sample_fiche):
+        sample_fiche.febrile = "Oui"
+        assert triage.evaluer(sample_fiche) == triage.Triage(1, triage.NORMAL, False)
+
+    @pytest.mark.parametrize(
+        "tension,expected", [("120/80", 120), ("12/8", 120), ("9,5/6", 90), ("", None), (None, None)]
+    )
+    def test_systolique(self, tension, expected):
+        assert triage.systolique(tension) == expected
+
+
+class TestRoutage:
+    @pytest.fixture
+    def envois(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(
+            "chat.tasks.analyse_symptomes_task.apply_async", lambda *args, **kwargs: calls.append(kwargs)
+        )
+        return calls
+
+    def test_cas_grave_sur_la_file_haute(self, patient_user, sample_fiche, envois, django_capture_on_commit_callbacks):
+        sample_fiche.spo2 = 82
+        sample_fiche.save()
+        conversation = Conversation.objects.create(user=patient_user, fiche=sample_fiche)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            task_id, _, _ = lancer_analyse("détresse respiratoire", patient_user.id, conversation.id)
+
+        assert envois[0]["queue"] == "ia_high"
+        run = AnalysisRun.objects.get(task_id=task_id)
+        assert run.priority == AnalysisRun.Priority.HIGH
+        assert run.triage_score == 3
+        assert run.fiche == sample_fiche
+
+    def test_routage_desactive(self, patient_user, envois, settings, django_capture_on_commit_callbacks):
+        settings.IA_PRIORITY_ROUTING = False
+        conversation = Conversation.objects.create(user=patient_user)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            lancer_analyse("céphalées", patient_user.id, conversation.id)
+
+        assert envois[0]["queue"] is None
+
+
+class TestEtatFiles:
+    def test_profondeur_et_attente_par_priorite(self, api_client, medecin_user):
+        from datetime import timedelta
+
+        AnalysisRun.objects.create(task_id="t1", cache_key="k1", prompt_hash="h", priority="high")
+        started = AnalysisRun.objects.create(task_id="t2", cache_key="k2", prompt_hash="h", priority="high")
+        AnalysisRun.objects.filter(pk=started.pk).update(
+            status="running", started_at=started.created_at + timedelta(seconds=4)
+        )
+
+        api_client.force_authenticate(user=medecin_user)
+        data = api_client.get(reverse("ia_queues")).data
+        assert data["high"]["en_attente"] == 1
+        assert data["high"]["attente_moyenne"] == 4.0
+        assert data["high"]["file"] == "ia_high"
+        assert data["low"]["en_attente"] == 0
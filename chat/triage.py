@@ -0,0 +1,122 @@
+"""Priorité des analyses IA selon la gravité des signes vitaux de la fiche.
+
+Le score reprend les seuils du NEWS2 (National Early Warning Score) pour les
+constantes disponibles sur `FicheConsultation` : SpO2, température, pouls,
+fréquence respiratoire, tension systolique (et `febrile` à défaut de
+température). Priorité haute dès `IA_PRIORITY_HIGH_SCORE` points ou si une
+seule constante est critique (3 points), basse si toutes les constantes
+relevées sont normales, normale sinon (y compris sans aucune constante).
+
+Chaque priorité a sa file Celery (`IA_PRIORITY_QUEUES`) : un worker dédié à
+`ia_high` garantit qu'un cas grave n'attend pas derrière les consultations de
+routine.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.utils import timezone
+
+HIGH, NORMAL, LOW = "high", "normal", "low"
+PRIORITES = (HIGH, NORMAL, LOW)
+
+
+@dataclass(frozen=True)
+class Triage:
+    score: int
+    priorite: str
+    critique: bool = False
+
+
+def _points(value: Optional[float], seuils) -> Optional[int]:
+    """Points du premier intervalle `(borne_basse, borne_haute, points)` contenant `value`."""
+    if value is None:
+        return None
+    for low, high, points in seuils:
+        if low <= value <= high:
+            return points
+    return 0
+
+
+_INF = float("inf")
+SPO2 = ((-_INF, 91, 3), (92, 93, 2), (94, 95, 1))
+TEMPERATURE = ((-_INF, 35.0, 3), (35.01, 36.0, 1), (38.01, 39.0, 1), (39.01, _INF, 2))
+POULS = ((-_INF, 40, 3), (41, 50, 1), (91, 110, 1), (111, 130, 2), (131, _INF, 3))
+FREQUENCE_RESPIRATOIRE = ((-_INF, 8, 3), (9, 11, 1), (21, 24, 2), (25, _INF, 3))
+SYSTOLIQUE = ((-_INF, 90, 3), (91, 100, 2), (101, 110, 1), (220, _INF, 3))
+
+
+def systolique(tension: Optional[str]) -> Optional[int]:
+    """Pression systolique d'une tension saisie comme "120/80" (ou "12/8" en cmHg)."""
+    match = re.match(r"\s*(\d{1,3})(?:[.,]\d+)?\s*/", tension or "")
+    if not match:
+        return None
+    value = int(match.group(1))
+    return value * 10 if value < 30 else value
+
+
+def evaluer(fiche) -> Triage:
+    points: List[int] = [
+        p
+        for p in (
+            _points(fiche.spo2, SPO2),
+            _points(fiche.temperature, TEMPERATURE),
+            _points(fiche.pouls, POULS),
+            _points(fiche.frequence_respiratoire, FREQUENCE_RESPIRATOIRE),
+            _points(systolique(fiche.tension_arterielle), SYSTOLIQUE),
+        )
+        if p is not None
+    ]
+    if fiche.temperature is None and fiche.febrile == "Oui":
+        points.append(1)
+
+    score = sum(points)
+    critique = 3 in points
+    if critique or score >= settings.IA_PRIORITY_HIGH_SCORE:
+        priorite = HIGH
+    elif points and score == 0:
+        priorite = LOW
+    else:
+        priorite = NORMAL
+    return Triage(score, priorite, critique)
+
+
+def file_attente(priorite: str) -> Optional[str]:
+    """File Celery de la priorité, ou None (file par défaut) si le routage est désactivé."""
+    if not settings.IA_PRIORITY_ROUTING:
+        return None
+    return settings.IA_PRIORITY_QUEUES.get(priorite)
+
+
+def etat_files(fenetre: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+    """Par priorité : analyses en attente, plus longue attente actuelle et attente des analyses récentes."""
+    from .models import AnalysisRun
+
+    fenetre = settings.IA_QUEUE_STATS_WINDOW if fenetre is None else fenetre
+    now = timezone.now()
+    etat: Dict[str, Dict[str, Any]] = {}
+    for priorite in PRIORITES:
+        runs = AnalysisRun.objects.filter(priority=priorite)
+        en_attente = runs.filter(status=AnalysisRun.RunStatus.PENDING)
+        plus_ancienne = en_attente.order_by("created_at").values_list("created_at", flat=True).first()
+        attentes = sorted(
+            (started - created).total_seconds()
+            for created, started in runs.filter(started_at__gte=now - timedelta(seconds=fenetre)).values_list(
+                "created_at", "started_at"
+            )[:1000]
+        )
+        etat[priorite] = {
+            "file": file_attente(priorite) or "celery",
+            "en_attente": en_attente.count(),
+            "en_lot": runs.filter(status=AnalysisRun.RunStatus.QUEUED).count(),
+            "plus_longue_attente": round((now - plus_ancienne).total_seconds(), 3) if plus_ancienne else 0.0,
+            "attente_moyenne": round(sum(attentes) / len(attentes), 3) if attentes else None,
+            "attente_p90": round(attentes[min(int(len(attentes) * 0.9), len(attentes) - 1)], 3) if attentes else None,
+            "demarrees": len(attentes),
+        }
+    return etat
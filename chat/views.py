@@ -1,5 +1,4 @@
 import base64
-import hashlib
 import json
 import os
 
@@ -8,9 +7,7 @@ import requests
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.core.cache import cache
 from django.core.files.base import ContentFile
-from django.db import transaction
 from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import render_to_string
@@ -21,9 +18,12 @@ from django.views.generic import DetailView, TemplateView, View
 from django.views.generic.edit import CreateView
 from twilio.rest import Client
 
+from . import history_service, result_store
+from .fiche_formatter import formater_fiche
 from .forms import FicheConsultationForm
+from .ia_service import cle_analyse, lancer_analyse
+from .ia_stream import lire_resultat, parse_offset
 from .models import Conversation, FicheConsultation, MessageIA
-from .tasks import analyse_symptomes_task
 
 dotenv.load_dotenv()
 
@@ -96,14 +96,8 @@ class AnalyseSymptomesView(LoginRequiredMixin, View):
     template_name = "chat/home.html"
 
     def get(self, request):
-
-        conversations = Conversation.objects.all().order_by("-created_at")
-        chat_items = []
-        for conv in conversations:
-            messages = MessageIA.objects.filter(conversation=conv, role__in=["user", "synthese"]).order_by("id")
-            if messages.exists():
-                chat_items.append({"conversation": conv, "messages": messages})
-        context = {"chat_items": chat_items}
+        historique = history_service.page_historique(request.user)
+        context = {"chat_items": historique.items, "history_next_page": historique.next_page}
         return render(request, self.template_name, context)
 
     def post(self, request):
@@ -121,38 +115,39 @@ class AnalyseSymptomesView(LoginRequiredMixin, View):
         MessageIA.objects.create(conversation=conversation, role="user", content=message_text)
 
         # Clé de cache pour le résultat IA
-        hash_key = hashlib.md5(message_text.encode("utf-8")).hexdigest()  # nosec B324
-        cache_key = f"diagnostic_{hash_key}"
+        cache_key = cle_analyse(message_text)
 
-        cached_result = cache.get(cache_key)
+        cached_result = result_store.lire_cache(cache_key)
         if cached_result:
             return JsonResponse({"status": "done", "response": cached_result})
 
-        def run_task():
-            analyse_symptomes_task.delay(message_text, request.user.id, conversation.id, cache_key)
-
-        transaction.on_commit(run_task)
-        return JsonResponse({"status": "pending", "cache_key": cache_key})
+        # Une analyse identique déjà en cours est réutilisée (même task_id)
+        task_id, cache_key, _ = lancer_analyse(message_text, request.user.id, conversation.id, cache_key)
+        return JsonResponse({"status": "pending", "cache_key": cache_key, "task_id": task_id})
 
 
 @login_required
 def chat_history_partial(request):
-    conversations = Conversation.objects.all().order_by("-created_at")
-    chat_items = []
-    for conv in conversations:
-        messages = MessageIA.objects.filter(conversation=conv, role__in=["user", "synthese"]).order_by("id")
-        if messages.exists():
-            chat_items.append({"conversation": conv, "messages": messages})
-    html = render_to_string("chat/chat_history.html", {"chat_items": chat_items})
-    return JsonResponse({"html": html})
+    """Historique rendu en HTML : bloc complet (page 1) ou seulement les conversations suivantes (`?page=N`)."""
+    historique = history_service.page_historique(request.user, history_service.parse_page(request.GET.get("page")))
+    context = {"chat_items": historique.items, "history_next_page": historique.next_page}
+    template = "chat/chat_history.html" if historique.page == 1 else "chat/chat_history_items.html"
+    return JsonResponse(
+        {
+            "html": render_to_string(template, context, request=request),
+            "page": historique.page,
+            "next_page": historique.next_page,
+            "has_more": historique.has_more,
+        }
+    )
 
 
 def diagnostic_result(request):
     cache_key = request.GET.get("cache_key")
-    result = cache.get(cache_key)
-    if result:
-        return JsonResponse({"status": "done", "response": result})
-    return JsonResponse({"status": "pending"})
+    if not cache_key:
+        return JsonResponse({"status": "pending"})
+    offset = parse_offset(request.GET.get("offset")) or 0
+    return JsonResponse(lire_resultat(cache_key, offset))
 
 
 @method_decorator(user_passes_test(is_medecin), name="dispatch")
@@ -214,7 +209,7 @@ class FicheConsultationCreateView(LoginRequiredMixin, CreateView):
         fiche.save()
 
         # Formatage des données en texte pour l'IA
-        texte = self.formater_fiche_en_texte(fiche)
+        texte = formater_fiche(fiche)
 
         print("Texte formaté pour l'IA :", texte)
 
@@ -223,117 +218,11 @@ class FicheConsultationCreateView(LoginRequiredMixin, CreateView):
         conversation_id = fiche.conversation.id
 
         MessageIA.objects.create(conversation=fiche.conversation, role="user", content=texte)
-
-        hash_key = hashlib.md5(texte.encode("utf-8")).hexdigest()  # nosec B324
-        cache_key = f"diagnostic_{hash_key}"
-
-        def run_task():
-            analyse_symptomes_task.delay(texte, user_id, conversation_id, cache_key)
-
-        transaction.on_commit(run_task)
+        lancer_analyse(texte, user_id, conversation_id)
 
         messages.success(self.request, "Votre formulaire a été envoyé. Un médecin va l'analyser.")
         return super().form_valid(form)
 
-    def formater_fiche_en_texte(self, fiche):
-        texte = f"Je suis docteur {fiche.medecin_validateur.username if fiche.medecin_validateur else ''}, j'ai un patient tel que décrit ci-dessous.\n"
-        texte += f"Je m'appelle {fiche.nom} {fiche.postnom} {fiche.prenom}, j'ai {fiche.age} ans (né le {fiche.date_naissance}), mon numéro de téléphone est {fiche.telephone}. "
-        texte += f"Je suis {fiche.etat_civil.lower()}, j'exerce comme {fiche.occupation}. "
-        texte += f"J'habite sur l'avenue {fiche.avenue}, quartier {fiche.quartier}, commune {fiche.commune}.\n\n"
-
-        texte += "Personne à contacter en cas d'urgence : "
-        texte += f"{fiche.contact_nom}, téléphone : {fiche.contact_telephone}, adresse : {fiche.contact_adresse}.\n\n"
-
-        texte += f"Date de consultation : {fiche.date_consultation} à {fiche.heure_debut}.\n\n"
-
-        texte += f"Motif de consultation : {fiche.motif_consultation or 'Non renseigné'}\n"
-        texte += f"Histoire de la maladie : {fiche.histoire_maladie or 'Non renseigné'}\n\n"
-
-        texte += "Plaintes :\n"
-        texte += f"- Céphalées : {'Oui' if fiche.cephalees else 'Non'}\n"
-        texte += f"- Vertiges : {'Oui' if fiche.vertiges else 'Non'}\n"
-        texte += f"- Palpitations : {'Oui' if fiche.palpitations else 'Non'}\n"
-        texte += f"- Troubles visuels : {'Oui' if fiche.troubles_visuels else 'Non'}\n"
-        texte += f"- Nycturie : {'Oui' if fiche.nycturie else 'Non'}\n"
-
-        texte += "\nSignes vitaux :\n"
-        texte += f"- Température : {fiche.temperature or 'Non renseigné'} °C\n"
-        texte += f"- SpO2 : {fiche.spo2 or 'Non renseigné'} %\n"
-        texte += f"- Tension artérielle : {fiche.tension_arterielle or 'Non renseigné'}\n"
-        texte += f"- Pouls : {fiche.pouls or 'Non renseigné'} bpm\n"
-        texte += f"- Fréquence respiratoire : {fiche.frequence_respiratoire or 'Non renseignée'}\n"
-        texte += f"- Poids : {fiche.poids or 'Non renseigné'} kg\n"
-
-        texte += "\nAntécédents personnels :\n"
-        texte += f"- Hypertension : {'Oui' if fiche.hypertendu else 'Non'}\n"
-        texte += f"- Diabète : {'Oui' if fiche.diabetique else 'Non'}\n"
-        texte += f"- Épilepsie : {'Oui' if fiche.epileptique else 'Non'}\n"
-        texte += f"- Troubles du comportement : {'Oui' if fiche.trouble_comportement else 'Non'}\n"
-        texte += f"- Gastrite : {'Oui' if fiche.gastritique else 'Non'}\n"
-        texte += f"- Autres antécédents : {fiche.autres_antecedents or 'Aucun'}\n"
-
-        texte += "\nAntécédents familiaux :\n"
-        texte += f"- Drépanocytose : {'Oui' if fiche.familial_drepanocytaire else 'Non'}\n"
-        texte += f"- Diabète : {'Oui' if fiche.familial_diabetique else 'Non'}\n"
-        texte += f"- Obésité : {'Oui' if fiche.familial_obese else 'Non'}\n"
-        texte += f"- Hypertension : {'Oui' if fiche.familial_hypertendu else 'Non'}\n"
-        texte += f"- Troubles du comportement : {'Oui' if fiche.familial_trouble_comportement else 'Non'}\n"
-        texte += f"- Lien avec la mère : {'Oui' if fiche.lien_mere else 'Non'}\n"
-        texte += f"- Lien avec le père : {'Oui' if fiche.lien_pere else 'Non'}\n"
-        texte += f"- Lien avec le frère : {'Oui' if fiche.lien_frere else 'Non'}\n"
-        texte += f"- Lien avec la sœur : {'Oui' if fiche.lien_soeur else 'Non'}\n"
-
-        texte += "\nMode de vie :\n"
-        texte += f"- Tabac : {fiche.tabac}\n"
-        texte += f"- Alcool : {fiche.alcool}\n"
-        texte += f"- Activité physique : {fiche.activite_physique}\n"
-        texte += f"- Détail de l'activité physique : {fiche.activite_physique_detail or 'Non précisé'}\n"
-        texte += f"- Alimentation habituelle : {fiche.alimentation_habituelle or 'Non précisée'}\n"
-
-        texte += "\nAllergies :\n"
-        texte += f"- Allergie médicamenteuse : {'Oui' if fiche.allergie_medicamenteuse else 'Non'}\n"
-        texte += f"- Médicament allergène : {fiche.medicament_allergique or 'Aucun'}\n"
-
-        texte += "\nTraumatismes :\n"
-        texte += f"- Événement traumatique : {fiche.evenement_traumatique}\n"
-        texte += f"- Divorce : {'Oui' if fiche.trauma_divorce else 'Non'}\n"
-        texte += f"- Perte de parent : {'Oui' if fiche.trauma_perte_parent else 'Non'}\n"
-        texte += f"- Décès d'époux(se) : {'Oui' if fiche.trauma_deces_epoux else 'Non'}\n"
-        texte += f"- Décès d'enfant : {'Oui' if fiche.trauma_deces_enfant else 'Non'}\n"
-        texte += f"- État général : {fiche.etat_general or 'Non renseigné'}\n"
-
-        texte += "\nCapacités :\n"
-        texte += f"- Capacité physique : {fiche.capacite_physique}\n"
-        texte += f"- Score physique : {fiche.capacite_physique_score or 'Non renseigné'}\n"
-        texte += f"- Capacité psychologique : {fiche.capacite_psychologique}\n"
-        texte += f"- Score psychologique : {fiche.capacite_psychologique_score or 'Non renseigné'}\n"
-
-        texte += "\nExamen clinique :\n"
-        texte += f"- État : {fiche.etat}\n"
-        texte += f"- Fièvre : {fiche.febrile}\n"
-        texte += f"- Coloration bulbaire : {fiche.coloration_bulbaire}\n"
-        texte += f"- Coloration palpébrale : {fiche.coloration_palpebrale}\n"
-        texte += f"- Téguments : {fiche.tegument}\n"
-        texte += f"- Tête : {fiche.tete or 'RAS'}\n"
-        texte += f"- Cou : {fiche.cou or 'RAS'}\n"
-        texte += f"- Paroi thoracique : {fiche.paroi_thoracique or 'RAS'}\n"
-        texte += f"- Poumons : {fiche.poumons or 'RAS'}\n"
-        texte += f"- Cœur : {fiche.coeur or 'RAS'}\n"
-        texte += f"- Épigastre et hypochondres : {fiche.epigastre_hypochondres or 'RAS'}\n"
-        texte += f"- Péri-ombilical et flancs : {fiche.peri_ombilical_flancs or 'RAS'}\n"
-        texte += f"- Hypogastre et fosses iliaques : {fiche.hypogastre_fosses_iliaques or 'RAS'}\n"
-        texte += f"- Membres : {fiche.membres or 'RAS'}\n"
-        texte += f"- Colonne et bassin : {fiche.colonne_bassin or 'RAS'}\n"
-        texte += f"- Examen gynécologique : {fiche.examen_gynecologique or 'Non réalisé'}\n"
-
-        texte += "\nÉvaluation psychosociale :\n"
-        texte += f"- Préoccupations : {fiche.preoccupations or 'Non renseignées'}\n"
-        texte += f"- Compréhension : {fiche.comprehension or 'Non renseignée'}\n"
-        texte += f"- Attentes : {fiche.attentes or 'Non renseignées'}\n"
-        texte += f"- Engagement : {fiche.engagement or 'Non renseigné'}\n"
-
-        return texte
-
 
 class RelancerAnalyseMedecinView(View):
     """
@@ -342,11 +231,16 @@ class RelancerAnalyseMedecinView(View):
 
     def post(self, request, fiche_id):
         fiche = get_object_or_404(FicheConsultation, id=fiche_id)
-        # Ici, tu peux relancer la tâche Celery d'analyse IA si besoin
-        # Par exemple :
-        from .tasks import analyse_fiche_consultation_task
+        conversation = fiche.conversations.first() or Conversation.objects.create(user=request.user, fiche=fiche)
 
-        analyse_fiche_consultation_task.delay(fiche.id)
+        # Même texte que l'analyse initiale : seuls les experts absents du cache seront rappelés
+        dernier = MessageIA.objects.filter(conversation=conversation, role="user").order_by("-timestamp").first()
+        texte = dernier.content if dernier else formater_fiche(fiche)
+        MessageIA.objects.create(conversation=conversation, role="user", content=texte)
+
+        fiche.status = "en_analyse"
+        fiche.save()
+        lancer_analyse(texte, request.user.id, conversation.id)
         messages.success(request, "L'analyse IA a été relancée pour ce dossier.")
         return redirect(reverse_lazy("consultation"))
 
@@ -374,10 +268,14 @@ def check_task_status(request, task_id):
     from agent_medical_ia.celery import app
 
     result = AsyncResult(task_id, app=app)
+    valeur = result.result if result.state == "SUCCESS" else None
+    if isinstance(valeur, dict) and "cache_key" in valeur:
+        # Les tâches d'analyse ne retournent qu'une référence : la synthèse est relue dans le stockage des résultats
+        valeur = {**valeur, "synthese": result_store.lire(valeur["cache_key"])}
     response = {
         "task_id": task_id,
         "state": result.state,
-        "result": result.result if result.state == "SUCCESS" else None,
+        "result": valeur,
         "info": str(result.info) if result.info else None,
     }
     return JsonResponse(response)